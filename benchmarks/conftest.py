@@ -0,0 +1,69 @@
+"""
+Fixtures for the pytest-benchmark suite
+
+Row counts run from 10^3 to 10^5 by default; set `NESO_BENCHMARK_FULL=1` to add
+10^6. The save benchmarks need a scratch PostgreSQL database in
+`NESO_BENCHMARK_DATABASE_URL` and are skipped without one.
+"""
+
+import os
+
+import pytest
+
+from benchmarks.save_forecasts import MODEL_NAME, MODEL_VERSION
+from neso_solar_consumer.config import Neso
+from tests.stub_api import StubNesoApi, make_records
+
+ROW_COUNTS = [10**3, 10**4, 10**5]
+if os.getenv("NESO_BENCHMARK_FULL"):
+    ROW_COUNTS.append(10**6)
+
+
+@pytest.fixture(scope="session", params=ROW_COUNTS, ids=lambda n: f"{n}rows")
+def n_rows(request) -> int:
+    return request.param
+
+
+@pytest.fixture(scope="session")
+def records(n_rows) -> list:
+    return make_records(n_rows)
+
+
+@pytest.fixture
+def stub_api(records, monkeypatch):
+    """Serve `records` from the local stand-in API and point `Neso.API_URL` at it."""
+    with StubNesoApi(records) as api:
+        monkeypatch.setattr(Neso, "API_URL", api.url)
+        yield api
+
+
+@pytest.fixture(scope="session")
+def db_engine():
+    """Engine for the scratch database; the tables are recreated by each benchmark."""
+    db_url = os.getenv("NESO_BENCHMARK_DATABASE_URL")
+    if not db_url:
+        pytest.skip("NESO_BENCHMARK_DATABASE_URL is not set")
+
+    from sqlalchemy import create_engine
+
+    engine = create_engine(db_url)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db_session(db_engine, monkeypatch):
+    """A session on freshly created tables holding the benchmark model."""
+    from nowcasting_datamodel.models import MLModelSQL
+    from nowcasting_datamodel.models.base import Base_Forecast
+    from sqlalchemy.orm import sessionmaker
+
+    # The adjuster does a per-value lookup that would dominate the save
+    monkeypatch.setenv("USE_ADJUSTER", "False")
+
+    Base_Forecast.metadata.drop_all(db_engine)
+    Base_Forecast.metadata.create_all(db_engine)
+    with sessionmaker(bind=db_engine)() as session:
+        session.add(MLModelSQL(name=MODEL_NAME, version=MODEL_VERSION))
+        session.commit()
+        yield session
@@ -0,0 +1,62 @@
+"""
+Benchmark concurrent page fetching against a local stand-in for the NESO API
+
+Serves synthetic records from `tests/stub_api.py` with a fixed per-request latency
+and reports how many pages per second `fetch_data_concurrent` pulls for a range of
+worker counts.
+
+Run from the repository root:
+    python -m benchmarks.fetch_concurrency
+    python -m benchmarks.fetch_concurrency --pages 200 --latency 0.05
+"""
+
+import argparse
+import time
+
+from neso_solar_consumer.config import Neso
+from neso_solar_consumer.fetch_data import fetch_data_concurrent
+from neso_solar_consumer.http_client import HTTPConnectionPool
+from tests.stub_api import StubNesoApi, make_records
+
+
+def run(n_pages: int, page_size: int, latency: float, workers: list) -> list:
+    """Fetch `n_pages` pages once per worker count and return (workers, pages/s)."""
+    results = []
+    with StubNesoApi(make_records(n_pages * page_size), latency=latency) as api:
+        Neso.API_URL = api.url
+        for n_workers in workers:
+            pool = HTTPConnectionPool(max_connections_per_host=n_workers)
+            start = time.perf_counter()
+            n_fetched = sum(
+                1
+                for _ in fetch_data_concurrent(
+                    "benchmark", page_size=page_size, max_workers=n_workers, pool=pool
+                )
+            )
+            elapsed = time.perf_counter() - start
+            pool.close()
+            results.append((n_workers, n_fetched / elapsed))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    print(
+        f"{args.pages} pages of {args.page_size} records, "
+        f"{args.latency * 1000:.0f} ms simulated latency"
+    )
+    print(f"{'workers':>8} {'pages/s':>10}")
+    for n_workers, pages_per_second in run(
+        args.pages, args.page_size, args.latency, args.workers
+    ):
+        print(f"{n_workers:>8} {pages_per_second:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
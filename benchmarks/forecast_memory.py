@@ -0,0 +1,52 @@
+"""
+Benchmark the memory held between format and save, per million forecast values
+
+Measures, with tracemalloc, what a list of ForecastValueSQL objects from
+`format_forecast_values` keeps alive, against the `ForecastValueArrays` that
+`format_to_forecast_sql(..., compact=True)` holds instead. Neither step touches
+the database.
+
+Run from the repository root:
+    python -m benchmarks.forecast_memory
+    python -m benchmarks.forecast_memory --rows 100000 1000000
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from benchmarks.format_forecast_values import make_forecast_frame
+from neso_solar_consumer.format_forecast import (
+    ForecastValueArrays,
+    format_forecast_values,
+)
+
+
+def retained_bytes(function, data) -> int:
+    """Bytes still allocated by `function(data)` while its result is alive."""
+    gc.collect()
+    tracemalloc.start()
+    result = function(data)
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'ORM (MB/1M)':>13} {'arrays (MB/1M)':>15} {'ratio':>7}")
+    for n_rows in args.rows:
+        data = make_forecast_frame(n_rows)
+        n_values = len(ForecastValueArrays.from_frame(data))
+        orm = retained_bytes(format_forecast_values, data) / n_values
+        arrays = retained_bytes(ForecastValueArrays.from_frame, data) / n_values
+        print(f"{n_rows:>10} {orm:>13.1f} {arrays:>15.1f} {orm / arrays:>6.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark building ForecastValueSQL objects from a forecast DataFrame
+
+Compares the column-wise `format_forecast_values` with the previous implementation,
+which walked the frame with `iterrows` and validated a pydantic `ForecastValue` per row.
+Neither step touches the database.
+
+Run from the repository root:
+    python -m benchmarks.format_forecast_values
+    python -m benchmarks.format_forecast_values --rows 1000 100000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from nowcasting_datamodel.models import ForecastValue
+
+from neso_solar_consumer.format_forecast import format_forecast_values
+
+
+def make_forecast_frame(n_rows: int) -> pd.DataFrame:
+    """Build a half-hourly forecast frame with `n_rows` rows and a few missing values."""
+    rng = np.random.default_rng(0)
+    solar_forecast_kw = rng.uniform(0, 10_000, n_rows)
+    solar_forecast_kw[::97] = np.nan
+    return pd.DataFrame(
+        {
+            "Datetime_GMT": pd.date_range(
+                "2020-01-01", periods=n_rows, freq="30min", tz="UTC"
+            ),
+            "solar_forecast_kw": solar_forecast_kw,
+        }
+    )
+
+
+def legacy_format_forecast_values(data: pd.DataFrame) -> list:
+    """The row-by-row implementation `format_forecast_values` replaced."""
+    forecast_values = []
+    for _, row in data.iterrows():
+        if pd.isnull(row["Datetime_GMT"]) or pd.isnull(row["solar_forecast_kw"]):
+            continue
+        forecast_values.append(
+            ForecastValue(
+                target_time=row["Datetime_GMT"],
+                expected_power_generation_megawatts=row["solar_forecast_kw"] / 1000,
+            ).to_orm()
+        )
+    return forecast_values
+
+
+def time_it(function, data: pd.DataFrame) -> float:
+    start = time.perf_counter()
+    function(data)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[1_000, 100_000, 1_000_000]
+    )
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'iterrows (s)':>14} {'columnar (s)':>14} {'speedup':>9}")
+    for n_rows in args.rows:
+        data = make_forecast_frame(n_rows)
+        legacy = time_it(legacy_format_forecast_values, data)
+        columnar = time_it(format_forecast_values, data)
+        print(
+            f"{n_rows:>10} {legacy:>14.3f} {columnar:>14.3f} {legacy / columnar:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
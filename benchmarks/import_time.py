@@ -0,0 +1,107 @@
+"""
+Benchmark the cold-start import cost of the entry points
+
+Imports each module in a fresh interpreter with `python -X importtime`, and
+reports its cumulative import time (best of `--repeat`), whether it pulled in
+pandas, SQLAlchemy or nowcasting_datamodel, and its most expensive top-level
+imports. `cli` and `probe` are what a cron-started `check` or `run --if-changed`
+pays before it knows whether there is any work; `app` is what a full run pays.
+
+Run from the repository root:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms 150   # exit 1 if the CLI is slower
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+
+MODULES = [
+    "neso_solar_consumer.cli",
+    "neso_solar_consumer.probe",
+    "neso_solar_consumer.app",
+]
+HEAVY = ("pandas", "sqlalchemy", "nowcasting_datamodel")
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_times(module: str) -> list:
+    """
+    Import `module` in a new interpreter.
+
+    Returns:
+        list: (cumulative_us, depth, name) for every module imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            cumulative, indent, name = int(match[2]), match[3], match[4]
+            entries.append((cumulative, (len(indent) - 1) // 2, name))
+    return entries
+
+
+def package_us(entries: list) -> int:
+    """Microseconds spent importing this package, i.e. not the interpreter start-up."""
+    return sum(
+        cumulative
+        for cumulative, depth, name in entries
+        if depth == 0 and name.split(".")[0] == "neso_solar_consumer"
+    )
+
+
+def heaviest_children(entries: list) -> list:
+    """(cumulative_us, name) of the modules the imported module imports directly."""
+    children = []
+    for cumulative, depth, name in reversed(entries[:-1]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children.append((cumulative, name))
+    return sorted(children, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=3)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        help="fail if importing the first module takes longer than this",
+    )
+    args = parser.parse_args()
+
+    print(f"{'module':<40} {'import (ms)':>11}  heavy dependencies loaded")
+    results = {}
+    for module in args.modules:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        best = min(runs, key=package_us)
+        total_ms = package_us(best) / 1000
+        results[module] = total_ms
+
+        loaded = {name.split(".")[0] for _, _, name in best}
+        heavy = ", ".join(name for name in HEAVY if name in loaded) or "none"
+        print(f"{module:<40} {total_ms:>11.1f}  {heavy}")
+
+        for cumulative, name in heaviest_children(best)[: args.top]:
+            print(f"{'':<4}{name:<36} {cumulative / 1000:>11.1f}")
+
+    if args.budget_ms is not None and results[args.modules[0]] > args.budget_ms:
+        print(
+            f"{args.modules[0]} took {results[args.modules[0]]:.1f} ms, "
+            f"over the budget of {args.budget_ms} ms"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
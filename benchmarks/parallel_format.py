@@ -0,0 +1,87 @@
+"""
+Benchmark preparing forecast value rows in a process pool
+
+Times the work `save_forecast_frames_parallel` hands to its workers: turning the
+valid rows of a forecast frame into COPY-ready CSV text, shard by shard. Reports
+rows per second for a range of worker counts, next to the serial path of
+`save_forecasts_bulk` (ForecastValueSQL objects, then a CSV writer). The database
+is not touched, and scaling is bounded by the number of CPUs.
+
+Run from the repository root:
+    python -m benchmarks.parallel_format
+    python -m benchmarks.parallel_format --rows 1000000 --workers 1 2 4 8
+"""
+
+import argparse
+import csv
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.format_forecast_values import make_forecast_frame
+from neso_solar_consumer.format_forecast import format_forecast_values
+from neso_solar_consumer.parallel_save import _shards, forecast_arrays, prepare_rows
+from neso_solar_consumer.save_forecast import _csv_value
+
+CREATED_UTC = "2025-01-01T00:00:00+00:00"
+
+
+def serial_rows_per_second(data) -> float:
+    """Rows per second of the ORM-object path used by `save_forecasts_bulk`."""
+    start = time.perf_counter()
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [
+            _csv_value(value.target_time),
+            value.expected_power_generation_megawatts,
+            value.adjust_mw,
+            1,
+            CREATED_UTC,
+        ]
+        for value in format_forecast_values(data)
+    )
+    return len(data) / (time.perf_counter() - start)
+
+
+def parallel_rows_per_second(data, n_workers: int, shard_size: int) -> float:
+    """Rows per second of `prepare_rows` over `n_workers` processes."""
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        # start the workers before timing, as a backfill keeps its pool open
+        list(executor.map(abs, range(n_workers)))
+
+        start = time.perf_counter()
+        target_times, megawatts = forecast_arrays(data)
+        futures = [
+            executor.submit(
+                prepare_rows,
+                target_times[begin:end],
+                megawatts[begin:end],
+                1,
+                CREATED_UTC,
+            )
+            for begin, end in _shards(len(target_times), shard_size)
+        ]
+        for future in futures:
+            future.result()
+        return len(data) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--shard-size", type=int, default=50_000)
+    args = parser.parse_args()
+
+    data = make_forecast_frame(args.rows)
+    print(f"{args.rows} rows, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'rows/s':>12}")
+    print(f"{'serial':>8} {serial_rows_per_second(data):>12,.0f}")
+    for n_workers in args.workers:
+        rate = parallel_rows_per_second(data, n_workers, args.shard_size)
+        print(f"{n_workers:>8} {rate:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
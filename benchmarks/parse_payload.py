@@ -0,0 +1,74 @@
+"""
+Benchmark turning a raw NESO API response body into the forecast DataFrame
+
+Compares `_payload_to_dataframe`, which decodes the bytes directly (with orjson
+when it is installed) and keeps only the three fields it needs, with the previous
+path: decode to a string, `json.loads`, build a DataFrame of every column and then
+select two of them. Reports wall time and peak traced memory for each.
+
+Run from the repository root:
+    python -m benchmarks.parse_payload
+    python -m benchmarks.parse_payload --rows 10000 500000
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+import pandas as pd
+
+from neso_solar_consumer import fetch_data
+from tests.stub_api import make_records
+
+
+def legacy_payload_to_dataframe(payload: bytes) -> pd.DataFrame:
+    """The parsing path `_payload_to_dataframe` replaced."""
+    data = json.loads(payload.decode("utf-8"))
+    df = pd.DataFrame(data["result"]["records"])
+    df["Datetime_GMT"] = pd.to_datetime(
+        df["DATE_GMT"].str[:10] + " " + df["TIME_GMT"].str.strip(),
+        format="%Y-%m-%d %H:%M",
+        errors="coerce",
+    ).dt.tz_localize("UTC")
+    df = df.rename(columns={"EMBEDDED_SOLAR_FORECAST": "solar_forecast_kw"})
+    df = df[["Datetime_GMT", "solar_forecast_kw"]]
+    return df.dropna(subset=["Datetime_GMT"])
+
+
+def measure(function, payload: bytes) -> tuple:
+    """Return (seconds, peak MiB) for one call; time and memory are measured separately."""
+    start = time.perf_counter()
+    function(payload)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    function(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 500_000])
+    args = parser.parse_args()
+
+    backend = getattr(fetch_data._json_loads, "__module__", "json")
+    print(f"JSON backend: {backend}")
+    print(
+        f"{'rows':>8} {'payload MiB':>12} {'legacy s':>9} {'legacy MiB':>11} "
+        f"{'narrow s':>9} {'narrow MiB':>11}"
+    )
+    for n_rows in args.rows:
+        payload = json.dumps({"result": {"records": make_records(n_rows)}}).encode()
+        legacy_s, legacy_mib = measure(legacy_payload_to_dataframe, payload)
+        narrow_s, narrow_mib = measure(fetch_data._payload_to_dataframe, payload)
+        print(
+            f"{n_rows:>8} {len(payload) / 2**20:>12.1f} {legacy_s:>9.3f} "
+            f"{legacy_mib:>11.1f} {narrow_s:>9.3f} {narrow_mib:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark combining DATE_GMT and TIME_GMT into timestamps
+
+Compares `_parse_datetime_gmt`, which parses each distinct date and time once, with
+`pd.to_datetime` on the concatenated strings, on half-hourly multi-year frames.
+
+Run from the repository root:
+    python -m benchmarks.parse_timestamps
+    python -m benchmarks.parse_timestamps --years 1 10
+"""
+
+import argparse
+import time
+
+import pandas as pd
+
+from neso_solar_consumer.fetch_data import _parse_datetime_gmt
+from tests.stub_api import make_records
+
+
+def concatenated_to_datetime(dates: pd.Series, times: pd.Series) -> pd.Series:
+    """The parsing `_parse_datetime_gmt` replaced."""
+    return pd.to_datetime(
+        dates.str[:10] + " " + times.str.strip(),
+        format="%Y-%m-%d %H:%M",
+        errors="coerce",
+    ).dt.tz_localize("UTC")
+
+
+def time_it(function, dates: pd.Series, times: pd.Series) -> float:
+    start = time.perf_counter()
+    function(dates, times)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 20])
+    args = parser.parse_args()
+
+    print(
+        f"{'years':>6} {'rows':>9} {'to_datetime (s)':>16} {'cached (s)':>11} {'speedup':>8}"
+    )
+    for years in args.years:
+        records = make_records(years * 365 * 48, start="2000-01-01")
+        dates = pd.Series([r["DATE_GMT"] for r in records], dtype=object)
+        times = pd.Series([r["TIME_GMT"] for r in records], dtype=object)
+
+        baseline = time_it(concatenated_to_datetime, dates, times)
+        cached = time_it(_parse_datetime_gmt, dates, times)
+        print(
+            f"{years:>6} {len(dates):>9} {baseline:>16.3f} {cached:>11.3f} "
+            f"{baseline / cached:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
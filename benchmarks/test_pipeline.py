@@ -0,0 +1,89 @@
+"""
+pytest-benchmark cases for each pipeline stage at 10^3 to 10^6 rows
+
+Fetching runs against the local stand-in API from `tests/stub_api.py`, so results
+do not depend on the network or on the live dataset. These files are not collected
+by a plain `pytest` run; run them explicitly from the repository root:
+
+    python -m pytest benchmarks --benchmark-only
+
+Baselines live in `benchmarks/baselines`. Compare against the latest one with:
+
+    python -m pytest benchmarks --benchmark-only \\
+        --benchmark-storage=benchmarks/baselines --benchmark-compare \\
+        --benchmark-compare-fail=mean:25%
+
+and record a new baseline by adding `--benchmark-save=<name>`. Baselines are only
+comparable on the machine that recorded them.
+"""
+
+import pytest
+
+from benchmarks.save_forecasts import MODEL_NAME, MODEL_VERSION, make_forecast_data
+from benchmarks.format_forecast_values import make_forecast_frame
+from neso_solar_consumer.fetch_data import (
+    _payload_to_dataframe,
+    fetch_data_concurrent,
+    fetch_data_using_sql,
+)
+from neso_solar_consumer.format_forecast import (
+    format_forecast_values,
+    format_to_forecast_sql,
+)
+from neso_solar_consumer.http_client import HTTPConnectionPool
+from neso_solar_consumer.save_forecast import save_forecasts_to_db
+from tests.stub_api import make_payload
+
+PAGE_SIZE = 10_000
+
+
+def test_fetch_pages(benchmark, stub_api, n_rows):
+    """Fetch and parse every page with the concurrent fetcher."""
+
+    def fetch():
+        pool = HTTPConnectionPool(max_connections_per_host=4)
+        try:
+            pages = fetch_data_concurrent(
+                "benchmark", page_size=PAGE_SIZE, max_workers=4, pool=pool
+            )
+            return sum(len(page) for page in pages)
+        finally:
+            pool.close()
+
+    assert benchmark.pedantic(fetch, rounds=3) == n_rows
+
+
+def test_fetch_sql(benchmark, stub_api, n_rows):
+    """Fetch and parse one `datastore_search_sql` response."""
+    sql = f'SELECT * FROM "benchmark" LIMIT {n_rows}'
+    result = benchmark.pedantic(fetch_data_using_sql, args=(sql,), rounds=3)
+    assert len(result) == n_rows
+
+
+def test_parse_payload(benchmark, n_rows):
+    """Decode a response body into the forecast DataFrame."""
+    payload = make_payload(n_rows)
+    result = benchmark.pedantic(_payload_to_dataframe, args=(payload,), rounds=3)
+    assert len(result) == n_rows
+
+
+def test_format_forecast_values(benchmark, n_rows):
+    """Build the ForecastValueSQL objects, without the database."""
+    data = make_forecast_frame(n_rows)
+    result = benchmark.pedantic(format_forecast_values, args=(data,), rounds=3)
+    assert len(result) == data["solar_forecast_kw"].notna().sum()
+
+
+@pytest.mark.parametrize("method", ["orm", "bulk"])
+def test_save(benchmark, db_session, n_rows, method):
+    """Save one forecast of `n_rows` values; formatting is done in the setup."""
+    if method == "orm" and n_rows > 10**5:
+        pytest.skip("The ORM save takes too long at this size")
+
+    data = make_forecast_data(n_rows)
+
+    def setup():
+        forecasts = format_to_forecast_sql(data, MODEL_NAME, MODEL_VERSION, db_session)
+        return (forecasts, db_session), {"method": method}
+
+    benchmark.pedantic(save_forecasts_to_db, setup=setup, rounds=3)
@@ -0,0 +1,6 @@
+# neso_solar_consumer/__main__.py
+import sys
+
+from neso_solar_consumer.cli import main
+
+sys.exit(main())
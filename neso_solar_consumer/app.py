@@ -2,81 +2,398 @@
 Main Script to Fetch, Format, and Save NESO Solar Forecast Data
 
 This script orchestrates the following steps:
-1. Fetches solar forecast data using the `fetch_data` function.
-2. Formats the forecast data into `ForecastSQL` objects using `format_forecast.py`.
+1. Fetches solar forecast data page by page using the `fetch_data_pages` function.
+2. Formats each page into `ForecastSQL` objects using `format_forecast.py`.
 3. Saves the formatted forecasts into the database using `save_forecast.py`.
+
+Pages are formatted and saved as they arrive, so memory use depends on
+`Neso.PAGE_SIZE` rather than on the total number of rows fetched. Fetching runs
+ahead on a producer thread, and a database session is only held while a page is
+being saved (see `run_pipelined`).
 """
 
 import os
 import logging
-from neso_solar_consumer.fetch_data import fetch_data
-from neso_solar_consumer.format_forecast import format_to_forecast_sql
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, Optional
+import pandas as pd
+from neso_solar_consumer.cache import ResponseCache
+from neso_solar_consumer.change_detection import ChangeDetector
+from neso_solar_consumer.cli import env_flag
+from neso_solar_consumer.fetch_data import (
+    FetchError,
+    fetch_data_concurrent,
+    fetch_data_pages,
+    fetch_data_since,
+)
+from neso_solar_consumer.format_forecast import (
+    CompactForecast,
+    format_to_forecast_sql,
+    format_to_forecast_sql_by_gsp,
+)
+from neso_solar_consumer.http_client import set_cache
+from neso_solar_consumer.metadata_cache import MetadataCache
+from neso_solar_consumer.metrics import get_metrics, profile_run, stage
+from neso_solar_consumer.pipeline import prefetch
 from neso_solar_consumer.save_forecast import save_forecasts_to_db
 from nowcasting_datamodel.connection import DatabaseConnection
 from nowcasting_datamodel.models import Base_Forecast
+from sqlalchemy.orm.session import Session
 from neso_solar_consumer import __version__  # Import version from __init__.py
 from neso_solar_consumer.config import Neso
+from neso_solar_consumer.state import StateFile
+from neso_solar_consumer.watermark import Watermark
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
-)
 logger = logging.getLogger(__name__)
 
 
-def app(db_url: str):
+def app(
+    db_url: str,
+    save_method: Optional[str] = None,
+    state_path: Optional[str] = None,
+    metrics_path: Optional[str] = None,
+    archive_dir: Optional[str] = None,
+    incremental: Optional[bool] = None,
+):
     """
     Main application function to fetch, format, and save solar forecast data.
 
     Parameters:
         db_url (str): Database connection URL from an environment variable.
+        save_method (str, optional): one of `SAVE_METHODS`, see `save_forecasts_to_db`.
+            Defaults to `Neso.SAVE_METHOD`.
+        state_path (str, optional): State file for change detection. When given,
+            pages that are unchanged since the last run are not saved again, and
+            partly changed pages only save the changed target times.
+        metrics_path (str, optional): Write stage timings and counts to this
+            Prometheus textfile at the end of the run.
+        archive_dir (str, optional): Keep every fetched page in this `RawArchive`,
+            so it can be replayed later. Requires the `archive` extra.
+        incremental (bool, optional): Only fetch rows after the latest target time
+            already saved, less `Neso.INCREMENTAL_LOOKBACK_HOURS` so that revised
+            values are fetched again, see `Watermark`. The watermark is kept in the state
+            file when given. Defaults to `Neso.INCREMENTAL`.
     """
     logger.info(f"Starting the NESO Solar Forecast pipeline (version: {__version__}).")
 
-    # Use the `Neso` class for hardcoded configuration
-    resource_id = Neso.RESOURCE_ID
-    limit = Neso.LIMIT
-    model_tag = Neso.MODEL_TAG
+    state = StateFile(state_path) if state_path else None
+    change_detector = None
+    if state is not None:
+        change_detector = ChangeDetector(state, Neso.RESOURCE_ID)
+    watermark = make_watermark(state, incremental)
+
+    archive = None
+    if archive_dir:
+        from neso_solar_consumer.archive import RawArchive
+
+        archive = RawArchive(archive_dir)
 
     # Initialize database connection
     connection = DatabaseConnection(url=db_url, base=Base_Forecast, echo=False)
 
     try:
-        with connection.get_session() as session:
-            # Step 1: Fetch forecast data
-            logger.info("Fetching forecast data.")
-            forecast_data = fetch_data(resource_id, limit)
-
-            if forecast_data.empty:
-                logger.warning("No data fetched. Exiting the pipeline.")
-                return
-
-            # Step 2: Format forecast data
-            logger.info(f"Formatting {len(forecast_data)} rows of forecast data.")
-            forecasts = format_to_forecast_sql(
-                data=forecast_data,
-                model_tag=model_tag,
-                model_version=__version__,  # Use the version from __init__.py
-                session=session,
+        run_pipelined(
+            connection,
+            save_method=save_method,
+            change_detector=change_detector,
+            archive=archive,
+            watermark=watermark,
+        )
+    except Exception as e:
+        logger.error(f"Error in the forecast pipeline: {e}")
+        raise
+    finally:
+        if metrics_path:
+            get_metrics().write_textfile(metrics_path)
+
+
+def make_watermark(
+    state: Optional[StateFile] = None, incremental: Optional[bool] = None
+) -> Optional[Watermark]:
+    """Return the `Watermark` for `Neso.RESOURCE_ID` in incremental mode, else None."""
+    incremental = Neso.INCREMENTAL if incremental is None else incremental
+    if not incremental:
+        return None
+    return Watermark(
+        Neso.RESOURCE_ID,
+        Neso.MODEL_TAG,
+        state=state,
+        lookback=timedelta(hours=Neso.INCREMENTAL_LOOKBACK_HOURS),
+    )
+
+
+def run_pipeline(
+    session: Session,
+    save_method: Optional[str] = None,
+    change_detector: Optional[ChangeDetector] = None,
+    metadata_cache: Optional[MetadataCache] = None,
+    archive=None,
+    watermark: Optional[Watermark] = None,
+) -> int:
+    """
+    Fetch, format and save one round of forecast data with an open session.
+
+    Pages are fetched and saved one after the other, and `session` is held
+    throughout. `run_pipelined` overlaps the two and only holds a session while
+    saving.
+
+    Parameters:
+        session (Session): SQLAlchemy session for database access.
+        save_method (str, optional): one of `SAVE_METHODS`, see `save_forecasts_to_db`.
+            Defaults to `Neso.SAVE_METHOD`. Regional pages are saved with "bulk"
+            when this is "orm".
+        change_detector (ChangeDetector, optional): When given, only new or changed
+            target times are saved.
+        metadata_cache (MetadataCache, optional): Shares model, location and input
+            data lookups with other runs. A new cache is used for this run when not given.
+        archive (RawArchive, optional): When given, the raw records of every
+            fetched page are archived.
+        watermark (Watermark, optional): When given, only rows after it are
+            fetched, with `fetch_data_since`, and it is moved up as pages are saved.
+
+    Returns:
+        int: The number of rows fetched.
+
+    Raises:
+        FetchError: If a page could not be fetched, once the pages before it
+            have been saved.
+    """
+    save_method = save_method or Neso.SAVE_METHOD
+    metadata_cache = metadata_cache or MetadataCache()
+    metrics = get_metrics()
+    metrics.watch_engine(session.get_bind())
+
+    # Step 1: Fetch forecast data, one page at a time
+    logger.info("Fetching forecast data.")
+    since = watermark.since(session) if watermark is not None else None
+    pages = _fetch_pages(watermark, since, on_records=_archiver(archive))
+
+    n_rows = 0
+    try:
+        for page in pages:
+            if page.empty:
+                continue
+            n_rows += len(page)
+
+            # Steps 2 and 3: Format and save
+            _save_page(
+                session, page, save_method, change_detector, metadata_cache, watermark
             )
+    except FetchError as e:
+        _fetch_failed(n_rows, e)
+        raise
 
-            if not forecasts:
-                logger.warning("No forecasts generated. Exiting the pipeline.")
-                return
+    return _finish(n_rows)
 
-            logger.info(f"Generated {len(forecasts)} ForecastSQL objects.")
 
-            # Step 3: Save forecasts to the database
-            logger.info("Saving forecasts to the database.")
-            save_forecasts_to_db(forecasts, session)
+def run_pipelined(
+    connection: DatabaseConnection,
+    save_method: Optional[str] = None,
+    change_detector: Optional[ChangeDetector] = None,
+    metadata_cache: Optional[MetadataCache] = None,
+    archive=None,
+    watermark: Optional[Watermark] = None,
+    max_queued: Optional[int] = None,
+) -> int:
+    """
+    Like `run_pipeline`, but fetching runs ahead on a producer thread.
 
-            logger.info("Forecast pipeline completed successfully.")
-    except Exception as e:
-        logger.error(f"Error in the forecast pipeline: {e}")
+    Parsed pages are handed to this thread through a bounded queue (see
+    `prefetch`), so the next page is fetched while the current one is saved. A
+    session is checked out of `connection` for each page only while it is being
+    formatted and saved, and returned before waiting for the next page.
+
+    Parameters:
+        connection (DatabaseConnection): Where to get a session for each page.
+        save_method, change_detector, metadata_cache, archive, watermark:
+            As for `run_pipeline`.
+        max_queued (int, optional): Pages fetched ahead of the writer. Defaults
+            to `Neso.PREFETCH_PAGES`.
+
+    Returns:
+        int: The number of rows fetched.
+
+    Raises:
+        FetchError: As for `run_pipeline`.
+    """
+    save_method = save_method or Neso.SAVE_METHOD
+    metadata_cache = metadata_cache or MetadataCache()
+    max_queued = max_queued or Neso.PREFETCH_PAGES
+    metrics = get_metrics()
+    metrics.watch_engine(connection.engine)
+
+    # Step 1: Fetch forecast data on a producer thread
+    logger.info("Fetching forecast data.")
+    since = None
+    if watermark is not None:
+        with connection.get_session() as session:
+            since = watermark.since(session)
+    pages = prefetch(
+        _fetch_pages(watermark, since, on_records=_archiver(archive)), max_queued
+    )
+
+    n_rows = 0
+    try:
+        for page in pages:
+            if page.empty:
+                continue
+            n_rows += len(page)
+
+            # Steps 2 and 3: Format and save, holding a session only meanwhile
+            with connection.get_session() as session:
+                _save_page(
+                    session,
+                    page,
+                    save_method,
+                    change_detector,
+                    metadata_cache,
+                    watermark,
+                )
+    except FetchError as e:
+        _fetch_failed(n_rows, e)
         raise
 
+    return _finish(n_rows)
+
+
+def _fetch_pages(
+    watermark: Optional[Watermark],
+    since: Optional[datetime],
+    on_records: Optional[Callable[[list], None]] = None,
+) -> Iterator[pd.DataFrame]:
+    """Start fetching pages of `Neso.RESOURCE_ID` as configured."""
+    # Use the `Neso` class for hardcoded configuration
+    resource_id = Neso.RESOURCE_ID
+    limit = Neso.LIMIT
+    page_size = Neso.PAGE_SIZE
+    fetch_workers = Neso.FETCH_WORKERS
+
+    if watermark is not None:
+        return fetch_data_since(
+            resource_id,
+            since=since,
+            page_size=page_size,
+            max_records=limit,
+            on_records=on_records,
+        )
+    if fetch_workers > 1:
+        return fetch_data_concurrent(
+            resource_id,
+            page_size=page_size,
+            max_workers=fetch_workers,
+            max_records=limit,
+            on_records=on_records,
+        )
+    return fetch_data_pages(
+        resource_id, page_size=page_size, max_records=limit, on_records=on_records
+    )
+
+
+def _archiver(archive) -> Optional[Callable[[list], None]]:
+    """Return a callback archiving the raw records of each page, or None."""
+    if archive is None:
+        return None
+
+    def write(records: list):
+        with stage("archive") as record:
+            archive.write(records, Neso.RESOURCE_ID)
+            record.add(rows=len(records))
+
+    return write
+
+
+def _save_page(
+    session: Session,
+    page: pd.DataFrame,
+    save_method: str,
+    change_detector: Optional[ChangeDetector],
+    metadata_cache: MetadataCache,
+    watermark: Optional[Watermark],
+):
+    """Format and save one fetched page, then record it as saved."""
+    model_tag = Neso.MODEL_TAG
+
+    # Regional data gets one forecast per GSP. `save` would update and commit
+    # each of those forecasts on its own, so they are always saved together in
+    # one transaction with bulk inserts.
+    regional = "gsp_id" in page.columns
+    if regional and save_method == "orm":
+        save_method = "bulk"
+
+    # Skip target times that have not changed since the last run. The detector
+    # keys on target time alone, so it only applies to national data.
+    forecast_data = page
+    if change_detector is not None and not regional:
+        forecast_data = change_detector.changed_rows(page)
+        if forecast_data.empty:
+            return
+
+    # Step 2: Format forecast data
+    logger.info(f"Formatting {len(forecast_data)} rows of forecast data.")
+    format_function = (
+        format_to_forecast_sql_by_gsp if regional else format_to_forecast_sql
+    )
+    with stage("format") as record:
+        forecasts = format_function(
+            data=forecast_data,
+            model_tag=model_tag,
+            model_version=__version__,  # Use the version from __init__.py
+            session=session,
+            metadata_cache=metadata_cache,
+            # the bulk and upsert saves write the values straight from arrays
+            compact=save_method != "orm",
+        )
+        record.add(rows=len(forecast_data))
+
+    if not forecasts:
+        logger.warning("No forecasts generated for this page.")
+        return
+
+    logger.info(f"Generated {len(forecasts)} ForecastSQL objects.")
+
+    # Step 3: Save forecasts to the database
+    logger.info("Saving forecasts to the database.")
+    with stage("save") as record:
+        n_values = sum(
+            (
+                len(forecast)
+                if isinstance(forecast, CompactForecast)
+                else len(forecast.forecast_values)
+            )
+            for forecast in forecasts
+        )
+        save_forecasts_to_db(forecasts, session, method=save_method)
+        record.add(rows=n_values)
+
+    if change_detector is not None and not regional:
+        change_detector.commit(page)
+    if watermark is not None:
+        watermark.commit(page)
+
+
+def _fetch_failed(n_rows: int, error: FetchError):
+    logger.error(
+        f"Fetching stopped early; the {n_rows} rows fetched before the failure "
+        f"were saved: {error}"
+    )
+
+
+def _finish(n_rows: int) -> int:
+    if n_rows == 0:
+        logger.warning("No data fetched. Exiting the pipeline.")
+        return n_rows
+
+    logger.info(f"Forecast pipeline completed successfully ({n_rows} rows processed).")
+    logger.info(f"Stage metrics: {get_metrics().summary()}")
+    return n_rows
+
 
 if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
+    )
+
     # Step 1: Fetch the database URL from the environment variable
     db_url = os.getenv("DATABASE_URL")
 
@@ -84,5 +401,22 @@ if __name__ == "__main__":
         logger.error("DATABASE_URL environment variable is not set. Exiting.")
         exit(1)
 
-    # Step 2: Run the application
-    app(db_url=db_url)
+    # Optionally serve repeated API requests from an on-disk cache
+    cache_dir = os.getenv("CACHE_DIR")
+    if cache_dir:
+        set_cache(
+            ResponseCache(
+                cache_dir, ttl=Neso.CACHE_TTL_SECONDS, max_bytes=Neso.CACHE_MAX_BYTES
+            )
+        )
+
+    # Step 2: Run the application, profiled when NESO_PROFILE is set
+    with profile_run():
+        app(
+            db_url=db_url,
+            save_method=os.getenv("SAVE_METHOD"),
+            state_path=os.getenv("STATE_PATH"),
+            metrics_path=os.getenv("METRICS_PATH"),
+            archive_dir=os.getenv("ARCHIVE_DIR"),
+            incremental=env_flag("INCREMENTAL"),
+        )
@@ -0,0 +1,284 @@
+"""
+Local archive of fetched forecast data, with replay into the database
+
+Every page the pipeline fetches can be kept in an archive directory as an
+uncompressed Arrow IPC file, partitioned by the UTC date it was fetched:
+
+    <directory>/<resource_id>/date=YYYY-MM-DD/<HHMMSS.ffffff>-<n>.arrow
+
+Each file holds the page's records as the API returned them, one JSON document
+per row, before any parsing. `replay` memory-maps those files one at a time,
+parses them with the current code and pushes each page through
+`format_to_forecast_sql` and `save_forecasts_to_db` again, e.g. after a parsing
+or formatting bug or to save under another model tag, without calling the NESO
+API. Only the page being saved is held in memory, so the size of the archive
+does not matter.
+Requires the `archive` extra (`pip install .[archive]`).
+
+Run with:
+    DATABASE_URL=... python -m neso_solar_consumer.archive ARCHIVE_DIR 2025-01-01 2025-02-01
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import tempfile
+from datetime import date, datetime, timezone
+from typing import Iterator, Optional
+
+import pandas as pd
+import pyarrow as pa
+from nowcasting_datamodel.connection import DatabaseConnection
+from nowcasting_datamodel.models import Base_Forecast
+from sqlalchemy.orm.session import Session
+
+from neso_solar_consumer import __version__
+from neso_solar_consumer.config import Neso
+from neso_solar_consumer.fetch_data import _json_loads, _records_to_dataframe
+from neso_solar_consumer.format_forecast import (
+    format_to_forecast_sql,
+    format_to_forecast_sql_by_gsp,
+)
+from neso_solar_consumer.metadata_cache import MetadataCache
+from neso_solar_consumer.save_forecast import save_forecasts_to_db
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = "date="
+SUFFIX = ".arrow"
+RECORD_COLUMN = "record"
+
+
+class RawArchive:
+    """
+    Date-partitioned Arrow IPC files of the raw records of fetched pages.
+
+    Parameters:
+        directory (str): Root directory of the archive; created when missing.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._counter = itertools.count()
+        os.makedirs(directory, exist_ok=True)
+
+    def _partition(self, resource_id: str, day: date) -> str:
+        return os.path.join(
+            self.directory, resource_id, f"{PARTITION_PREFIX}{day.isoformat()}"
+        )
+
+    def write(
+        self, records: list, resource_id: str, fetched: Optional[datetime] = None
+    ) -> Optional[str]:
+        """
+        Archive the records of one fetched page.
+
+        The file is written to a temporary name and renamed into place, so
+        `replay` never sees half a file.
+
+        Parameters:
+            records (list): The page's records as the API returned them, e.g. as
+                passed to the `on_records` callback of `fetch_data_pages`.
+            resource_id (str): The resource the page was fetched from.
+            fetched (datetime, optional): When the page was fetched. Defaults to now.
+
+        Returns:
+            str: The path of the new file, or None if the page was empty.
+        """
+        if not records:
+            return None
+        fetched = fetched or datetime.now(tz=timezone.utc)
+        fetched = fetched.astimezone(timezone.utc)
+
+        directory = self._partition(resource_id, fetched.date())
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(
+            directory,
+            f"{fetched:%H%M%S.%f}-{os.getpid()}-{next(self._counter)}{SUFFIX}",
+        )
+
+        table = pa.table(
+            {RECORD_COLUMN: pa.array([json.dumps(r) for r in records], pa.string())}
+        )
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".archive-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                with pa.ipc.new_file(f, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return path
+
+    def paths(
+        self,
+        resource_id: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> list:
+        """
+        List the archived files fetched in [start, end), oldest first.
+
+        Parameters:
+            resource_id (str): The resource to list.
+            start (date, optional): First fetch day to include.
+            end (date, optional): Day after the last fetch day to include.
+
+        Returns:
+            list: File paths, in the order they were fetched.
+        """
+        root = os.path.join(self.directory, resource_id)
+        if not os.path.isdir(root):
+            return []
+
+        paths = []
+        for partition in sorted(os.listdir(root)):
+            if not partition.startswith(PARTITION_PREFIX):
+                continue
+            day = date.fromisoformat(partition[len(PARTITION_PREFIX) :])
+            if (start and day < start) or (end and day >= end):
+                continue
+            directory = os.path.join(root, partition)
+            paths.extend(
+                os.path.join(directory, name)
+                for name in sorted(os.listdir(directory))
+                if name.endswith(SUFFIX) and not name.startswith(".")
+            )
+        return paths
+
+    def read_records(
+        self,
+        resource_id: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Iterator[list]:
+        """
+        Yield the records of the pages fetched in [start, end), one memory-mapped
+        file at a time.
+
+        Yields:
+            list: One page's records, as the API returned them.
+        """
+        for path in self.paths(resource_id, start, end):
+            with pa.memory_map(path) as source:
+                column = pa.ipc.open_file(source).read_all().column(RECORD_COLUMN)
+                yield [_json_loads(record) for record in column.to_pylist()]
+
+    def read(
+        self,
+        resource_id: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Yield the pages fetched in [start, end), parsed again from their records.
+
+        Yields:
+            pd.DataFrame: One page, with the same columns as `fetch_data`.
+        """
+        for records in self.read_records(resource_id, start, end):
+            yield _records_to_dataframe(records)
+
+
+def replay(
+    session: Session,
+    archive: RawArchive,
+    resource_id: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    model_tag: Optional[str] = None,
+    save_method: Optional[str] = None,
+) -> int:
+    """
+    Format and save archived pages again, without fetching anything.
+
+    Each archived page is parsed again and saved as its own forecast(s), as when
+    it was fetched. As for a backfill, the adjuster is not applied: the recent
+    mean error does not apply to historical forecasts.
+
+    Parameters:
+        session (Session): SQLAlchemy session for database access.
+        archive (RawArchive): The archive to read.
+        resource_id (str, optional): Defaults to `Neso.RESOURCE_ID`.
+        start (date, optional): First fetch day to replay.
+        end (date, optional): Day after the last fetch day to replay.
+        model_tag (str, optional): Save under this model. Defaults to `Neso.MODEL_TAG`.
+        save_method (str, optional): one of `SAVE_METHODS`, see `save_forecasts_to_db`.
+            Defaults to `Neso.SAVE_METHOD`.
+
+    Returns:
+        int: The number of rows replayed.
+    """
+    resource_id = resource_id or Neso.RESOURCE_ID
+    model_tag = model_tag or Neso.MODEL_TAG
+    save_method = save_method or Neso.SAVE_METHOD
+
+    metadata_cache = MetadataCache()
+    n_rows = 0
+    n_pages = 0
+    for data in archive.read(resource_id, start, end):
+        format_function = (
+            format_to_forecast_sql_by_gsp
+            if "gsp_id" in data.columns
+            else format_to_forecast_sql
+        )
+        forecasts = format_function(
+            data=data,
+            model_tag=model_tag,
+            model_version=__version__,
+            session=session,
+            metadata_cache=metadata_cache,
+            compact=save_method != "orm",
+        )
+        save_forecasts_to_db(
+            forecasts, session, method=save_method, apply_adjuster=False
+        )
+        n_rows += len(data)
+        n_pages += 1
+
+    logger.info(f"Replayed {n_pages} archived pages ({n_rows} rows) of {resource_id}.")
+    return n_rows
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(
+        description="Save archived NESO solar forecasts again."
+    )
+    parser.add_argument("archive_dir")
+    parser.add_argument(
+        "start", nargs="?", type=date.fromisoformat, help="first day, YYYY-MM-DD"
+    )
+    parser.add_argument(
+        "end", nargs="?", type=date.fromisoformat, help="day after the last day"
+    )
+    parser.add_argument("--resource-id", default=Neso.RESOURCE_ID)
+    parser.add_argument("--model-tag", default=Neso.MODEL_TAG)
+    parser.add_argument("--save-method", default=Neso.SAVE_METHOD)
+    args = parser.parse_args(argv)
+
+    db_url = os.getenv("DATABASE_URL")
+    if not db_url:
+        logger.error("DATABASE_URL environment variable is not set. Exiting.")
+        exit(1)
+
+    connection = DatabaseConnection(url=db_url, base=Base_Forecast, echo=False)
+    with connection.get_session() as session:
+        replay(
+            session,
+            RawArchive(args.archive_dir),
+            resource_id=args.resource_id,
+            start=args.start,
+            end=args.end,
+            model_tag=args.model_tag,
+            save_method=args.save_method,
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
+    )
+    main()
@@ -0,0 +1,320 @@
+"""
+Historical backfill for NESO solar forecasts
+
+Loads a date range by splitting it into windows of `window_days` days and
+fetching each window with `datastore_search_sql` queries on `DATE_GMT`, paged
+by `Neso.SQL_ROWS_MAX` rows so that no window is cut short. Up to
+`max_workers` windows are fetched and parsed in the background while the
+previous ones are formatted and bulk saved, and each saved window is recorded in
+a state file, so an interrupted backfill picks up where it stopped. With
+`format_workers` above 1, the rows of national windows are prepared in a process
+pool by `save_forecast_frames_parallel` instead.
+
+The adjuster is not applied to backfilled forecasts, whichever way they are
+saved: it corrects a forecast with the recent mean error, which does not apply
+to historical forecasts.
+
+Run with:
+    DATABASE_URL=... python -m neso_solar_consumer.backfill 2020-01-01 2024-01-01
+"""
+
+import argparse
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import date, timedelta
+from typing import Iterator, Optional
+
+import pandas as pd
+from nowcasting_datamodel.connection import DatabaseConnection
+from nowcasting_datamodel.models import Base_Forecast
+from sqlalchemy.orm.session import Session
+
+from neso_solar_consumer import __version__
+from neso_solar_consumer.config import Neso
+from neso_solar_consumer.fetch_data import (
+    _fetch_sql_records,
+    _records_to_dataframe,
+    quote_identifier,
+    quote_literal,
+)
+from neso_solar_consumer.format_forecast import (
+    format_to_forecast_sql,
+    format_to_forecast_sql_by_gsp,
+)
+from neso_solar_consumer.http_client import HTTPConnectionPool, get_pool
+from neso_solar_consumer.metadata_cache import MetadataCache
+from neso_solar_consumer.parallel_save import save_forecast_frames_parallel
+from neso_solar_consumer.save_forecast import save_forecasts_to_db
+from neso_solar_consumer.state import StateFile
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "backfill"
+
+
+def date_windows(start: date, end: date, window_days: int) -> list:
+    """
+    Split [start, end) into consecutive windows of at most `window_days` days.
+
+    Returns:
+        list: (window_start, window_end) pairs, each window end being exclusive.
+    """
+    if window_days < 1:
+        raise ValueError(f"window_days must be at least 1, got {window_days}")
+
+    windows = []
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + timedelta(days=window_days), end)
+        windows.append((window_start, window_end))
+        window_start = window_end
+    return windows
+
+
+def window_query(
+    resource_id: str,
+    window_start: date,
+    window_end: date,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> str:
+    """
+    Build the `datastore_search_sql` query for the rows of one window.
+
+    The rows are ordered by time, then by the datastore's own `_id`, so that
+    pages taken with `limit` and `offset` neither skip nor repeat rows that
+    share a time, as the GSPs of a regional resource do.
+    """
+    date_gmt = quote_identifier("DATE_GMT")
+    sql = (
+        f"SELECT * FROM {quote_identifier(resource_id)} "
+        f"WHERE {date_gmt} >= {quote_literal(window_start.isoformat())} "
+        f"AND {date_gmt} < {quote_literal(window_end.isoformat())} "
+        f"ORDER BY {date_gmt}, {quote_identifier('TIME_GMT')}, "
+        f"{quote_identifier('_id')}"
+    )
+    if limit is not None:
+        sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+    return sql
+
+
+def fetch_window(
+    resource_id: str, window: tuple, pool: Optional[HTTPConnectionPool] = None
+) -> pd.DataFrame:
+    """
+    Fetch all the rows of one window, a page of `Neso.SQL_ROWS_MAX` rows at a time.
+
+    A query returns at most `Neso.SQL_ROWS_MAX` rows, so pages are requested
+    until one comes back short.
+
+    Returns:
+        pd.DataFrame: The window's rows, with the same columns as `fetch_data`.
+    """
+    page_size = Neso.SQL_ROWS_MAX
+    frames = []
+    offset = 0
+    while True:
+        sql = window_query(resource_id, *window, limit=page_size, offset=offset)
+        records = _fetch_sql_records(sql, pool)
+        frames.append(_records_to_dataframe(records))
+        offset += len(records)
+        if len(records) < page_size:
+            break
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _window_key(window: tuple) -> str:
+    return f"{window[0].isoformat()}/{window[1].isoformat()}"
+
+
+def fetch_windows(
+    resource_id: str,
+    windows: list,
+    max_workers: int = 4,
+    pool: Optional[HTTPConnectionPool] = None,
+) -> Iterator[tuple]:
+    """
+    Fetch windows in the background, yielding them in order.
+
+    At most `2 * max_workers` windows are fetched or held at once, so a slow
+    consumer holds back the fetching rather than letting it run ahead. Errors are
+    raised when the failed window's turn comes.
+
+    Parameters:
+        resource_id (str): The unique resource ID for the dataset in the API.
+        windows (list): (window_start, window_end) pairs from `date_windows`.
+        max_workers (int): Number of windows fetched at the same time.
+        pool (HTTPConnectionPool, optional): Defaults to the shared pool.
+
+    Yields:
+        tuple: (window, DataFrame) with the same columns as `fetch_data`.
+    """
+    pool = pool or get_pool()
+    windows = iter(windows)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < 2 * max_workers:
+                    window = next(windows, None)
+                    if window is None:
+                        break
+                    pending.append(
+                        (
+                            window,
+                            executor.submit(fetch_window, resource_id, window, pool),
+                        )
+                    )
+                if not pending:
+                    return
+
+                window, future = pending.popleft()
+                yield window, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def backfill(
+    session: Session,
+    start: date,
+    end: date,
+    state: StateFile,
+    resource_id: Optional[str] = None,
+    window_days: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    save_method: str = "bulk",
+    format_workers: Optional[int] = None,
+) -> int:
+    """
+    Load the forecasts between `start` and `end`, skipping windows already done.
+
+    Parameters:
+        session (Session): SQLAlchemy session for database access.
+        start (date): First day to load.
+        end (date): Day after the last day to load.
+        state (StateFile): Where completed windows are recorded.
+        resource_id (str, optional): Defaults to `Neso.RESOURCE_ID`.
+        window_days (int, optional): Days per query. Defaults to `Neso.BACKFILL_WINDOW_DAYS`.
+        max_workers (int, optional): Windows fetched at once. Defaults to
+            `Neso.BACKFILL_WORKERS`.
+        save_method (str): one of `SAVE_METHODS`, see `save_forecasts_to_db`.
+        format_workers (int, optional): Processes preparing the rows of national
+            windows; above 1, these are saved with `save_forecast_frames_parallel`
+            and `save_method` only applies to regional windows. Defaults to
+            `Neso.FORMAT_WORKERS`.
+
+    Returns:
+        int: The number of rows saved by this call.
+    """
+    resource_id = resource_id or Neso.RESOURCE_ID
+    window_days = window_days or Neso.BACKFILL_WINDOW_DAYS
+    max_workers = max_workers or Neso.BACKFILL_WORKERS
+    format_workers = format_workers or Neso.FORMAT_WORKERS
+
+    all_state = state.get(STATE_KEY, {})
+    completed = set(all_state.get(resource_id, []))
+    windows = [
+        window
+        for window in date_windows(start, end, window_days)
+        if _window_key(window) not in completed
+    ]
+    logger.info(
+        f"Backfilling {resource_id} from {start} to {end}: {len(windows)} windows "
+        f"of {window_days} days to do, {len(completed)} already done."
+    )
+
+    metadata_cache = MetadataCache()
+    n_rows = 0
+    executor = (
+        ProcessPoolExecutor(max_workers=format_workers)
+        if format_workers > 1
+        else nullcontext()
+    )
+    with executor:
+        for window, data in fetch_windows(resource_id, windows, max_workers):
+            if not data.empty:
+                if format_workers > 1 and "gsp_id" not in data.columns:
+                    forecasts = format_to_forecast_sql(
+                        data=data,
+                        model_tag=Neso.MODEL_TAG,
+                        model_version=__version__,
+                        session=session,
+                        forecast_values=[],
+                        metadata_cache=metadata_cache,
+                    )
+                    save_forecast_frames_parallel(session, forecasts, [data], executor)
+                else:
+                    format_function = (
+                        format_to_forecast_sql_by_gsp
+                        if "gsp_id" in data.columns
+                        else format_to_forecast_sql
+                    )
+                    forecasts = format_function(
+                        data=data,
+                        model_tag=Neso.MODEL_TAG,
+                        model_version=__version__,
+                        session=session,
+                        metadata_cache=metadata_cache,
+                        compact=save_method != "orm",
+                    )
+                    save_forecasts_to_db(
+                        forecasts, session, method=save_method, apply_adjuster=False
+                    )
+                n_rows += len(data)
+
+            # Checkpoint only once the window is saved
+            completed.add(_window_key(window))
+            all_state[resource_id] = sorted(completed)
+            state.set(STATE_KEY, all_state)
+            logger.info(f"Window {_window_key(window)} done ({len(data)} rows).")
+
+    logger.info(f"Backfill finished: {n_rows} rows saved.")
+    return n_rows
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Backfill NESO solar forecasts.")
+    parser.add_argument("start", type=date.fromisoformat, help="first day, YYYY-MM-DD")
+    parser.add_argument(
+        "end", type=date.fromisoformat, help="day after the last day, YYYY-MM-DD"
+    )
+    parser.add_argument("--resource-id", default=Neso.RESOURCE_ID)
+    parser.add_argument("--window-days", type=int, default=Neso.BACKFILL_WINDOW_DAYS)
+    parser.add_argument("--workers", type=int, default=Neso.BACKFILL_WORKERS)
+    parser.add_argument("--state-path", default=Neso.BACKFILL_STATE_PATH)
+    parser.add_argument("--save-method", default="bulk")
+    parser.add_argument("--format-workers", type=int, default=Neso.FORMAT_WORKERS)
+    args = parser.parse_args(argv)
+
+    db_url = os.getenv("DATABASE_URL")
+    if not db_url:
+        logger.error("DATABASE_URL environment variable is not set. Exiting.")
+        exit(1)
+
+    connection = DatabaseConnection(url=db_url, base=Base_Forecast, echo=False)
+    with connection.get_session() as session:
+        backfill(
+            session,
+            start=args.start,
+            end=args.end,
+            state=StateFile(args.state_path),
+            resource_id=args.resource_id,
+            window_days=args.window_days,
+            max_workers=args.workers,
+            save_method=args.save_method,
+            format_workers=args.format_workers,
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
+    )
+    main()
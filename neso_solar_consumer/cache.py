@@ -0,0 +1,162 @@
+"""
+On-disk cache for NESO API responses
+
+Frequent polling and test/replay runs request the same URLs over and over.
+`ResponseCache` stores raw response bodies on disk, keyed by URL (for
+`datastore_search_sql` the URL carries the SQL query, so queries are keyed too):
+- within `ttl` seconds a cached body is returned without any request,
+- after that the request is revalidated with `If-None-Match`/`If-Modified-Since`
+  when the API sent an `ETag`/`Last-Modified`, and a `304` reuses the cached body,
+- the directory is kept under `max_bytes` by evicting the least recently used entries.
+"""
+
+import hashlib
+import http.client
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Size-bounded, TTL-based cache of HTTP response bodies in a directory.
+
+    Parameters:
+        directory (str): Where cached responses are stored; created if missing.
+        ttl (float): Seconds a response is served without contacting the API.
+        max_bytes (int): Upper bound on the total size of cached bodies.
+    """
+
+    def __init__(self, directory: str, ttl: float = 300, max_bytes: int = 256 * 2**20):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url: str) -> tuple:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, key)
+        return f"{base}.body", f"{base}.meta.json"
+
+    def _read(self, url: str):
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def get(self, url: str, pool) -> bytes:
+        """
+        Return the body for `url`, from the cache when possible.
+
+        Parameters:
+            url (str): Absolute URL to fetch.
+            pool (HTTPConnectionPool): Pool used when the API has to be contacted.
+
+        Returns:
+            bytes: The raw response body.
+        """
+        body_path, meta_path = self._paths(url)
+        meta, body = self._read(url)
+
+        if meta is not None and time.time() - meta["fetched_at"] < self.ttl:
+            self.hits += 1
+            self._touch(body_path)
+            return body
+
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        status, response_headers, response_body = pool.request(url, headers)
+
+        if status == 304 and meta is not None:
+            self.revalidations += 1
+            logger.debug(f"Cached response for {url} is still valid.")
+            meta["fetched_at"] = time.time()
+            self._write_file(meta_path, json.dumps(meta).encode("utf-8"))
+            self._touch(body_path)
+            return body
+
+        if status >= 400:
+            raise urllib.error.HTTPError(
+                url,
+                status,
+                http.client.responses.get(status, ""),
+                response_headers,
+                None,
+            )
+
+        self.misses += 1
+        meta = {
+            "url": url,
+            "fetched_at": time.time(),
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified"),
+        }
+        self._write_file(body_path, response_body)
+        self._write_file(meta_path, json.dumps(meta).encode("utf-8"))
+        self._evict()
+        return response_body
+
+    def _touch(self, path: str):
+        """Mark an entry as recently used; eviction goes by modification time."""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _write_file(self, path: str, content: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _evict(self):
+        """Remove least recently used entries until the bodies fit in `max_bytes`."""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".body"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, body_path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                logger.debug(f"Evicting {body_path} from the response cache.")
+                for path in (body_path, body_path[: -len(".body")] + ".meta.json"):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+
+    def clear(self):
+        """Remove every cached response."""
+        with self._lock:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith((".body", ".meta.json")):
+                    os.remove(entry.path)
@@ -0,0 +1,137 @@
+"""
+Skip saving NESO forecasts that have not changed since the last run
+
+NESO republishes its forecast on its own schedule, so polling more often than
+that fetches the same values again. `ChangeDetector` remembers a fingerprint of
+every page it has seen and the last value saved for each target time, so that:
+- a page with a known fingerprint is skipped before formatting or saving, and
+- a page with some new values is cut down to just the target times that changed.
+"""
+
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from neso_solar_consumer.state import StateFile
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "change_detection"
+MAX_FINGERPRINTS = 64
+
+
+def fingerprint(data: pd.DataFrame) -> str:
+    """
+    Hash the normalised `Datetime_GMT`/`solar_forecast_kw` content of a DataFrame.
+
+    Rows are sorted by time first, so the result does not depend on row order or
+    on the index.
+
+    Parameters:
+        data (pd.DataFrame): DataFrame containing `Datetime_GMT` (UTC) and `solar_forecast_kw`.
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    data = data.sort_values("Datetime_GMT", kind="stable")
+    target_times = _epoch_seconds(data["Datetime_GMT"])
+    values = data["solar_forecast_kw"].to_numpy(dtype="float64")
+
+    digest = hashlib.sha256()
+    digest.update(target_times.tobytes())
+    digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def _epoch_seconds(target_times: pd.Series) -> np.ndarray:
+    return target_times.dt.as_unit("s").astype("int64").to_numpy()
+
+
+class ChangeDetector:
+    """
+    Track what has been saved for one resource in a `StateFile`.
+
+    Call `changed_rows` before formatting a page, and `commit` once its forecast
+    has been saved, so a failed save is retried on the next run.
+
+    Parameters:
+        state (StateFile): Where fingerprints and values are kept between runs.
+        resource_id (str): The NESO resource the pages come from.
+        retention (timedelta): How long to remember values for past target times.
+    """
+
+    def __init__(
+        self,
+        state: StateFile,
+        resource_id: str,
+        retention: timedelta = timedelta(days=7),
+    ):
+        self.state = state
+        self.resource_id = resource_id
+        self.retention = retention
+
+        resource_state = state.get(STATE_KEY, {}).get(resource_id, {})
+        self._fingerprints = list(resource_state.get("fingerprints", []))
+        self._values = {int(k): v for k, v in resource_state.get("values", {}).items()}
+
+    def changed_rows(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Return the rows of `data` whose value differs from the last saved one.
+
+        Parameters:
+            data (pd.DataFrame): DataFrame containing `Datetime_GMT` and `solar_forecast_kw`.
+
+        Returns:
+            pd.DataFrame: The new or changed rows; empty if nothing changed.
+        """
+        if fingerprint(data) in self._fingerprints:
+            logger.info(
+                f"Forecast for {self.resource_id} is unchanged since the last run."
+            )
+            return data.iloc[0:0]
+
+        target_times = _epoch_seconds(data["Datetime_GMT"])
+        seen = np.isin(target_times, np.fromiter(self._values, dtype="int64"))
+        previous = (
+            pd.Series(self._values, dtype="float64").reindex(target_times).to_numpy()
+        )
+        current = data["solar_forecast_kw"].to_numpy(dtype="float64")
+        same = (previous == current) | (np.isnan(previous) & np.isnan(current))
+        unchanged = seen & same
+
+        changed = data[~unchanged]
+        logger.info(
+            f"{len(changed)} of {len(data)} target times changed for {self.resource_id}."
+        )
+        return changed
+
+    def commit(self, data: pd.DataFrame):
+        """
+        Record `data` as saved: remember its fingerprint and values, then write the state.
+
+        Parameters:
+            data (pd.DataFrame): The full page that was checked with `changed_rows`.
+        """
+        page_fingerprint = fingerprint(data)
+        if page_fingerprint not in self._fingerprints:
+            self._fingerprints = (self._fingerprints + [page_fingerprint])[
+                -MAX_FINGERPRINTS:
+            ]
+
+        values = data["solar_forecast_kw"].to_numpy(dtype="float64")
+        for target_time, value in zip(_epoch_seconds(data["Datetime_GMT"]), values):
+            self._values[int(target_time)] = None if np.isnan(value) else float(value)
+
+        # forget target times that are well in the past
+        cutoff = (datetime.now(tz=timezone.utc) - self.retention).timestamp()
+        self._values = {k: v for k, v in self._values.items() if k >= cutoff}
+
+        all_state = self.state.get(STATE_KEY, {})
+        all_state[self.resource_id] = {
+            "fingerprints": self._fingerprints,
+            "values": {str(k): v for k, v in self._values.items()},
+        }
+        self.state.set(STATE_KEY, all_state)
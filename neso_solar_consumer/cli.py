@@ -0,0 +1,189 @@
+"""
+Command line entry point for the NESO solar consumer
+
+    python -m neso_solar_consumer run       fetch, format and save one round (`app.py`)
+    python -m neso_solar_consumer backfill  load a historical date range (`backfill.py`)
+    python -m neso_solar_consumer check     ask whether NESO has published anything new
+
+Each command imports what it needs when it runs, so `check`, `--help` and a
+`run --if-changed` with nothing new to do start without loading pandas,
+SQLAlchemy or nowcasting_datamodel. `check` exits with 0 when there is new data,
+1 when there is none and 2 when the check failed, so a cron job can use
+`check && run`; `run --if-changed` does the same in one command and records
+what it ingested in the state file.
+
+Options default to the environment variables `app.py` reads (DATABASE_URL,
+SAVE_METHOD, STATE_PATH, ...).
+"""
+
+import argparse
+import logging
+import os
+from typing import Optional
+
+from neso_solar_consumer.config import Neso
+from neso_solar_consumer.probe import has_new_data, record_published
+from neso_solar_consumer.state import StateFile
+
+logger = logging.getLogger(__name__)
+
+EXIT_NEW = 0
+EXIT_UNCHANGED = 1
+EXIT_ERROR = 2
+
+
+def env_flag(name: str) -> Optional[bool]:
+    """Read a yes/no environment variable, or None when it is not set."""
+    value = os.getenv(name)
+    if value is None:
+        return None
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _state(state_path: Optional[str]) -> Optional[StateFile]:
+    return StateFile(state_path) if state_path else None
+
+
+def check(args: argparse.Namespace) -> int:
+    """Report whether `args.resource_id` has changed since the last recorded run."""
+    try:
+        is_new, _ = has_new_data(_state(args.state_path), args.resource_id)
+    except Exception as e:
+        logger.error(f"Could not check {args.resource_id} for new data: {e}")
+        return EXIT_ERROR
+    return EXIT_NEW if is_new else EXIT_UNCHANGED
+
+
+def run(args: argparse.Namespace) -> int:
+    """
+    Run the pipeline once, optionally only when there is new data.
+
+    Returns:
+        int: 0 when the run succeeded or had nothing to do, else `EXIT_ERROR`.
+    """
+    if not args.database_url:
+        logger.error("DATABASE_URL environment variable is not set. Exiting.")
+        return EXIT_ERROR
+
+    state = _state(args.state_path)
+    marker = None
+    if args.if_changed:
+        if state is None:
+            logger.error(
+                "--if-changed needs a state file (--state-path or STATE_PATH)."
+            )
+            return EXIT_ERROR
+        try:
+            is_new, marker = has_new_data(state, Neso.RESOURCE_ID)
+        except Exception as e:
+            # the check only saves work, so run anyway when it fails
+            logger.warning(f"Could not check for new data, running anyway: {e}")
+            is_new = True
+        if not is_new:
+            return 0
+
+    # The heavy imports start here
+    from neso_solar_consumer.app import app
+    from neso_solar_consumer.metrics import profile_run
+
+    if args.cache_dir:
+        from neso_solar_consumer.cache import ResponseCache
+        from neso_solar_consumer.http_client import set_cache
+
+        set_cache(
+            ResponseCache(
+                args.cache_dir,
+                ttl=Neso.CACHE_TTL_SECONDS,
+                max_bytes=Neso.CACHE_MAX_BYTES,
+            )
+        )
+
+    try:
+        with profile_run():
+            app(
+                db_url=args.database_url,
+                save_method=args.save_method,
+                state_path=args.state_path,
+                metrics_path=args.metrics_path,
+                archive_dir=args.archive_dir,
+                incremental=args.incremental,
+            )
+    except Exception:
+        # `app` has logged the error. The marker is not recorded, so the next
+        # `--if-changed` run tries this publication again.
+        return EXIT_ERROR
+
+    if marker is not None:
+        # `app` keeps its own watermark and fingerprints in the same file, so
+        # read it again rather than writing back what was loaded before the run
+        record_published(_state(args.state_path), Neso.RESOURCE_ID, marker)
+    return 0
+
+
+def backfill(args: argparse.Namespace, extra: list) -> int:
+    """Hand the remaining arguments to `backfill.main`."""
+    from neso_solar_consumer.backfill import main as backfill_main
+
+    backfill_main(extra)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="neso_solar_consumer", description="Consume NESO solar forecasts."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="fetch, format and save once")
+    run_parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    run_parser.add_argument("--save-method", default=os.getenv("SAVE_METHOD"))
+    run_parser.add_argument("--state-path", default=os.getenv("STATE_PATH"))
+    run_parser.add_argument("--metrics-path", default=os.getenv("METRICS_PATH"))
+    run_parser.add_argument("--archive-dir", default=os.getenv("ARCHIVE_DIR"))
+    run_parser.add_argument("--cache-dir", default=os.getenv("CACHE_DIR"))
+    run_parser.add_argument(
+        "--incremental",
+        action=argparse.BooleanOptionalAction,
+        default=env_flag("INCREMENTAL"),
+    )
+    run_parser.add_argument(
+        "--if-changed",
+        action="store_true",
+        help="exit without running when NESO has published nothing new",
+    )
+
+    commands.add_parser(
+        "backfill",
+        help="load a historical date range; see `backfill --help`",
+        add_help=False,
+    )
+
+    check_parser = commands.add_parser(
+        "check",
+        help="exit 0 if NESO has published new data, 1 if not, 2 on error",
+    )
+    check_parser.add_argument("--resource-id", default=Neso.RESOURCE_ID)
+    check_parser.add_argument("--state-path", default=os.getenv("STATE_PATH"))
+    return parser
+
+
+def main(argv: Optional[list] = None) -> int:
+    """
+    Parse `argv` and run the command.
+
+    Returns:
+        int: The process exit status.
+    """
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
+    )
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+
+    if args.command == "backfill":
+        return backfill(args, extra)
+    if extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    if args.command == "check":
+        return check(args)
+    return run(args)
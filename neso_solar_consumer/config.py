@@ -2,6 +2,49 @@
 
 
 class Neso:
+    API_URL = "https://api.neso.energy/api/3/action"
     RESOURCE_ID = "example_resource_id"
     LIMIT = 100
+    PAGE_SIZE = 100
+    FETCH_WORKERS = 1
+    MAX_CONNECTIONS_PER_HOST = 8
+    # Pages fetched ahead of the database writer, see `pipeline.py`
+    PREFETCH_PAGES = 2
+    # Fetch resilience: socket timeouts, retries with exponential backoff and full
+    # jitter, and a per-host circuit breaker that lasts across daemon cycles
+    CONNECT_TIMEOUT_SECONDS = 10
+    READ_TIMEOUT_SECONDS = 60
+    FETCH_RETRIES = 3
+    FETCH_BACKOFF_SECONDS = 1
+    FETCH_MAX_BACKOFF_SECONDS = 30
+    CIRCUIT_FAILURE_THRESHOLD = 5
+    CIRCUIT_RESET_SECONDS = 300
+    # Incremental mode: fetch only rows after the latest target time already saved,
+    # less this many hours. NESO revises every target time in its forecast horizon
+    # (14 days ahead) with each publication, so the lookback covers all of it.
+    INCREMENTAL = False
+    INCREMENTAL_LOOKBACK_HOURS = 14 * 24
+    CACHE_TTL_SECONDS = 300
+    CACHE_MAX_BYTES = 256 * 2**20
     MODEL_TAG = "real_data_model"
+    # Regional datasets: record field holding the GSP id, for one forecast per GSP
+    GSP_ID_FIELD = "GSP_ID"
+    SAVE_METHOD = "orm"
+    METADATA_CACHE_TTL_SECONDS = 300
+    # Daemon mode: cron schedule in UTC, random delay added to each start, and retries
+    SCHEDULE = "*/30 * * * *"
+    SCHEDULE_JITTER_SECONDS = 30
+    RETRY_BACKOFF_SECONDS = 30
+    MAX_BACKOFF_SECONDS = 600
+    # Historical backfill, see `backfill.py`
+    BACKFILL_WINDOW_DAYS = 7
+    BACKFILL_WORKERS = 4
+    BACKFILL_STATE_PATH = "backfill_state.json"
+    # Most rows `datastore_search_sql` returns for one query (CKAN's rows_max)
+    SQL_ROWS_MAX = 32000
+    # Processes preparing forecast value rows for backfill saves (1 = in-process),
+    # and rows handed to a process at a time, see `parallel_save.py`
+    FORMAT_WORKERS = 1
+    FORMAT_SHARD_SIZE = 50_000
+    # Resources handled by `async_app`, mapped to the model tag they are saved under
+    RESOURCES = {RESOURCE_ID: MODEL_TAG}
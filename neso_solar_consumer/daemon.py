@@ -0,0 +1,240 @@
+"""
+Long-running NESO consumer
+
+`python -m neso_solar_consumer.app` pays for interpreter start-up, the pandas,
+SQLAlchemy and nowcasting_datamodel imports and a new database engine on every
+run. The daemon does that once, then runs the pipeline on a cron-like schedule
+against the same engine and connection pool, so each cycle only costs the work
+itself. Failed cycles are retried with exponential backoff, and SIGTERM/SIGINT
+stop the loop between cycles.
+
+Run with:
+    DATABASE_URL=... python -m neso_solar_consumer.daemon
+"""
+
+import logging
+import os
+import random
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from nowcasting_datamodel.connection import DatabaseConnection
+from nowcasting_datamodel.models import Base_Forecast
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from neso_solar_consumer import __version__
+from neso_solar_consumer.app import make_watermark, run_pipelined
+from neso_solar_consumer.change_detection import ChangeDetector
+from neso_solar_consumer.cli import env_flag
+from neso_solar_consumer.config import Neso
+from neso_solar_consumer.metadata_cache import MetadataCache
+from neso_solar_consumer.metrics import get_metrics, profile_run
+from neso_solar_consumer.schedule import CronSchedule
+from neso_solar_consumer.state import StateFile
+
+logger = logging.getLogger(__name__)
+
+
+class PooledDatabaseConnection(DatabaseConnection):
+    """
+    `DatabaseConnection` whose pool checks connections before handing them out.
+
+    Connections sit idle between daemon cycles, long enough for the server or a
+    proxy to close them, so the engine is created with `pool_pre_ping=True`.
+    The base class would build its own engine in `__init__`, so this sets up the
+    same attributes itself rather than building one only to replace it.
+
+    Parameters:
+        url (str): Database connection URL.
+        base: Declarative base whose tables `create_all`/`drop_all` manage.
+        echo (bool, optional): Log every statement. Defaults to False.
+    """
+
+    def __init__(self, url: str, base=Base_Forecast, echo: bool = False):
+        assert url is not None, Exception("Need to set url for database connection")
+        self.url = url
+        self.base = base
+        self.engine = create_engine(url, echo=echo, pool_pre_ping=True)
+        self.Session = sessionmaker(bind=self.engine)
+        self.partitions = []
+
+
+class Daemon:
+    """
+    Run the forecast pipeline repeatedly with one warm database connection.
+
+    Parameters:
+        db_url (str): Database connection URL.
+        schedule (str, optional): Cron expression for the cycles, in UTC.
+            Defaults to `Neso.SCHEDULE`.
+        jitter (float, optional): Up to this many seconds are added at random to
+            each scheduled start. Defaults to `Neso.SCHEDULE_JITTER_SECONDS`.
+        backoff (float, optional): Delay before the first retry of a failed cycle,
+            doubled on each further failure. Defaults to `Neso.RETRY_BACKOFF_SECONDS`.
+        max_backoff (float, optional): Upper bound on the retry delay.
+            Defaults to `Neso.MAX_BACKOFF_SECONDS`.
+        save_method (str, optional): one of `SAVE_METHODS`, see `save_forecasts_to_db`.
+        state_path (str, optional): State file for change detection, see `app`.
+        metrics_path (str, optional): Prometheus textfile rewritten after each cycle.
+        archive_dir (str, optional): Keep every fetched page in this `RawArchive`.
+        incremental (bool, optional): Only fetch rows after the latest target time
+            already saved, see `app`. Defaults to `Neso.INCREMENTAL`.
+    """
+
+    def __init__(
+        self,
+        db_url: str,
+        schedule: Optional[str] = None,
+        jitter: Optional[float] = None,
+        backoff: Optional[float] = None,
+        max_backoff: Optional[float] = None,
+        save_method: Optional[str] = None,
+        state_path: Optional[str] = None,
+        metrics_path: Optional[str] = None,
+        archive_dir: Optional[str] = None,
+        incremental: Optional[bool] = None,
+    ):
+        self.db_url = db_url
+        self.metrics_path = metrics_path
+        self.schedule = CronSchedule(schedule or Neso.SCHEDULE)
+        self.jitter = Neso.SCHEDULE_JITTER_SECONDS if jitter is None else jitter
+        self.backoff = Neso.RETRY_BACKOFF_SECONDS if backoff is None else backoff
+        self.max_backoff = (
+            Neso.MAX_BACKOFF_SECONDS if max_backoff is None else max_backoff
+        )
+        self.save_method = save_method
+
+        state = StateFile(state_path) if state_path else None
+        self.change_detector = None
+        if state is not None:
+            self.change_detector = ChangeDetector(state, Neso.RESOURCE_ID)
+        self.watermark = make_watermark(state, incremental)
+
+        self.archive = None
+        if archive_dir:
+            from neso_solar_consumer.archive import RawArchive
+
+            self.archive = RawArchive(archive_dir)
+
+        self.metadata_cache = MetadataCache()
+        self.connection = None
+        self.cycles = 0
+        self.failures = 0
+        self.last_cycle_seconds = None
+        self._stop = threading.Event()
+
+    def stop(self, *_):
+        """Ask the loop to exit; a cycle that is running is allowed to finish."""
+        logger.info("Stopping the NESO consumer daemon.")
+        self._stop.set()
+
+    def connect(self) -> DatabaseConnection:
+        """Create the database connection that every cycle shares."""
+        return PooledDatabaseConnection(url=self.db_url, base=Base_Forecast)
+
+    def run_cycle(self) -> int:
+        """
+        Run the pipeline once and log how long it took.
+
+        Returns:
+            int: The number of rows fetched.
+        """
+        start = time.perf_counter()
+        n_rows = run_pipelined(
+            self.connection,
+            save_method=self.save_method,
+            change_detector=self.change_detector,
+            metadata_cache=self.metadata_cache,
+            archive=self.archive,
+            watermark=self.watermark,
+        )
+        self.last_cycle_seconds = time.perf_counter() - start
+        self.cycles += 1
+        logger.info(
+            f"Cycle {self.cycles} took {self.last_cycle_seconds:.2f}s "
+            f"({n_rows} rows, metadata cache {self.metadata_cache.hits} hits / "
+            f"{self.metadata_cache.misses} misses)."
+        )
+        return n_rows
+
+    def _seconds_until_next_cycle(self) -> float:
+        now = datetime.now(tz=timezone.utc)
+        next_run = self.schedule.next_after(now)
+        delay = (next_run - now).total_seconds() + random.uniform(0, self.jitter)
+
+        if self.failures:
+            retry = min(self.backoff * 2 ** (self.failures - 1), self.max_backoff)
+            # full jitter, so that several consumers do not retry in lockstep
+            delay = min(delay, random.uniform(retry / 2, retry))
+        return delay
+
+    def run(self, run_immediately: bool = True, max_cycles: Optional[int] = None):
+        """
+        Run cycles until `stop` is called.
+
+        Parameters:
+            run_immediately (bool): Run a cycle on start-up rather than waiting for
+                the first scheduled time.
+            max_cycles (int, optional): Return after this many attempted cycles.
+        """
+        logger.info(
+            f"Starting the NESO consumer daemon (version: {__version__}, "
+            f"schedule: {self.schedule.expression!r})."
+        )
+        if self.connection is None:
+            self.connection = self.connect()
+
+        attempts = 0
+        try:
+            while not self._stop.is_set():
+                if attempts or not run_immediately:
+                    delay = self._seconds_until_next_cycle()
+                    logger.debug(f"Next cycle in {delay:.1f}s.")
+                    if self._stop.wait(delay):
+                        break
+
+                attempts += 1
+                try:
+                    self.run_cycle()
+                    self.failures = 0
+                except Exception as e:
+                    self.failures += 1
+                    logger.error(f"Cycle failed ({self.failures} in a row): {e}")
+
+                if self.metrics_path:
+                    get_metrics().write_textfile(self.metrics_path)
+
+                if max_cycles is not None and attempts >= max_cycles:
+                    break
+        finally:
+            self.connection.engine.dispose()
+            logger.info("NESO consumer daemon stopped.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
+    )
+
+    db_url = os.getenv("DATABASE_URL")
+    if not db_url:
+        logger.error("DATABASE_URL environment variable is not set. Exiting.")
+        exit(1)
+
+    daemon = Daemon(
+        db_url=db_url,
+        schedule=os.getenv("SCHEDULE"),
+        save_method=os.getenv("SAVE_METHOD"),
+        state_path=os.getenv("STATE_PATH"),
+        metrics_path=os.getenv("METRICS_PATH"),
+        archive_dir=os.getenv("ARCHIVE_DIR"),
+        incremental=env_flag("INCREMENTAL"),
+    )
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    with profile_run():
+        daemon.run()
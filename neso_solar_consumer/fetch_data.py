@@ -1,14 +1,141 @@
 """
 Script to fetch NESO Solar Forecast Data
 This script provides functions to fetch solar forecast data from the NESO API.
-The data includes solar generation estimates for embedded solar farms and combines 
+The data includes solar generation estimates for embedded solar farms and combines
 date and time fields into a single timestamp for further analysis.
 """
 
-import urllib.request
+import logging
 import urllib.parse
 import json
+from collections import deque
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+import numpy as np
 import pandas as pd
+from neso_solar_consumer.config import Neso
+from neso_solar_consumer.http_client import HTTPConnectionPool, fetch_url, get_pool
+from neso_solar_consumer.metrics import stage
+
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:  # optional, `pip install .[fast]`
+    _json_loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+DATETIME_GMT_FORMAT = "%Y-%m-%d %H:%M"
+# The columns `_records_to_dataframe` reads, selected by `incremental_query`
+SQL_COLUMNS = ("DATE_GMT", "TIME_GMT", "EMBEDDED_SOLAR_FORECAST")
+
+
+class FetchError(Exception):
+    """
+    Raised by the paginated fetchers when a page cannot be fetched.
+
+    The pages before the failed one have already been yielded, so callers can
+    save what they have before handling the error.
+    """
+
+
+def _records_to_dataframe(records: list) -> pd.DataFrame:
+    """
+    Turn a list of NESO API records into the two-column forecast DataFrame.
+
+    Parameters:
+        records (list): Records from the `result.records` field of an API response.
+
+    Returns:
+        pd.DataFrame: A DataFrame with `Datetime_GMT` (UTC) and `solar_forecast_kw`,
+            plus `gsp_id` when the records have a `Neso.GSP_ID_FIELD` field.
+    """
+    with stage("parse") as stage_record:
+        # Pull out only the three fields we use, not a frame of every column
+        dates = pd.Series([record.get("DATE_GMT") for record in records], dtype=object)
+        times = pd.Series([record.get("TIME_GMT") for record in records], dtype=object)
+        solar_forecast_kw = np.array(
+            [record.get("EMBEDDED_SOLAR_FORECAST") for record in records],
+            dtype="float64",
+        )
+
+        # Parse and combine DATE_GMT and TIME_GMT into Datetime_GMT
+        datetime_gmt = _parse_datetime_gmt(dates, times)
+
+        df = pd.DataFrame(
+            {"Datetime_GMT": datetime_gmt, "solar_forecast_kw": solar_forecast_kw}
+        )
+
+        # Regional datasets also say which GSP each record is for
+        if records and Neso.GSP_ID_FIELD in records[0]:
+            df["gsp_id"] = pd.to_numeric(
+                pd.Series([record.get(Neso.GSP_ID_FIELD) for record in records]),
+                errors="coerce",
+            )
+
+        # Drop rows with invalid Datetime_GMT
+        df = df.dropna(subset=["Datetime_GMT"])
+
+        stage_record.add(rows=len(df))
+
+    return df
+
+
+def _parse_datetime_gmt(dates: pd.Series, times: pd.Series) -> pd.Series:
+    """
+    Combine `DATE_GMT` and `TIME_GMT` values into UTC timestamps.
+
+    Equivalent to `pd.to_datetime(dates.str[:10] + " " + times.str.strip(),
+    format="%Y-%m-%d %H:%M", errors="coerce")`, but half-hourly data only has a
+    few distinct dates and 48 distinct times, so each distinct value is parsed
+    once and the results are added together. Missing or malformed values give `NaT`.
+
+    Parameters:
+        dates (pd.Series): `DATE_GMT` values, e.g. "2024-01-01T00:00:00".
+        times (pd.Series): `TIME_GMT` values, e.g. "13:30".
+
+    Returns:
+        pd.Series: UTC timestamps with the index of `dates`.
+    """
+    date_codes, unique_dates = pd.factorize(dates)
+    time_codes, unique_times = pd.factorize(times)
+
+    # Parse each part next to a valid counterpart, so it is accepted exactly when
+    # it would be accepted as part of the combined string
+    days = pd.to_datetime(
+        pd.Series(unique_dates, dtype=object).str[:10] + " 00:00",
+        format=DATETIME_GMT_FORMAT,
+        errors="coerce",
+    ).to_numpy()
+    times_of_day = pd.to_datetime(
+        "1970-01-01 " + pd.Series(unique_times, dtype=object).str.strip(),
+        format=DATETIME_GMT_FORMAT,
+        errors="coerce",
+    ).to_numpy(dtype=days.dtype)
+    times_of_day = times_of_day - np.datetime64(0, np.datetime_data(days.dtype)[0])
+
+    # Missing values have code -1, which picks the NaT appended at the end
+    days = np.append(days, np.datetime64("NaT"))
+    times_of_day = np.append(times_of_day, np.timedelta64("NaT"))
+    datetime_gmt = days[date_codes] + times_of_day[time_codes]
+
+    return pd.Series(datetime_gmt, index=dates.index).dt.tz_localize("UTC")
+
+
+def _decode(payload: bytes) -> dict:
+    """Decode a raw API response body."""
+    with stage("decode") as record:
+        data = _json_loads(payload)
+        record.add(n_bytes=len(payload))
+    return data
+
+
+def _payload_to_dataframe(payload: bytes) -> pd.DataFrame:
+    """Decode a raw API response body into the two-column forecast DataFrame."""
+    data = _decode(payload)
+    return _records_to_dataframe(data["result"]["records"])
 
 
 def fetch_data(resource_id: str, limit: int) -> pd.DataFrame:
@@ -24,36 +151,210 @@ def fetch_data(resource_id: str, limit: int) -> pd.DataFrame:
                       - `Datetime_GMT`: Combined date and time in UTC.
                       - `solar_forecast_kw`: Estimated solar forecast in kW.
     """
-    base_url = "https://api.neso.energy/api/3/action/datastore_search"
+    base_url = f"{Neso.API_URL}/datastore_search"
     url = f"{base_url}?resource_id={resource_id}&limit={limit}"
 
     try:
-        response = urllib.request.urlopen(url)
-        data = json.loads(response.read().decode("utf-8"))
-        records = data["result"]["records"]
+        return _payload_to_dataframe(fetch_url(url))
 
-        # Create DataFrame from records
-        df = pd.DataFrame(records)
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        return pd.DataFrame()
 
-        # Parse and combine DATE_GMT and TIME_GMT into Datetime_GMT
-        df["Datetime_GMT"] = pd.to_datetime(
-            df["DATE_GMT"].str[:10] + " " + df["TIME_GMT"].str.strip(),
-            format="%Y-%m-%d %H:%M",
-            errors="coerce",
-        ).dt.tz_localize("UTC")
 
-        # Rename and select necessary columns
-        df = df.rename(columns={"EMBEDDED_SOLAR_FORECAST": "solar_forecast_kw"})
-        df = df[["Datetime_GMT", "solar_forecast_kw"]]
+def fetch_data_pages(
+    resource_id: str,
+    page_size: int,
+    max_records: Optional[int] = None,
+    on_records: Optional[Callable[[list], None]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Fetch data from the NESO API one page at a time.
 
-        # Drop rows with invalid Datetime_GMT
-        df = df.dropna(subset=["Datetime_GMT"])
+    Follows CKAN's `_links.next` pagination and yields one processed DataFrame per
+    page, so memory use is bounded by `page_size` rather than the total row count.
+    Each page is retried on its own by `fetch_url`.
+
+    Parameters:
+        resource_id (str): The unique resource ID for the dataset in the API.
+        page_size (int): The number of records to request per page.
+        max_records (int, optional): Stop after this many records. Fetches the whole
+            resource when not given.
+        on_records (callable, optional): Called with the raw records of each
+            page before they are parsed, e.g. to archive them.
+
+    Yields:
+        pd.DataFrame: A DataFrame per page with the same columns as `fetch_data`.
+
+    Raises:
+        FetchError: If a page still fails after its retries, once the pages
+            before it have been yielded.
+    """
+    base_url = f"{Neso.API_URL}/datastore_search"
+    url = f"{base_url}?resource_id={resource_id}&limit={page_size}"
+    n_records = 0
+
+    while url is not None:
+        if max_records is not None:
+            remaining = max_records - n_records
+            if remaining <= 0:
+                return
+            if remaining < page_size:
+                url = _set_query_param(url, "limit", remaining)
+
+        try:
+            result = _decode(fetch_url(url))["result"]
+        except Exception as e:
+            raise FetchError(
+                f"Failed to fetch page after {n_records} records: {e}"
+            ) from e
+
+        records = result["records"]
+        if not records:
+            return
+
+        n_records += len(records)
+        logger.debug(f"Fetched {len(records)} records ({n_records} so far).")
+        if on_records is not None:
+            on_records(records)
+        yield _records_to_dataframe(records)
+
+        # CKAN always returns a next link, so stop on a short or final page
+        total = result.get("total")
+        if len(records) < int(result.get("limit", page_size)) or (
+            total is not None and int(result.get("offset", 0)) + len(records) >= total
+        ):
+            return
+
+        next_link = result.get("_links", {}).get("next")
+        url = urllib.parse.urljoin(url, next_link) if next_link else None
+
+
+def _set_query_param(url: str, name: str, value) -> str:
+    """Return `url` with the query parameter `name` set to `value`."""
+    parsed = urllib.parse.urlparse(url)
+    query = dict(urllib.parse.parse_qsl(parsed.query))
+    query[name] = str(value)
+    return urllib.parse.urlunparse(parsed._replace(query=urllib.parse.urlencode(query)))
 
-        return df
 
+def _fetch_page(
+    pool: HTTPConnectionPool, resource_id: str, limit: int, offset: int
+) -> dict:
+    """Fetch the `datastore_search` result for one page at an explicit offset."""
+    query = urllib.parse.urlencode(
+        {"resource_id": resource_id, "limit": limit, "offset": offset}
+    )
+    url = f"{Neso.API_URL}/datastore_search?{query}"
+    return _decode(fetch_url(url, pool))["result"]
+
+
+def _fetch_page_dataframe(
+    pool: HTTPConnectionPool, resource_id: str, limit: int, offset: int
+) -> tuple:
+    """Fetch and parse one page, returning (records, DataFrame)."""
+    records = _fetch_page(pool, resource_id, limit, offset)["records"]
+    return records, _records_to_dataframe(records)
+
+
+def fetch_data_concurrent(
+    resource_id: str,
+    page_size: int,
+    max_workers: int = 4,
+    max_records: Optional[int] = None,
+    pool: Optional[HTTPConnectionPool] = None,
+    on_records: Optional[Callable[[list], None]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Fetch data from the NESO API with several pages in flight at once.
+
+    The first page tells us the `total` record count, after which the remaining
+    pages are requested by offset from a pool of worker threads. Pages are yielded
+    in order, and at most `2 * max_workers` pages are held in memory at once.
+
+    If a page fails after its retries, the pages already in flight are still
+    yielded when they succeed, so that as much as possible can be saved, and then
+    `FetchError` is raised.
+
+    Parameters:
+        resource_id (str): The unique resource ID for the dataset in the API.
+        page_size (int): The number of records to request per page.
+        max_workers (int): Number of worker threads fetching pages.
+        max_records (int, optional): Stop after this many records. Fetches the whole
+            resource when not given.
+        pool (HTTPConnectionPool, optional): Connection pool to use. Defaults to the
+            shared pool, whose per-host limit also caps the concurrency.
+        on_records (callable, optional): As for `fetch_data_pages`, called in
+            page order.
+
+    Yields:
+        pd.DataFrame: A DataFrame per page with the same columns as `fetch_data`.
+
+    Raises:
+        FetchError: If a page fails, after the pages that could be fetched are yielded.
+    """
+    pool = pool or get_pool()
+    first_limit = page_size if max_records is None else min(page_size, max_records)
+
+    try:
+        first_page = _fetch_page(pool, resource_id, first_limit, 0)
     except Exception as e:
-        print(f"An error occurred: {e}")
-        return pd.DataFrame()
+        raise FetchError(f"Failed to fetch the first page: {e}") from e
+
+    total = first_page.get("total", len(first_page["records"]))
+    if max_records is not None:
+        total = min(total, max_records)
+    if not first_page["records"]:
+        return
+    if on_records is not None:
+        on_records(first_page["records"])
+    yield _records_to_dataframe(first_page["records"])
+
+    offsets = range(len(first_page["records"]), total, page_size)
+    logger.debug(
+        f"Fetching {len(offsets)} more pages of {resource_id} with {max_workers} workers."
+    )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        offsets = iter(offsets)
+        while True:
+            # Keep a bounded window of pages in flight, then yield them in order
+            while len(pending) < 2 * max_workers:
+                offset = next(offsets, None)
+                if offset is None:
+                    break
+                limit = min(page_size, total - offset)
+                pending.append(
+                    executor.submit(
+                        _fetch_page_dataframe, pool, resource_id, limit, offset
+                    )
+                )
+            if not pending:
+                return
+
+            try:
+                records, df = pending.popleft().result()
+            except Exception as e:
+                # Stop asking for more, but keep the pages that were already on their way
+                for future in pending:
+                    future.cancel()
+                n_salvaged = 0
+                for future in pending:
+                    if future.cancelled() or future.exception() is not None:
+                        continue
+                    n_salvaged += 1
+                    records, df = future.result()
+                    if on_records is not None:
+                        on_records(records)
+                    yield df
+                raise FetchError(
+                    f"Failed to fetch page, stopping after salvaging "
+                    f"{n_salvaged} pages in flight: {e}"
+                ) from e
+            if on_records is not None:
+                on_records(records)
+            yield df
 
 
 def fetch_data_using_sql(sql_query: str) -> pd.DataFrame:
@@ -68,34 +369,161 @@ def fetch_data_using_sql(sql_query: str) -> pd.DataFrame:
                       - `Datetime_GMT`: Combined date and time in UTC.
                       - `solar_forecast_kw`: Estimated solar forecast in kW.
     """
-    base_url = "https://api.neso.energy/api/3/action/datastore_search_sql"
-    encoded_query = urllib.parse.quote(sql_query)
-    url = f"{base_url}?sql={encoded_query}"
-
     try:
-        response = urllib.request.urlopen(url)
-        data = json.loads(response.read().decode("utf-8"))
-        records = data["result"]["records"]
+        return _fetch_sql_dataframe(sql_query)
 
-        # Create DataFrame from records
-        df = pd.DataFrame(records)
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        return pd.DataFrame()
 
-        # Parse and combine DATE_GMT and TIME_GMT into Datetime_GMT
-        df["Datetime_GMT"] = pd.to_datetime(
-            df["DATE_GMT"].str[:10] + " " + df["TIME_GMT"].str.strip(),
-            format="%Y-%m-%d %H:%M",
-            errors="coerce",
-        ).dt.tz_localize("UTC")
 
-        # Rename and select necessary columns
-        df = df.rename(columns={"EMBEDDED_SOLAR_FORECAST": "solar_forecast_kw"})
-        df = df[["Datetime_GMT", "solar_forecast_kw"]]
+def resource_fields(
+    resource_id: str, pool: Optional[HTTPConnectionPool] = None
+) -> list:
+    """Return the names of a datastore resource's fields, without any records."""
+    query = urllib.parse.urlencode({"resource_id": resource_id, "limit": 0})
+    url = f"{Neso.API_URL}/datastore_search?{query}"
+    result = _decode(fetch_url(url, pool))["result"]
+    return [field["id"] for field in result.get("fields", [])]
 
-        # Drop rows with invalid Datetime_GMT
-        df = df.dropna(subset=["Datetime_GMT"])
 
-        return df
+def incremental_query(
+    resource_id: str,
+    since: Optional[datetime],
+    limit: int,
+    offset: int = 0,
+    columns: tuple = SQL_COLUMNS,
+) -> str:
+    """
+    Build the `datastore_search_sql` query for one page of rows after `since`.
+
+    Only the columns that `_records_to_dataframe` reads are selected. `DATE_GMT`
+    holds whole days, so the query filters on the day of `since` and
+    `fetch_data_since` drops the earlier times of that day. Every name and value
+    is quoted, and `since` is formatted from a datetime, never taken as text.
+
+    Parameters:
+        resource_id (str): The unique resource ID for the dataset in the API.
+        since (datetime, optional): Fetch rows after this time. All rows when None.
+        limit (int): The number of records to request.
+        offset (int): The number of records to skip.
+        columns (tuple): The columns to select, `SQL_COLUMNS` plus
+            `Neso.GSP_ID_FIELD` for a regional resource.
+
+    Returns:
+        str: The SQL query.
+    """
+    date_gmt = quote_identifier("DATE_GMT")
+    columns = ", ".join(quote_identifier(name) for name in columns)
+    query = f"SELECT {columns} FROM {quote_identifier(resource_id)}"
+    if since is not None:
+        day = since.astimezone(timezone.utc).date()
+        query += f" WHERE {date_gmt} >= {quote_literal(day.isoformat())}"
+    # `_id` orders rows that share a time, so pages neither skip nor repeat them
+    query += (
+        f" ORDER BY {date_gmt}, {quote_identifier('TIME_GMT')}, "
+        f"{quote_identifier('_id')}"
+    )
+    return query + f" LIMIT {int(limit)} OFFSET {int(offset)}"
+
+
+def fetch_data_since(
+    resource_id: str,
+    since: Optional[datetime],
+    page_size: int,
+    max_records: Optional[int] = None,
+    pool: Optional[HTTPConnectionPool] = None,
+    on_records: Optional[Callable[[list], None]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Fetch the rows of a resource after `since`, one page at a time.
 
+    The filtering happens on the server (see `incremental_query`), so the number
+    of records fetched and parsed grows with the new data rather than with the
+    size of the resource. Pages come oldest first. The resource's fields are
+    looked up first, so that the GSP ids of a regional resource are selected too.
+
+    Parameters:
+        resource_id (str): The unique resource ID for the dataset in the API.
+        since (datetime, optional): Fetch rows after this time, e.g. from a
+            `Watermark`. Fetches the whole resource when None.
+        page_size (int): The number of records to request per page, at most
+            `Neso.SQL_ROWS_MAX`.
+        max_records (int, optional): Stop after this many records.
+        pool (HTTPConnectionPool, optional): Defaults to the shared pool.
+        on_records (callable, optional): As for `fetch_data_pages`, with every
+            record of the page, including those up to `since`.
+
+    Yields:
+        pd.DataFrame: A DataFrame per page with the same columns as `fetch_data`.
+
+    Raises:
+        FetchError: If a page still fails after its retries, once the pages
+            before it have been yielded.
+    """
+    page_size = min(page_size, Neso.SQL_ROWS_MAX)
+    n_records = 0
+
+    # Regional resources also need their GSP ids, for one forecast per GSP
+    try:
+        fields = resource_fields(resource_id, pool)
     except Exception as e:
-        print(f"An error occurred: {e}")
-        return pd.DataFrame()
+        raise FetchError(f"Failed to fetch the fields of {resource_id}: {e}") from e
+    columns = SQL_COLUMNS
+    if Neso.GSP_ID_FIELD in fields:
+        columns += (Neso.GSP_ID_FIELD,)
+
+    while max_records is None or n_records < max_records:
+        limit = page_size
+        if max_records is not None:
+            limit = min(limit, max_records - n_records)
+
+        sql = incremental_query(
+            resource_id, since, limit, offset=n_records, columns=columns
+        )
+        url = f"{Neso.API_URL}/datastore_search_sql?sql={urllib.parse.quote(sql)}"
+        try:
+            records = _decode(fetch_url(url, pool))["result"]["records"]
+        except Exception as e:
+            raise FetchError(
+                f"Failed to fetch page after {n_records} records: {e}"
+            ) from e
+
+        n_records += len(records)
+        if records and on_records is not None:
+            on_records(records)
+        df = _records_to_dataframe(records)
+        if since is not None:
+            df = df[df["Datetime_GMT"] > since]
+        if not df.empty:
+            yield df
+
+        if len(records) < limit:
+            return
+
+
+def _fetch_sql_dataframe(
+    sql_query: str, pool: Optional[HTTPConnectionPool] = None
+) -> pd.DataFrame:
+    """Like `fetch_data_using_sql`, but errors are raised rather than returned as empty."""
+    return _records_to_dataframe(_fetch_sql_records(sql_query, pool))
+
+
+def _fetch_sql_records(
+    sql_query: str, pool: Optional[HTTPConnectionPool] = None
+) -> list:
+    """Run a `datastore_search_sql` query and return its raw records."""
+    base_url = f"{Neso.API_URL}/datastore_search_sql"
+    encoded_query = urllib.parse.quote(sql_query)
+    url = f"{base_url}?sql={encoded_query}"
+    return _decode(fetch_url(url, pool))["result"]["records"]
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a table or column name for `datastore_search_sql`."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(value: str) -> str:
+    """Quote a string value for `datastore_search_sql`."""
+    return "'" + str(value).replace("'", "''") + "'"
@@ -1,22 +1,191 @@
 import logging
 from datetime import datetime, timezone
+from typing import Optional
+import numpy as np
 import pandas as pd
-from nowcasting_datamodel.models import ForecastSQL, ForecastValue
+from nowcasting_datamodel.models import ForecastSQL, ForecastValueSQL
 from nowcasting_datamodel.read.read import (
     get_latest_input_data_last_updated,
     get_location,
 )
 from nowcasting_datamodel.read.read_models import get_model
+from neso_solar_consumer.metadata_cache import MetadataCache, get_locations
 
-# Configure logging (set to INFO for production; use DEBUG during debugging)
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
-)
 logger = logging.getLogger(__name__)
 
 
+def select_forecast_rows(data: pd.DataFrame) -> tuple:
+    """
+    Pick the rows of a forecast frame that become forecast values.
+
+    Rows with a missing time or value are skipped with a warning, and values are
+    converted from kW to MW.
+
+    Parameters:
+        data (pd.DataFrame): DataFrame containing `Datetime_GMT` (UTC) and `solar_forecast_kw`.
+
+    Returns:
+        tuple: The target times (pd.Series) and megawatts (np.ndarray) of the valid rows.
+
+    Raises:
+        ValueError: If any value is negative.
+    """
+    valid = data["Datetime_GMT"].notna() & data["solar_forecast_kw"].notna()
+    n_skipped = len(data) - int(valid.sum())
+    if n_skipped:
+        logger.warning(f"Skipping {n_skipped} rows due to missing data.")
+
+    target_times = data["Datetime_GMT"][valid]
+    # Convert kW to MW
+    megawatts = data["solar_forecast_kw"][valid].to_numpy(dtype="float64") / 1000
+
+    # `ForecastValue` used to enforce this for every row
+    if (megawatts < 0).any():
+        raise ValueError(
+            f"{int((megawatts < 0).sum())} rows have a negative solar forecast."
+        )
+
+    return target_times, megawatts
+
+
+class ForecastValueArrays:
+    """
+    Forecast values held column-wise instead of as ForecastValueSQL objects.
+
+    Each value costs 24 bytes here, against several hundred bytes for an ORM
+    object with its instance state and a tz-aware `Timestamp`. Megawatts stay
+    float64, as stored in the database. Call `to_orm` when the objects are needed.
+
+    Parameters:
+        target_times (np.ndarray): int64 microseconds since the epoch, UTC.
+        megawatts (np.ndarray): float64 forecast values in MW.
+        adjust_mw (np.ndarray, optional): float64 adjust values. Zeros when not given.
+    """
+
+    __slots__ = ("target_times", "megawatts", "adjust_mw")
+
+    def __init__(
+        self,
+        target_times: np.ndarray,
+        megawatts: np.ndarray,
+        adjust_mw: Optional[np.ndarray] = None,
+    ):
+        self.target_times = np.asarray(target_times, dtype="int64")
+        self.megawatts = np.asarray(megawatts, dtype="float64")
+        self.adjust_mw = (
+            np.zeros(len(self.megawatts))
+            if adjust_mw is None
+            else np.asarray(adjust_mw, dtype="float64")
+        )
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame) -> "ForecastValueArrays":
+        """Build the arrays from the valid rows of a forecast frame, see `select_forecast_rows`."""
+        target_times, megawatts = select_forecast_rows(data)
+        epoch_us = target_times.dt.tz_convert("UTC").dt.as_unit("us").astype("int64")
+        return cls(epoch_us.to_numpy(), megawatts)
+
+    def __len__(self) -> int:
+        return len(self.target_times)
+
+    @property
+    def nbytes(self) -> int:
+        return self.target_times.nbytes + self.megawatts.nbytes + self.adjust_mw.nbytes
+
+    def take(self, positions) -> "ForecastValueArrays":
+        """Return the values at `positions`, e.g. the rows of one GSP."""
+        return ForecastValueArrays(
+            self.target_times[positions],
+            self.megawatts[positions],
+            self.adjust_mw[positions],
+        )
+
+    def target_time_index(self) -> pd.DatetimeIndex:
+        """The target times as a tz-aware (UTC) DatetimeIndex."""
+        return pd.to_datetime(self.target_times, unit="us", utc=True)
+
+    def rows(self):
+        """Yield (target_time, megawatts, adjust_mw, properties) for each value."""
+        return zip(
+            self.target_time_index(),
+            self.megawatts.tolist(),
+            self.adjust_mw.tolist(),
+            [None] * len(self),
+        )
+
+    def to_orm(self) -> list:
+        """
+        Build the ForecastValueSQL objects.
+
+        Returns:
+            list: A list of ForecastValueSQL objects, in order.
+        """
+        return [
+            ForecastValueSQL(
+                target_time=target_time,
+                expected_power_generation_megawatts=megawatt,
+                adjust_mw=adjust_mw,
+            )
+            for target_time, megawatt, adjust_mw in zip(
+                self.target_time_index().tolist(),
+                self.megawatts.tolist(),
+                self.adjust_mw.tolist(),
+            )
+        ]
+
+
+class CompactForecast:
+    """
+    A ForecastSQL whose values are kept as `ForecastValueArrays` until needed.
+
+    `save_forecasts_to_db` writes these directly with the "bulk" method.
+
+    Parameters:
+        forecast (ForecastSQL): The forecast, without forecast values.
+        values (ForecastValueArrays): Its values.
+    """
+
+    __slots__ = ("forecast", "values")
+
+    def __init__(self, forecast: ForecastSQL, values: ForecastValueArrays):
+        self.forecast = forecast
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def to_orm(self) -> ForecastSQL:
+        """Return the ForecastSQL with its ForecastValueSQL objects built."""
+        self.forecast.forecast_values = self.values.to_orm()
+        return self.forecast
+
+
+def format_forecast_values(data: pd.DataFrame) -> list:
+    """
+    Convert solar forecast rows into ForecastValueSQL objects.
+
+    This step does not touch the database, so it can run away from the session,
+    e.g. in a worker thread. Rows are filtered and converted column-wise, and the
+    ORM objects are created directly rather than through a pydantic `ForecastValue`
+    per row.
+
+    Parameters:
+        data (pd.DataFrame): DataFrame containing `Datetime_GMT` (UTC) and `solar_forecast_kw`.
+
+    Returns:
+        list: A list of ForecastValueSQL objects, one per valid row.
+    """
+    return ForecastValueArrays.from_frame(data).to_orm()
+
+
 def format_to_forecast_sql(
-    data: pd.DataFrame, model_tag: str, model_version: str, session
+    data: pd.DataFrame,
+    model_tag: str,
+    model_version: str,
+    session,
+    forecast_values: Optional[list] = None,
+    metadata_cache: Optional[MetadataCache] = None,
+    compact: bool = False,
 ) -> list:
     """
     Format solar forecast data into a ForecastSQL object.
@@ -26,35 +195,39 @@ def format_to_forecast_sql(
         model_tag (str): Model tag to fetch model metadata.
         model_version (str): Model version to fetch model metadata.
         session: Database session.
+        forecast_values (list, optional): ForecastValueSQL objects already built from
+            `data` with `format_forecast_values`. Built here when not given.
+        metadata_cache (MetadataCache, optional): Reuse the model, location and input
+            data rows from earlier calls instead of reading them again.
+        compact (bool): Return a `CompactForecast` instead, holding the values as
+            arrays. `forecast_values` is ignored.
 
     Returns:
-        list: A list containing a single ForecastSQL object.
+        list: A list containing a single ForecastSQL (or CompactForecast) object.
     """
     logger.info("Starting format_to_forecast_sql process...")
 
     # Step 1: Retrieve model metadata
-    model = get_model(name=model_tag, version=model_version, session=session)
-    input_data_last_updated = get_latest_input_data_last_updated(session=session)
+    if metadata_cache is not None:
+        model = metadata_cache.get_model(session, model_tag, model_version)
+        input_data_last_updated = metadata_cache.get_input_data_last_updated(session)
+    else:
+        model = get_model(name=model_tag, version=model_version, session=session)
+        input_data_last_updated = get_latest_input_data_last_updated(session=session)
 
     # Step 2: Fetch or create the location
-    location = get_location(session=session, gsp_id=0)  # National forecast
-
-    # Step 3: Process all rows into ForecastValue objects
-    forecast_values = []
-    for _, row in data.iterrows():
-        if pd.isnull(row["Datetime_GMT"]) or pd.isnull(row["solar_forecast_kw"]):
-            logger.warning(f"Skipping row due to missing data: {row}")
-            continue
+    if metadata_cache is not None:
+        location = metadata_cache.get_location(session, gsp_id=0)  # National forecast
+    else:
+        location = get_location(session=session, gsp_id=0)  # National forecast
 
-        target_time = row["Datetime_GMT"]
-
-        # Create ForecastValue object
-        forecast_value = ForecastValue(
-            target_time=target_time,
-            expected_power_generation_megawatts=row["solar_forecast_kw"]
-            / 1000,  # Convert to MW
-        ).to_orm()
-        forecast_values.append(forecast_value)
+    # Step 3: Process all rows into ForecastValue objects, or arrays
+    values = None
+    if compact:
+        values = ForecastValueArrays.from_frame(data)
+        forecast_values = []
+    elif forecast_values is None:
+        forecast_values = format_forecast_values(data)
 
     # Step 4: Create a single ForecastSQL object
     forecast = ForecastSQL(
@@ -65,9 +238,95 @@ def format_to_forecast_sql(
         forecast_values=forecast_values,
         historic=False,
     )
-    logger.info(
-        f"Created ForecastSQL object with {len(forecast_values)} forecast values."
-    )
+    n_values = len(forecast_values)
+    if values is not None:
+        forecast = CompactForecast(forecast, values)
+        n_values = len(values)
+    logger.info(f"Created ForecastSQL object with {n_values} forecast values.")
 
     # Return a single ForecastSQL object in a list
     return [forecast]
+
+
+def format_to_forecast_sql_by_gsp(
+    data: pd.DataFrame,
+    model_tag: str,
+    model_version: str,
+    session,
+    metadata_cache: Optional[MetadataCache] = None,
+    compact: bool = False,
+) -> list:
+    """
+    Format regional solar forecast data into one ForecastSQL object per GSP.
+
+    Rows are grouped by `gsp_id` in a single groupby, and the locations for all
+    GSPs are read (or created) with one query.
+
+    Parameters:
+        data (pd.DataFrame): DataFrame containing `gsp_id`, `Datetime_GMT` (UTC) and
+            `solar_forecast_kw`.
+        model_tag (str): Model tag to fetch model metadata.
+        model_version (str): Model version to fetch model metadata.
+        session: Database session.
+        metadata_cache (MetadataCache, optional): Reuse the model, location and input
+            data rows from earlier calls instead of reading them again.
+        compact (bool): Return `CompactForecast` objects instead, holding the
+            values as arrays.
+
+    Returns:
+        list: A list of ForecastSQL (or CompactForecast) objects, ordered by gsp_id.
+    """
+    logger.info("Starting format_to_forecast_sql_by_gsp process...")
+
+    # Step 1: Drop rows that cannot be turned into forecast values
+    valid = (
+        data["gsp_id"].notna()
+        & data["Datetime_GMT"].notna()
+        & data["solar_forecast_kw"].notna()
+    )
+    n_skipped = len(data) - int(valid.sum())
+    if n_skipped:
+        logger.warning(f"Skipping {n_skipped} rows due to missing data.")
+    data = data[valid]
+    if data.empty:
+        return []
+
+    # Step 2: Build every forecast value at once, then split them by GSP
+    values = ForecastValueArrays.from_frame(data)
+    forecast_values = None if compact else values.to_orm()
+    positions_by_gsp = data.groupby(data["gsp_id"].astype("int64"), sort=True).indices
+
+    # Step 3: Retrieve model metadata and all the locations
+    gsp_ids = [int(gsp_id) for gsp_id in positions_by_gsp]
+    if metadata_cache is not None:
+        model = metadata_cache.get_model(session, model_tag, model_version)
+        input_data_last_updated = metadata_cache.get_input_data_last_updated(session)
+        locations = metadata_cache.get_locations(session, gsp_ids)
+    else:
+        model = get_model(name=model_tag, version=model_version, session=session)
+        input_data_last_updated = get_latest_input_data_last_updated(session=session)
+        locations = get_locations(session, gsp_ids)
+
+    # Step 4: Create one ForecastSQL object per GSP
+    forecast_creation_time = datetime.now(tz=timezone.utc)
+    forecasts = []
+    for gsp_id, positions in positions_by_gsp.items():
+        forecast = ForecastSQL(
+            model=model,
+            forecast_creation_time=forecast_creation_time,
+            location=locations[int(gsp_id)],
+            input_data_last_updated=input_data_last_updated,
+            forecast_values=(
+                [] if compact else [forecast_values[i] for i in positions]
+            ),
+            historic=False,
+        )
+        if compact:
+            forecast = CompactForecast(forecast, values.take(positions))
+        forecasts.append(forecast)
+    logger.info(
+        f"Created {len(forecasts)} ForecastSQL objects with "
+        f"{len(values)} forecast values."
+    )
+
+    return forecasts
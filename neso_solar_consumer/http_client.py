@@ -0,0 +1,395 @@
+"""
+Pooled HTTP connections for talking to the NESO API
+
+`urllib.request.urlopen` opens a new TCP (and TLS) connection for every request.
+`HTTPConnectionPool` keeps connections alive between requests, can be shared by
+worker threads, and caps how many requests run against one host at the same time.
+Connecting and reading have separate timeouts, so a hung socket cannot stall a run.
+
+`fetch_url` retries transient failures (timeouts, dropped connections, 429 and
+5xx responses) with exponential backoff and full jitter. Each host also has a
+`CircuitBreaker` on the pool: after repeated failures, requests fail fast for a
+while instead of waiting on a server that is down. The shared pool lives for the
+whole process, so in daemon mode the breaker carries over from one cycle to the next.
+"""
+
+import http.client
+import logging
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Optional
+
+from neso_solar_consumer.config import Neso
+from neso_solar_consumer.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+MAX_REDIRECTS = 5
+# Statuses worth retrying: the request may well succeed a little later
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of sending a request while a host's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stop sending requests to a host after repeated failures.
+
+    After `failure_threshold` failures in a row the breaker opens, and requests
+    fail with `CircuitOpenError` for `reset_seconds`. Then a single trial request
+    is let through: if it succeeds the breaker closes again, otherwise it reopens.
+
+    Parameters:
+        failure_threshold (int, optional): Defaults to `Neso.CIRCUIT_FAILURE_THRESHOLD`.
+        reset_seconds (float, optional): Defaults to `Neso.CIRCUIT_RESET_SECONDS`.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: Optional[int] = None,
+        reset_seconds: Optional[float] = None,
+    ):
+        self.failure_threshold = failure_threshold or Neso.CIRCUIT_FAILURE_THRESHOLD
+        self.reset_seconds = (
+            Neso.CIRCUIT_RESET_SECONDS if reset_seconds is None else reset_seconds
+        )
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def before_request(self):
+        """
+        Check that a request may be sent.
+
+        Raises:
+            CircuitOpenError: If the breaker is open and no trial is due.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return
+            waited = time.monotonic() - self.opened_at
+            if waited < self.reset_seconds or self._trial_running:
+                raise CircuitOpenError(
+                    f"Circuit open after {self.failures} failures, "
+                    f"retrying in {max(self.reset_seconds - waited, 0):.0f}s"
+                )
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("Circuit closed, the server is answering again.")
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(
+                        f"Circuit opened after {self.failures} failures in a row."
+                    )
+                self.opened_at = time.monotonic()
+
+
+class HTTPConnectionPool:
+    """
+    Thread-safe pool of keep-alive HTTP(S) connections.
+
+    Parameters:
+        max_connections_per_host (int): Maximum number of requests in flight to a
+            single host; further requests wait for a free slot.
+        connect_timeout (float, optional): Seconds to wait for a new connection.
+            Defaults to `Neso.CONNECT_TIMEOUT_SECONDS`.
+        read_timeout (float, optional): Seconds to wait for each read from the
+            socket. Defaults to `Neso.READ_TIMEOUT_SECONDS`.
+    """
+
+    def __init__(
+        self,
+        max_connections_per_host: int = 8,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ):
+        self.max_connections_per_host = max_connections_per_host
+        self.connect_timeout = connect_timeout or Neso.CONNECT_TIMEOUT_SECONDS
+        self.read_timeout = read_timeout or Neso.READ_TIMEOUT_SECONDS
+        self._idle = defaultdict(list)
+        self._slots = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        """Return the circuit breaker for the host of `url`."""
+        parsed = urllib.parse.urlsplit(url)
+        key = (parsed.scheme, parsed.netloc)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker()
+            return breaker
+
+    @contextmanager
+    def _host_slot(self, key: tuple):
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.max_connections_per_host)
+                self._slots[key] = slot
+        with slot:
+            yield
+
+    def _checkout(self, key: tuple) -> tuple:
+        """Return an idle connection for `key` if there is one, else a new one."""
+        with self._lock:
+            if self._idle[key]:
+                return self._idle[key].pop(), True
+
+        scheme, host = key
+        connection_class = (
+            http.client.HTTPSConnection
+            if scheme == "https"
+            else http.client.HTTPConnection
+        )
+        return connection_class(host, timeout=self.connect_timeout), False
+
+    def _send(self, connection: http.client.HTTPConnection, path: str, headers: dict):
+        """Send a request, connecting first with the connect timeout if needed."""
+        if connection.sock is None:
+            connection.connect()
+            connection.sock.settimeout(self.read_timeout)
+        connection.request("GET", path, headers=headers)
+        return connection.getresponse()
+
+    def _checkin(self, key: tuple, connection: http.client.HTTPConnection):
+        with self._lock:
+            self._idle[key].append(connection)
+
+    def get(self, url: str, headers: Optional[dict] = None) -> bytes:
+        """
+        Send a GET request and return the response body.
+
+        Parameters:
+            url (str): Absolute URL to fetch.
+            headers (dict, optional): Extra request headers.
+
+        Returns:
+            bytes: The raw response body.
+
+        Raises:
+            urllib.error.HTTPError: If the server answers with an error status.
+        """
+        status, response_headers, body = self.request(url, headers)
+        if status >= 400:
+            raise urllib.error.HTTPError(
+                url,
+                status,
+                http.client.responses.get(status, ""),
+                response_headers,
+                None,
+            )
+        return body
+
+    def request(self, url: str, headers: Optional[dict] = None) -> tuple:
+        """
+        Send a GET request, following redirects, without raising on the status.
+
+        Parameters:
+            url (str): Absolute URL to fetch.
+            headers (dict, optional): Extra request headers.
+
+        Returns:
+            tuple: `(status, headers, body)` of the final response.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            status, response_headers, body = self._request(url, headers or {})
+            if status in (301, 302, 303, 307, 308) and "Location" in response_headers:
+                url = urllib.parse.urljoin(url, response_headers["Location"])
+                continue
+            return status, response_headers, body
+
+        raise urllib.error.URLError(f"Too many redirects fetching {url}")
+
+    def _request(self, url: str, headers: dict) -> tuple:
+        parsed = urllib.parse.urlsplit(url)
+        key = (parsed.scheme, parsed.netloc)
+        path = urllib.parse.urlunsplit(("", "", parsed.path or "/", parsed.query, ""))
+
+        with self._host_slot(key):
+            connection, reused = self._checkout(key)
+            try:
+                response = self._send(connection, path, headers)
+            except (http.client.HTTPException, ConnectionError):
+                connection.close()
+                if not reused:
+                    raise
+                # The server closed the idle connection, so retry once on a fresh one
+                logger.debug(
+                    f"Stale keep-alive connection to {parsed.netloc}, reconnecting."
+                )
+                connection, _ = self._checkout_new(key)
+                try:
+                    response = self._send(connection, path, headers)
+                except BaseException:
+                    connection.close()
+                    raise
+            except BaseException:
+                # e.g. a timeout, after which the connection is in an unknown state
+                connection.close()
+                raise
+
+            try:
+                body = response.read()
+            except BaseException:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._checkin(key, connection)
+
+            return response.status, response.headers, body
+
+    def _checkout_new(self, key: tuple) -> tuple:
+        with self._lock:
+            idle, self._idle[key] = self._idle[key], []
+        for connection in idle:
+            connection.close()
+        return self._checkout(key)
+
+    def close(self):
+        """Close every idle connection held by the pool."""
+        with self._lock:
+            idle, self._idle = self._idle, defaultdict(list)
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+_cache = None
+
+
+def get_pool() -> HTTPConnectionPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = HTTPConnectionPool(
+                max_connections_per_host=Neso.MAX_CONNECTIONS_PER_HOST
+            )
+        return _default_pool
+
+
+def set_cache(cache):
+    """
+    Serve `fetch_url` requests through `cache`, or stop caching with None.
+
+    Parameters:
+        cache (ResponseCache, optional): The response cache to use.
+    """
+    global _cache
+    _cache = cache
+
+
+def get_cache():
+    """Return the response cache set with `set_cache`, if any."""
+    return _cache
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed request is worth sending again."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in RETRY_STATUSES
+    return isinstance(error, (OSError, http.client.HTTPException))
+
+
+def backoff_delay(attempt: int, error: Optional[Exception] = None) -> float:
+    """
+    Seconds to wait before retry number `attempt` (from 0), with full jitter.
+
+    A numeric `Retry-After` header on an HTTP error is respected, up to
+    `Neso.FETCH_MAX_BACKOFF_SECONDS`.
+    """
+    ceiling = min(
+        Neso.FETCH_BACKOFF_SECONDS * 2**attempt, Neso.FETCH_MAX_BACKOFF_SECONDS
+    )
+    delay = random.uniform(0, ceiling)
+
+    retry_after = getattr(error, "headers", None) and error.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, min(float(retry_after), Neso.FETCH_MAX_BACKOFF_SECONDS))
+    return delay
+
+
+def fetch_url(
+    url: str, pool: Optional[HTTPConnectionPool] = None, retries: Optional[int] = None
+) -> bytes:
+    """
+    Fetch `url` through the response cache, if one is set, and a connection pool.
+
+    Transient failures are retried up to `retries` times with exponential backoff
+    and full jitter, and counted by the pool's circuit breaker for the host.
+
+    Parameters:
+        url (str): Absolute URL to fetch.
+        pool (HTTPConnectionPool, optional): Defaults to the shared pool.
+        retries (int, optional): Defaults to `Neso.FETCH_RETRIES`.
+
+    Returns:
+        bytes: The raw response body.
+
+    Raises:
+        CircuitOpenError: If the host has failed too often recently.
+        Exception: The last error, once the retries are used up or for errors
+            that are not worth retrying (e.g. a 4xx status).
+    """
+    pool = pool or get_pool()
+    retries = Neso.FETCH_RETRIES if retries is None else retries
+    breaker = pool.breaker(url)
+
+    for attempt in range(retries + 1):
+        breaker.before_request()
+        try:
+            with stage("fetch") as record:
+                if _cache is not None:
+                    body = _cache.get(url, pool)
+                else:
+                    body = pool.get(url)
+                record.add(n_bytes=len(body))
+        except Exception as e:
+            if not is_retryable(e):
+                # the server answered, so it is up
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt == retries or breaker.is_open:
+                raise
+            delay = backoff_delay(attempt, e)
+            logger.warning(
+                f"Request failed ({e!r}), retry {attempt + 1} of {retries} "
+                f"in {delay:.1f}s."
+            )
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return body
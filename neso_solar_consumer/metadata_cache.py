@@ -0,0 +1,167 @@
+"""
+Cache of the metadata rows every forecast refers to
+
+`format_to_forecast_sql` needs the model, the location and the latest
+input-data-last-updated row for each forecast, which costs three queries per
+call. These rows almost never change between calls, so `MetadataCache` keeps a
+detached snapshot of each one for `ttl` seconds and attaches it to whichever
+session asks for it with `session.merge(..., load=False)`, which does not query
+the database.
+"""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+from nowcasting_datamodel.models import LocationSQL
+from nowcasting_datamodel.models.models import national_gb_label
+from nowcasting_datamodel.read.read import (
+    get_latest_input_data_last_updated,
+    get_location,
+)
+from nowcasting_datamodel.read.read_models import get_model
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.session import Session
+
+from neso_solar_consumer.config import Neso
+
+logger = logging.getLogger(__name__)
+
+
+def get_locations(session: Session, gsp_ids: list) -> dict:
+    """
+    Get the locations for several GSPs in one query, creating any that are missing.
+
+    Missing locations are labelled as `get_location` would label them, and are
+    committed together.
+
+    Parameters:
+        session (Session): SQLAlchemy session for database access.
+        gsp_ids (list): GSP ids to look up.
+
+    Returns:
+        dict: LocationSQL objects keyed by gsp_id.
+    """
+    gsp_ids = sorted(set(gsp_ids))
+    query = session.query(LocationSQL).filter(LocationSQL.gsp_id.in_(gsp_ids))
+
+    # keep the first location for each gsp_id, as `get_location` does
+    locations = {}
+    for location in query.all():
+        locations.setdefault(location.gsp_id, location)
+
+    missing = [gsp_id for gsp_id in gsp_ids if gsp_id not in locations]
+    if missing:
+        logger.debug(f"Adding locations for {len(missing)} GSPs that do not exist yet")
+        for gsp_id in missing:
+            label = national_gb_label if gsp_id == 0 else f"GSP_{gsp_id}"
+            locations[gsp_id] = LocationSQL(gsp_id=gsp_id, label=label)
+        session.add_all([locations[gsp_id] for gsp_id in missing])
+        session.commit()
+
+        # the commit expired every location, so reload them all in one query
+        # rather than refreshing each one on first access
+        query.all()
+
+    return locations
+
+
+def _detached_copy(instance):
+    """Return a detached copy of an ORM instance with all its columns loaded."""
+    mapper = inspect(instance).mapper
+    copy = mapper.class_manager.new_instance()
+    for attribute in mapper.column_attrs:
+        copy.__dict__[attribute.key] = getattr(instance, attribute.key)
+    make_transient_to_detached(copy)
+    return copy
+
+
+class MetadataCache:
+    """
+    TTL cache for `get_model`, `get_location` and `get_latest_input_data_last_updated`.
+
+    The objects returned always belong to the session passed in, so they can be
+    used in new forecasts like the ones returned by the underlying functions.
+
+    Parameters:
+        ttl (float, optional): Seconds an entry is reused before it is read again.
+            Defaults to `Neso.METADATA_CACHE_TTL_SECONDS`.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = Neso.METADATA_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _get(self, session: Session, key: tuple, load):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self.hits += 1
+                return session.merge(entry[1], load=False)
+            self.misses += 1
+
+        instance = load()
+        if instance is not None:
+            with self._lock:
+                self._entries[key] = (time.monotonic(), _detached_copy(instance))
+        return instance
+
+    def get_model(self, session: Session, model_tag: str, model_version: str):
+        """Cached `get_model(name=model_tag, version=model_version)`."""
+        return self._get(
+            session,
+            ("model", model_tag, model_version),
+            lambda: get_model(name=model_tag, version=model_version, session=session),
+        )
+
+    def get_location(self, session: Session, gsp_id: int):
+        """Cached `get_location(gsp_id=gsp_id)`."""
+        return self._get(
+            session,
+            ("location", gsp_id),
+            lambda: get_location(session=session, gsp_id=gsp_id),
+        )
+
+    def get_locations(self, session: Session, gsp_ids: list) -> dict:
+        """Cached `get_locations`; only the GSPs missing from the cache are queried."""
+        locations = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for gsp_id in set(gsp_ids):
+                entry = self._entries.get(("location", gsp_id))
+                if entry is not None and now - entry[0] < self.ttl:
+                    locations[gsp_id] = session.merge(entry[1], load=False)
+                else:
+                    missing.append(gsp_id)
+            self.hits += len(locations)
+            self.misses += len(missing)
+
+        if missing:
+            loaded = get_locations(session, missing)
+            with self._lock:
+                for gsp_id, location in loaded.items():
+                    self._entries[("location", gsp_id)] = (
+                        time.monotonic(),
+                        _detached_copy(location),
+                    )
+            locations.update(loaded)
+        return locations
+
+    def get_input_data_last_updated(self, session: Session):
+        """Cached `get_latest_input_data_last_updated`."""
+        return self._get(
+            session,
+            ("input_data_last_updated",),
+            lambda: get_latest_input_data_last_updated(session=session),
+        )
+
+    def clear(self):
+        """Forget every entry, e.g. after the metadata tables have changed."""
+        with self._lock:
+            self._entries.clear()
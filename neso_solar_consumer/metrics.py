@@ -0,0 +1,221 @@
+"""
+Timing and volume metrics for the pipeline stages
+
+Each stage (fetch, parse, format, save) is wrapped in `stage(name)`, which adds
+its wall time, call count and any rows or bytes it reports to a process-wide
+`Metrics` object. Database statements run while a stage is active are counted
+against that stage. The totals can be written as a Prometheus textfile, for the
+node_exporter textfile collector, so nothing needs to be reachable over the network.
+
+Setting `NESO_PROFILE` to "cprofile" or "pyinstrument" also profiles the run with
+`profile_run`, writing the result to `NESO_PROFILE_PATH`.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "neso_solar_consumer"
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+class StageRecord:
+    """What one pass through a stage reports, on top of its duration."""
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+
+    def add(self, rows: int = 0, n_bytes: int = 0):
+        """Count `rows` rows and `n_bytes` bytes against the stage."""
+        self.rows += rows
+        self.bytes += n_bytes
+
+
+class Metrics:
+    """
+    Running totals per pipeline stage.
+
+    Safe to use from several threads, e.g. the concurrent page fetchers.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._active = threading.local()
+        self._engines = weakref.WeakSet()
+
+    def _totals(self, name: str) -> dict:
+        return self.stages.setdefault(
+            name, {"seconds": 0.0, "calls": 0, "rows": 0, "bytes": 0, "statements": 0}
+        )
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a block of work as stage `name`.
+
+        Yields:
+            StageRecord: Call `add(rows=..., n_bytes=...)` on it to report volumes.
+        """
+        record = StageRecord()
+        stack = self._active.__dict__.setdefault("stack", [])
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            with self._lock:
+                totals = self._totals(name)
+                totals["seconds"] += seconds
+                totals["calls"] += 1
+                totals["rows"] += record.rows
+                totals["bytes"] += record.bytes
+
+    def watch_engine(self, engine):
+        """Count the statements run on `engine` against the active stage."""
+        from sqlalchemy import event
+
+        if engine in self._engines:
+            return
+        self._engines.add(engine)
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            stack = self._active.__dict__.get("stack")
+            with self._lock:
+                self._totals(stack[-1] if stack else "other")["statements"] += 1
+
+    def summary(self) -> str:
+        """One line per stage, for the log."""
+        with self._lock:
+            return "; ".join(
+                f"{name}: {t['seconds']:.3f}s over {t['calls']} calls, "
+                f"{t['rows']} rows, {t['bytes']} bytes, {t['statements']} statements"
+                for name, t in self.stages.items()
+            )
+
+    def to_prometheus(self) -> str:
+        """Render the totals in the Prometheus text exposition format."""
+        metrics = [
+            ("stage_seconds_total", "seconds", "Wall time spent in each stage."),
+            ("stage_calls_total", "calls", "Number of times each stage ran."),
+            ("stage_rows_total", "rows", "Rows handled by each stage."),
+            ("stage_bytes_total", "bytes", "Payload bytes handled by each stage."),
+            ("db_statements_total", "statements", "Database statements per stage."),
+        ]
+        lines = []
+        with self._lock:
+            for metric, key, description in metrics:
+                name = f"{METRIC_PREFIX}_{metric}"
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} counter")
+                for stage_name, totals in sorted(self.stages.items()):
+                    lines.append(f'{name}{{stage="{stage_name}"}} {totals[key]}')
+
+        name = f"{METRIC_PREFIX}_last_write_timestamp_seconds"
+        lines.append(f"# HELP {name} When these metrics were written.")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {time.time():.3f}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """
+        Write the totals to a Prometheus textfile.
+
+        The file is replaced atomically, so the collector never reads half a file.
+
+        Parameters:
+            path (str): Target file, conventionally ending in `.prom`.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def reset(self):
+        """Forget all totals."""
+        with self._lock:
+            self.stages.clear()
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Return the process-wide metrics."""
+    return _metrics
+
+
+def stage(name: str):
+    """Time a block of work as stage `name` in the process-wide metrics."""
+    return _metrics.stage(name)
+
+
+@contextmanager
+def profile_run(profiler: Optional[str] = None, path: Optional[str] = None):
+    """
+    Profile the enclosed block when a profiler is selected.
+
+    Parameters:
+        profiler (str, optional): "cprofile" or "pyinstrument". Defaults to the
+            `NESO_PROFILE` environment variable; nothing is profiled when unset.
+        path (str, optional): Where to write the profile. Defaults to
+            `NESO_PROFILE_PATH`, or "neso_profile.prof" / "neso_profile.html".
+    """
+    profiler = (profiler or os.getenv("NESO_PROFILE") or "").lower()
+    if not profiler:
+        yield
+        return
+    if profiler not in PROFILERS:
+        logger.warning(f"Unknown profiler {profiler!r}, expected one of {PROFILERS}.")
+        yield
+        return
+
+    path = path or os.getenv("NESO_PROFILE_PATH")
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("pyinstrument is not installed, running without profiling.")
+            yield
+            return
+
+        pyinstrument_profiler = Profiler()
+        pyinstrument_profiler.start()
+        try:
+            yield
+        finally:
+            pyinstrument_profiler.stop()
+            path = path or "neso_profile.html"
+            with open(path, "w") as f:
+                f.write(pyinstrument_profiler.output_html())
+            logger.info(f"Wrote pyinstrument profile to {path}.")
+        return
+
+    import cProfile
+
+    cprofile_profiler = cProfile.Profile()
+    cprofile_profiler.enable()
+    try:
+        yield
+    finally:
+        cprofile_profiler.disable()
+        path = path or "neso_profile.prof"
+        cprofile_profiler.dump_stats(path)
+        logger.info(f"Wrote cProfile stats to {path}.")
@@ -0,0 +1,209 @@
+"""
+Bulk saves with the forecast value rows prepared in worker processes
+
+For backfills of hundreds of thousands of rows, building a ForecastValueSQL object
+and a CSV line per row in the parent process is the bottleneck of a bulk save.
+`save_forecast_frames_parallel` skips the ORM objects: the valid rows of each
+frame are reduced to two numpy arrays, split into shards, and a
+`ProcessPoolExecutor` turns each shard into COPY-ready CSV text (or plain tuples
+on drivers without COPY). The parent only inserts the forecast rows, streams the
+prepared shards into the database in order, and fills `forecast_value_latest`
+from the values just written with one INSERT ... SELECT for all the forecasts.
+
+The adjuster is not applied on this path, as on every backfill path (see
+`backfill.py`): it corrects a forecast with the recent mean error, which does
+not apply to historical forecasts.
+"""
+
+import io
+import logging
+from concurrent.futures import Executor
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from nowcasting_datamodel.models import (
+    ForecastValueLatestSQL,
+    ForecastValueSevenDaysSQL,
+    ForecastValueSQL,
+)
+from sqlalchemy import insert
+from sqlalchemy.orm.session import Session
+
+from neso_solar_consumer.config import Neso
+from neso_solar_consumer.format_forecast import ForecastValueArrays
+from neso_solar_consumer.save_forecast import (
+    BATCH_SIZE,
+    _delete_stale,
+    _upsert_latest_from_values,
+)
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = [
+    "target_time",
+    "expected_power_generation_megawatts",
+    "adjust_mw",
+    "forecast_id",
+    "created_utc",
+]
+
+
+def forecast_arrays(data: pd.DataFrame) -> tuple:
+    """
+    Reduce a forecast frame to the arrays the workers need.
+
+    Rows are validated as in `format_forecast_values`.
+
+    Parameters:
+        data (pd.DataFrame): DataFrame containing `Datetime_GMT` (UTC) and `solar_forecast_kw`.
+
+    Returns:
+        tuple: Target times as int64 microseconds since the epoch, and megawatts.
+    """
+    values = ForecastValueArrays.from_frame(data)
+    return values.target_times, values.megawatts
+
+
+def prepare_rows(
+    target_times: np.ndarray,
+    megawatts: np.ndarray,
+    forecast_id: int,
+    created_utc: str,
+    as_csv: bool = True,
+):
+    """
+    Build the forecast value rows of one shard; runs in a worker process.
+
+    Parameters:
+        target_times (np.ndarray): int64 microseconds since the epoch, UTC.
+        megawatts (np.ndarray): The forecast values in MW.
+        forecast_id (int): The forecast the values belong to.
+        created_utc (str): ISO 8601 creation time for every row.
+        as_csv (bool): Return CSV text for COPY rather than a list of tuples.
+
+    Returns:
+        str or list: The rows, in `COLUMNS` order.
+    """
+    if as_csv:
+        times = np.datetime_as_string(target_times.view("datetime64[us]"), unit="us")
+        suffix = f",0.0,{forecast_id},{created_utc}\n"
+        return "".join(
+            f"{time}+00:00,{megawatt!r}{suffix}"
+            for time, megawatt in zip(times.tolist(), megawatts.tolist())
+        )
+
+    created = datetime.fromisoformat(created_utc)
+    times = pd.to_datetime(target_times, unit="us", utc=True).to_pydatetime()
+    return [
+        (time, megawatt, 0.0, forecast_id, created)
+        for time, megawatt in zip(times.tolist(), megawatts.tolist())
+    ]
+
+
+def _shards(n_rows: int, shard_size: int):
+    for start in range(0, n_rows, shard_size):
+        yield start, min(start + shard_size, n_rows)
+
+
+def _write_prepared(session: Session, tables: list, prepared) -> int:
+    """Write one prepared shard to each of `tables`."""
+    connection = session.connection()
+    if isinstance(prepared, str):
+        if not prepared:
+            return 0
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            for table in tables:
+                cursor.copy_expert(
+                    f"COPY {table.name} ({', '.join(COLUMNS)}) "
+                    "FROM STDIN WITH (FORMAT csv)",
+                    io.StringIO(prepared),
+                )
+        finally:
+            cursor.close()
+        return prepared.count("\n")
+
+    if prepared:
+        rows = [dict(zip(COLUMNS, row)) for row in prepared]
+        for table in tables:
+            connection.execute(insert(table), rows)
+    return len(prepared)
+
+
+def save_forecast_frames_parallel(
+    session: Session,
+    forecasts: list,
+    frames: list,
+    executor: Executor,
+    shard_size: Optional[int] = None,
+) -> int:
+    """
+    Save forecasts whose values are prepared from `frames` by `executor`.
+
+    Parameters:
+        session (Session): SQLAlchemy session for database access.
+        forecasts (list): ForecastSQL objects without forecast values, e.g. from
+            `format_to_forecast_sql(..., forecast_values=[])`.
+        frames (list): One DataFrame per forecast, as passed to `format_forecast_values`.
+        executor (Executor): Pool that prepares the rows, normally a
+            `ProcessPoolExecutor` with `Neso.FORMAT_WORKERS` workers.
+        shard_size (int, optional): Rows per shard. Defaults to `Neso.FORMAT_SHARD_SIZE`.
+
+    Returns:
+        int: The number of forecast values written.
+    """
+    shard_size = shard_size or Neso.FORMAT_SHARD_SIZE
+    if len(forecasts) != len(frames):
+        raise ValueError(f"Got {len(forecasts)} forecasts but {len(frames)} frames")
+
+    try:
+        # Step 1: Insert the forecast rows to get their ids
+        session.add_all(forecasts)
+        session.flush()
+
+        # Step 2: Prepare the value rows in the workers, writing them in order
+        now = datetime.now(tz=timezone.utc)
+        as_csv = session.connection().dialect.driver == "psycopg2"
+        tables = [ForecastValueSQL.__table__, ForecastValueSevenDaysSQL.__table__]
+        futures = []
+        for forecast, data in zip(forecasts, frames):
+            target_times, megawatts = forecast_arrays(data)
+            for start, end in _shards(len(target_times), shard_size):
+                futures.append(
+                    executor.submit(
+                        prepare_rows,
+                        target_times[start:end],
+                        megawatts[start:end],
+                        forecast.id,
+                        now.isoformat(),
+                        as_csv,
+                    )
+                )
+        n_rows = 0
+        for future in futures:
+            n_rows += _write_prepared(session, tables, future.result())
+        logger.debug(f"Wrote {n_rows} forecast values from {len(futures)} shards.")
+
+        # Step 3: Keep the latest and last-seven-days tables up to date
+        _upsert_latest_from_values(session, forecasts, now)
+        _delete_stale(
+            session,
+            ForecastValueLatestSQL.__table__,
+            now - timedelta(days=3),
+            BATCH_SIZE,
+        )
+        now_minus_7_days = (now - timedelta(days=7)).replace(
+            minute=0, second=0, microsecond=0
+        )
+        _delete_stale(
+            session, ForecastValueSevenDaysSQL.__table__, now_minus_7_days, BATCH_SIZE
+        )
+
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return n_rows
@@ -0,0 +1,90 @@
+"""
+Run the fetch stage of the pipeline ahead of the database writer
+
+`prefetch` moves an iterator of pages, such as `fetch_data_pages`, onto a
+producer thread. Fetched and parsed pages wait in a bounded queue, so page N+1
+is fetched while page N is being saved, and a slow database holds back the
+fetching rather than letting pages pile up in memory.
+
+The writer side, `run_pipelined` in `app.py`, only checks out a database session
+while it is saving a page, so no connection sits idle during HTTP round-trips.
+"""
+
+import logging
+import queue
+import threading
+from typing import Iterable, Iterator
+
+from neso_solar_consumer.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class _Failure:
+    """Carries an exception raised by the producer over to the consumer."""
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def prefetch(items: Iterable, max_queued: int = 2) -> Iterator:
+    """
+    Iterate over `items` on a producer thread, yielding them in order.
+
+    At most `max_queued` items are held in the queue. An exception raised while
+    producing is raised here once the items before it have been yielded. If the
+    consumer stops early, the producer stops after the item it is working on.
+
+    Parameters:
+        items (Iterable): The items to produce, e.g. an iterator of pages.
+        max_queued (int): Items fetched ahead of the consumer.
+
+    Yields:
+        The items of `items`.
+    """
+    handoff = queue.Queue(maxsize=max(max_queued, 1))
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        # Give up once the consumer has gone, rather than block on a full queue
+        while not stopped.is_set():
+            try:
+                handoff.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failure(e))
+        else:
+            put(_DONE)
+        finally:
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, name="neso-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            # Time spent here is time the writer waited on the fetch stage
+            with stage("wait_fetch"):
+                item = handoff.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+        producer.join()
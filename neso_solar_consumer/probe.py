@@ -0,0 +1,86 @@
+"""
+Cheap check for whether NESO has published anything new
+
+CKAN's `resource_show` returns a resource's metadata, including when its data
+was last modified, in one small response. Comparing that with the value seen on
+the last successful run says whether a full run would find anything new.
+
+Only the standard library and the stdlib-only modules of this package are
+imported here, so a cron-started container can run the check (see
+`cli.py`) without loading pandas, SQLAlchemy or nowcasting_datamodel.
+"""
+
+import json
+import logging
+import urllib.parse
+from typing import Optional
+
+from neso_solar_consumer.config import Neso
+from neso_solar_consumer.http_client import HTTPConnectionPool, fetch_url
+from neso_solar_consumer.state import StateFile
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "published"
+
+
+def published_marker(
+    resource_id: str, pool: Optional[HTTPConnectionPool] = None
+) -> str:
+    """
+    Ask the API when a resource's data was last modified.
+
+    Parameters:
+        resource_id (str): The unique resource ID for the dataset in the API.
+        pool (HTTPConnectionPool, optional): Defaults to the shared pool.
+
+    Returns:
+        str: The resource's `last_modified` time, or `metadata_modified` when the
+            data has never been modified, exactly as the API returns it.
+
+    Raises:
+        ValueError: If the response has neither field.
+    """
+    query = urllib.parse.urlencode({"id": resource_id})
+    url = f"{Neso.API_URL}/resource_show?{query}"
+    result = json.loads(fetch_url(url, pool))["result"]
+
+    marker = result.get("last_modified") or result.get("metadata_modified")
+    if not marker:
+        raise ValueError(f"resource_show for {resource_id} has no modified time")
+    return marker
+
+
+def has_new_data(
+    state: Optional[StateFile],
+    resource_id: str,
+    pool: Optional[HTTPConnectionPool] = None,
+) -> tuple:
+    """
+    Check whether a resource has changed since it was last recorded as ingested.
+
+    Parameters:
+        state (StateFile, optional): Where `record_published` keeps the last
+            marker seen. Without one, everything counts as new.
+        resource_id (str): The unique resource ID for the dataset in the API.
+        pool (HTTPConnectionPool, optional): Defaults to the shared pool.
+
+    Returns:
+        tuple: (is_new, marker), where `marker` is to be passed to
+            `record_published` once the new data has been saved.
+    """
+    marker = published_marker(resource_id, pool)
+    seen = state.get(STATE_KEY, {}).get(resource_id) if state is not None else None
+    is_new = marker != seen
+    logger.info(
+        f"{resource_id} was last modified at {marker}"
+        + (", which is new." if is_new else ", nothing new since the last run.")
+    )
+    return is_new, marker
+
+
+def record_published(state: StateFile, resource_id: str, marker: str):
+    """Remember `marker` as ingested, after a successful run."""
+    all_state = state.get(STATE_KEY, {})
+    all_state[resource_id] = marker
+    state.set(STATE_KEY, all_state)
@@ -1,33 +1,934 @@
+import csv
+import io
 import logging
+import os
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+import numpy as np
+import pandas as pd
+from nowcasting_datamodel.models import (
+    ForecastSQL,
+    ForecastValueLatestSQL,
+    ForecastValueSevenDaysSQL,
+    ForecastValueSQL,
+    LocationSQL,
+    MLModelSQL,
+)
+from nowcasting_datamodel.read.read_metric import read_latest_me_national
+from nowcasting_datamodel.save.adjust import (
+    MAX_ADJUST_PER,
+    add_adjust_to_national_forecast,
+)
 from nowcasting_datamodel.save.save import save
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    MetaData,
+    Table,
+    and_,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    literal_column,
+    select,
+    text,
+    true,
+    update,
+)
+from sqlalchemy import values as sql_values
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
 from sqlalchemy.orm.session import Session
+from neso_solar_consumer.format_forecast import CompactForecast, ForecastValueArrays
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
-)
 logger = logging.getLogger(__name__)
 
+SAVE_METHODS = ("orm", "bulk", "upsert", "sql")
+BATCH_SIZE = 10_000
+
 
-def save_forecasts_to_db(forecasts: list, session: Session):
+def save_forecasts_to_db(
+    forecasts: list,
+    session: Session,
+    method: str = "orm",
+    apply_adjuster: bool = True,
+):
     """
     Save a list of ForecastSQL objects to the database.
 
     Parameters:
-        forecasts (list): The list of ForecastSQL objects to save.
+        forecasts (list): The list of ForecastSQL (or CompactForecast) objects to save.
         session (Session): SQLAlchemy session for database access.
+        method (str): "orm" to save through `nowcasting_datamodel.save.save`,
+            "bulk" to write the forecast values with `save_forecasts_bulk`,
+            "upsert" to update them in place with `save_forecasts_upsert`, or
+            "sql" to write them as "bulk" does and derive the latest and
+            last-seven-days rows in the database with `save_forecasts_sql`.
+            CompactForecast values are only turned into ORM objects for "orm".
+        apply_adjuster (bool): Apply the adjuster to the national forecast. As
+            with `save`, the USE_ADJUSTER environment variable can turn it off
+            but not on.
     """
     if not forecasts:
         logger.warning("No forecasts provided to save!")
         return
 
-    try:
-        logger.info("Saving forecasts to the database.")
-        save(
-            forecasts=forecasts,
-            session=session,
+    if method not in SAVE_METHODS:
+        raise ValueError(
+            f"Unknown save method {method!r}, expected one of {SAVE_METHODS}"
         )
+
+    try:
+        logger.info(f"Saving forecasts to the database ({method}).")
+        if method == "bulk":
+            save_forecasts_bulk(
+                forecasts=forecasts, session=session, apply_adjuster=apply_adjuster
+            )
+        elif method == "upsert":
+            save_forecasts_upsert(
+                forecasts=forecasts, session=session, apply_adjuster=apply_adjuster
+            )
+        elif method == "sql":
+            save_forecasts_sql(
+                forecasts=forecasts, session=session, apply_adjuster=apply_adjuster
+            )
+        else:
+            save(
+                forecasts=[
+                    f.to_orm() if isinstance(f, CompactForecast) else f
+                    for f in forecasts
+                ],
+                session=session,
+                apply_adjuster=apply_adjuster,
+            )
         logger.info(f"Successfully saved {len(forecasts)} forecasts to the database.")
     except Exception as e:
         logger.error(f"An error occurred while saving forecasts: {e}")
         raise e
+
+
+def save_forecasts_bulk(
+    forecasts: list,
+    session: Session,
+    batch_size: int = BATCH_SIZE,
+    apply_adjuster: bool = True,
+):
+    """
+    Save ForecastSQL objects without flushing every forecast value through the ORM.
+
+    Only the forecast rows go through the ORM, and the values of CompactForecast
+    objects are written from their arrays without building ORM objects at all. The forecast values are streamed
+    with PostgreSQL `COPY FROM STDIN` (psycopg2), or inserted in batches of
+    `batch_size` rows on other drivers. The latest and last-seven-days tables
+    are then updated from the same values, as `nowcasting_datamodel.save.save`
+    does. Everything is committed in one transaction.
+
+    Parameters:
+        forecasts (list): The list of ForecastSQL (or CompactForecast) objects to save.
+        session (Session): SQLAlchemy session for database access.
+        batch_size (int): Number of rows per COPY or INSERT batch.
+        apply_adjuster (bool): Apply the adjuster to the national forecast,
+            unless the USE_ADJUSTER environment variable turns it off.
+    """
+    forecasts, forecast_values = _split_forecasts(forecasts)
+
+    # Step 1: Apply the adjuster, following the same switches as `save`
+    if _use_adjuster(apply_adjuster):
+        _add_adjust(session, forecasts, forecast_values)
+
+    try:
+        # Steps 2 and 3: Insert the forecast rows, then write the forecast values
+        created_utc = _write_forecasts(session, forecasts, forecast_values, batch_size)
+
+        # Step 4: Keep the latest and last-seven-days tables up to date
+        _update_forecast_latest(session, forecasts, forecast_values, batch_size)
+        _update_forecast_last_seven_days(
+            session, forecasts, forecast_values, created_utc, batch_size
+        )
+
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+
+def save_forecasts_sql(
+    forecasts: list,
+    session: Session,
+    batch_size: int = BATCH_SIZE,
+    apply_adjuster: bool = True,
+):
+    """
+    Save forecasts as `save_forecasts_bulk` does, but fill the derived tables in SQL.
+
+    Once the forecast values are written, one INSERT ... SELECT copies them into
+    `forecast_value_last_seven_days` and one INSERT ... SELECT ... ON CONFLICT
+    upserts them into `forecast_value_latest`, for all the forecasts at once, so
+    the values are not sent to the database a second and third time. Stale rows
+    are then deleted `batch_size` at a time. Everything is committed in one
+    transaction.
+
+    Parameters:
+        forecasts (list): The list of ForecastSQL (or CompactForecast) objects to save.
+        session (Session): SQLAlchemy session for database access.
+        batch_size (int): Number of rows per COPY or INSERT batch, and per delete.
+        apply_adjuster (bool): Apply the adjuster to the national forecast,
+            unless the USE_ADJUSTER environment variable turns it off.
+    """
+    forecasts, forecast_values = _split_forecasts(forecasts)
+
+    # Step 1: Apply the adjuster, following the same switches as `save`
+    if _use_adjuster(apply_adjuster):
+        _add_adjust(session, forecasts, forecast_values)
+
+    try:
+        # Steps 2 and 3: Insert the forecast rows, then write the forecast values
+        _write_forecasts(session, forecasts, forecast_values, batch_size)
+
+        # Step 4: Derive the last seven days and latest rows from the saved values
+        now = datetime.now(tz=timezone.utc)
+        forecast_ids = [forecast.id for forecast in forecasts]
+        values = ForecastValueSQL.__table__
+        columns = [
+            "target_time",
+            "expected_power_generation_megawatts",
+            "adjust_mw",
+            "properties",
+            "forecast_id",
+            "created_utc",
+        ]
+        session.execute(
+            insert(ForecastValueSevenDaysSQL.__table__).from_select(
+                columns,
+                select(*[values.c[name] for name in columns]).where(
+                    values.c.forecast_id.in_(forecast_ids)
+                ),
+            )
+        )
+        _upsert_latest_from_values(session, forecasts, now)
+
+        # Step 5: Drop stale rows, as the other save methods do
+        n_deleted = _delete_stale(
+            session,
+            ForecastValueLatestSQL.__table__,
+            now - timedelta(days=3),
+            batch_size,
+        )
+        now_minus_7_days = (now - timedelta(days=7)).replace(
+            minute=0, second=0, microsecond=0
+        )
+        n_deleted += _delete_stale(
+            session, ForecastValueSevenDaysSQL.__table__, now_minus_7_days, batch_size
+        )
+        logger.debug(f"Deleted {n_deleted} stale latest and last seven days rows.")
+
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+
+def _write_forecasts(
+    session: Session, forecasts: list, forecast_values: list, batch_size: int
+) -> datetime:
+    """
+    Insert the forecast rows, then stream their values into `forecast_value`.
+
+    Returns:
+        datetime: The `created_utc` of the values.
+    """
+    # Insert the forecast rows, keeping the values out of the session
+    for forecast in forecasts:
+        forecast.forecast_values = []
+    session.add_all(forecasts)
+    session.flush()
+
+    # Write the forecast values
+    created_utc = datetime.now(tz=timezone.utc)
+    rows = (
+        (target_time, megawatts, adjust_mw, forecast.id, created_utc)
+        for forecast, values in zip(forecasts, forecast_values)
+        for target_time, megawatts, adjust_mw, _ in _value_rows(values)
+    )
+    columns = [
+        "target_time",
+        "expected_power_generation_megawatts",
+        "adjust_mw",
+        "forecast_id",
+        "created_utc",
+    ]
+    n_rows = _write_rows(session, ForecastValueSQL.__table__, columns, rows, batch_size)
+    logger.debug(f"Wrote {n_rows} forecast values.")
+    return created_utc
+
+
+def _upsert_latest_from_values(session: Session, forecasts: list, now: datetime):
+    """
+    Upsert the saved values of `forecasts` into `forecast_value_latest` in one statement.
+
+    Each forecast is mapped to its GSP, model and historic forecast through a
+    VALUES list joined to `forecast_value`. Where several values share a latest
+    key, e.g. a repeated target time, the one from the last forecast wins, as
+    ON CONFLICT cannot update a row twice in one statement.
+    """
+    historic = _get_or_create_historic_forecasts(session, forecasts)
+    forecasts_historic = [
+        historic[(forecast.location.gsp_id, forecast.model.name)]
+        for forecast in forecasts
+    ]
+
+    keys = sql_values(
+        Column("forecast_id", Integer),
+        Column("gsp_id", Integer),
+        Column("model_id", Integer),
+        Column("historic_forecast_id", Integer),
+        name="forecast_keys",
+    ).data(
+        [
+            (forecast.id, forecast.location.gsp_id, forecast.model_id, historic_.id)
+            for forecast, historic_ in zip(forecasts, forecasts_historic)
+        ]
+    )
+    values = ForecastValueSQL.__table__
+    ranked = (
+        select(
+            values.c.target_time,
+            values.c.expected_power_generation_megawatts,
+            values.c.adjust_mw,
+            values.c.properties,
+            keys.c.gsp_id,
+            keys.c.historic_forecast_id,
+            keys.c.model_id,
+            func.row_number()
+            .over(
+                partition_by=[values.c.target_time, keys.c.gsp_id, keys.c.model_id],
+                order_by=values.c.forecast_id.desc(),
+            )
+            .label("rank"),
+        )
+        .join_from(values, keys, values.c.forecast_id == keys.c.forecast_id)
+        .where(values.c.forecast_id.in_([forecast.id for forecast in forecasts]))
+        .subquery()
+    )
+
+    latest = ForecastValueLatestSQL.__table__
+    stmt = postgresql_insert(latest).from_select(
+        [
+            "target_time",
+            "expected_power_generation_megawatts",
+            "adjust_mw",
+            "properties",
+            "gsp_id",
+            "forecast_id",
+            "model_id",
+            "is_primary",
+            "created_utc",
+        ],
+        select(
+            ranked.c.target_time,
+            ranked.c.expected_power_generation_megawatts,
+            ranked.c.adjust_mw,
+            ranked.c.properties,
+            ranked.c.gsp_id,
+            ranked.c.historic_forecast_id,
+            ranked.c.model_id,
+            true(),
+            literal(now),
+        ).where(ranked.c.rank == 1),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[c.name for c in latest.primary_key],
+        set_={c.name: c for c in stmt.excluded if not c.primary_key},
+    )
+    session.execute(stmt)
+
+    for forecast, forecast_historic in zip(forecasts, forecasts_historic):
+        forecast_historic.input_data_last_updated_id = (
+            forecast.input_data_last_updated_id
+        )
+        forecast_historic.forecast_creation_time = now
+
+
+def _delete_stale(session: Session, table, cutoff: datetime, batch_size: int) -> int:
+    """
+    Delete the rows of `table` with a target time before `cutoff`, `batch_size` at a time.
+
+    Each batch is picked by `ctid`, so `table` must not be partitioned.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+    stmt = text(
+        f"DELETE FROM {table.name} WHERE ctid = ANY(ARRAY("
+        f"SELECT ctid FROM {table.name} WHERE target_time < :cutoff "
+        f"LIMIT :batch_size))"
+    )
+    n_deleted = 0
+    while True:
+        result = session.execute(stmt, {"cutoff": cutoff, "batch_size": batch_size})
+        n_deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return n_deleted
+
+
+def save_forecasts_upsert(
+    forecasts: list,
+    session: Session,
+    batch_size: int = BATCH_SIZE,
+    apply_adjuster: bool = True,
+):
+    """
+    Save forecasts so that saving the same input again changes nothing.
+
+    Instead of a new ForecastSQL row per call, each forecast is written into the
+    newest forecast already saved for its model and location (one is created the
+    first time). The values are copied into a temporary staging table, then
+    updated in place where that forecast already has the target time and inserted
+    where it does not, with one UPDATE ... FROM and one INSERT ... SELECT per
+    table. The latest table is upserted from the same staging rows.
+
+    `forecast_value` has no unique key on (forecast_id, target_time) to use with
+    ON CONFLICT, so concurrent upserts of the same model and location are
+    serialised with transaction-level advisory locks instead.
+
+    Parameters:
+        forecasts (list): The list of ForecastSQL (or CompactForecast) objects to save.
+        session (Session): SQLAlchemy session for database access.
+        batch_size (int): Number of rows per COPY or INSERT batch.
+        apply_adjuster (bool): Apply the adjuster to the national forecast,
+            unless the USE_ADJUSTER environment variable turns it off.
+    """
+    forecasts, forecast_values = _split_forecasts(forecasts)
+
+    # Step 1: Apply the adjuster, following the same switches as `save`
+    if _use_adjuster(apply_adjuster):
+        _add_adjust(session, forecasts, forecast_values)
+
+    try:
+        # Step 2: Lock each (model, location) and find the forecasts to write into
+        _lock_forecast_keys(
+            session, sorted({(f.model.id, f.location.id) for f in forecasts})
+        )
+        targets = _get_or_create_upsert_forecasts(session, forecasts)
+        historic = _get_or_create_historic_forecasts(session, targets)
+        forecasts_historic = [
+            historic[(target.location.gsp_id, target.model.name)] for target in targets
+        ]
+        for target, forecast_historic in zip(targets, forecasts_historic):
+            forecast_historic.input_data_last_updated_id = (
+                target.input_data_last_updated_id
+            )
+
+        # Step 3: Stage the values
+        now = datetime.now(tz=timezone.utc)
+        staging = _staging_table()
+        staging.create(session.connection())
+        rows = (
+            (
+                target_time,
+                megawatts,
+                adjust_mw,
+                target.id,
+                target.location.gsp_id,
+                target.model_id,
+                forecast_historic.id,
+            )
+            for target, forecast_historic, values in zip(
+                targets, forecasts_historic, forecast_values
+            )
+            for target_time, megawatts, adjust_mw, _ in _value_rows(values)
+        )
+        n_rows = _write_rows(
+            session, staging, [c.name for c in staging.columns], rows, batch_size
+        )
+
+        # the last of several values for one target time wins
+        duplicate = staging.alias("duplicate")
+        session.execute(
+            delete(staging).where(
+                staging.c.forecast_id == duplicate.c.forecast_id,
+                staging.c.target_time == duplicate.c.target_time,
+                literal_column(f"{staging.name}.ctid")
+                < literal_column(f"{duplicate.name}.ctid"),
+            )
+        )
+
+        # Step 4: Update or insert the forecast values and the last seven days
+        for table in [ForecastValueSQL.__table__, ForecastValueSevenDaysSQL.__table__]:
+            _merge_staged_values(session, table, staging, now)
+
+        # Step 5: Upsert the latest values
+        latest = ForecastValueLatestSQL.__table__
+        columns = [
+            "target_time",
+            "expected_power_generation_megawatts",
+            "adjust_mw",
+            "gsp_id",
+            "forecast_id",
+            "model_id",
+            "is_primary",
+            "created_utc",
+        ]
+        stmt = postgresql_insert(latest).from_select(
+            columns,
+            select(
+                staging.c.target_time,
+                staging.c.expected_power_generation_megawatts,
+                staging.c.adjust_mw,
+                staging.c.gsp_id,
+                staging.c.historic_forecast_id,
+                staging.c.model_id,
+                true(),
+                literal(now),
+            )
+            # keeps ON CONFLICT from being read as part of the FROM clause
+            .where(true()),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[c.name for c in latest.primary_key],
+            set_={c.name: c for c in stmt.excluded if not c.primary_key},
+        )
+        session.execute(stmt)
+
+        for forecast_historic in forecasts_historic:
+            forecast_historic.forecast_creation_time = now
+
+        # Step 6: Drop stale rows, as the other save methods do
+        session.execute(
+            delete(ForecastValueLatestSQL).where(
+                ForecastValueLatestSQL.target_time < now - timedelta(days=3)
+            )
+        )
+        now_minus_7_days = (now - timedelta(days=7)).replace(
+            minute=0, second=0, microsecond=0
+        )
+        session.execute(
+            delete(ForecastValueSevenDaysSQL).where(
+                ForecastValueSevenDaysSQL.target_time < now_minus_7_days
+            )
+        )
+
+        session.commit()
+        logger.debug(f"Upserted {n_rows} forecast values.")
+    except Exception:
+        session.rollback()
+        raise
+
+
+def _lock_forecast_keys(session: Session, keys: list):
+    """Take a transaction-level advisory lock per (model_id, location_id), in order."""
+    session.execute(
+        text(
+            "SELECT pg_advisory_xact_lock(k.model_id, k.location_id) FROM ("
+            "SELECT * FROM unnest(CAST(:model_ids AS int[]), CAST(:location_ids AS int[])) "
+            "AS u(model_id, location_id) ORDER BY model_id, location_id) AS k"
+        ),
+        {
+            "model_ids": [model_id for model_id, _ in keys],
+            "location_ids": [location_id for _, location_id in keys],
+        },
+    )
+
+
+def _get_or_create_upsert_forecasts(session: Session, forecasts: list) -> list:
+    """
+    Find the forecast each new forecast's values are written into, in one query.
+
+    That is the newest non-historic forecast with the same model and location,
+    updated with the new creation time and input data. When there is none, the new
+    forecast itself is added. New forecasts that are not needed are dropped from
+    the session.
+
+    Returns:
+        list: The ForecastSQL to write into, for each forecast in order.
+    """
+    keys = {(f.model.id, f.location.id) for f in forecasts}
+    newest = (
+        select(func.max(ForecastSQL.id))
+        .where(ForecastSQL.historic.is_(False))
+        .where(ForecastSQL.model_id.in_({model_id for model_id, _ in keys}))
+        .where(ForecastSQL.location_id.in_({location_id for _, location_id in keys}))
+        .group_by(ForecastSQL.model_id, ForecastSQL.location_id)
+    )
+    query = session.query(ForecastSQL).filter(ForecastSQL.id.in_(newest))
+    existing = {(f.model_id, f.location_id): f for f in query.all()}
+
+    targets = []
+    for forecast in forecasts:
+        key = (forecast.model.id, forecast.location.id)
+        target = existing.get(key)
+        if target is None:
+            forecast.forecast_values = []
+            session.add(forecast)
+            existing[key] = forecast
+            targets.append(forecast)
+            continue
+
+        target.forecast_creation_time = forecast.forecast_creation_time
+        target.input_data_last_updated = forecast.input_data_last_updated
+        targets.append(target)
+        if target is not forecast:
+            # unlink the unused forecast, so no relationship cascades it into the session
+            forecast.forecast_values = []
+            forecast.model = None
+            forecast.location = None
+            forecast.input_data_last_updated = None
+            if forecast in session:
+                session.expunge(forecast)
+    session.flush()
+    return targets
+
+
+def _staging_table() -> Table:
+    """A temporary table for the values of one upsert, dropped on commit."""
+    return Table(
+        "forecast_value_staging",
+        MetaData(),
+        Column("target_time", DateTime(timezone=True), nullable=False),
+        Column("expected_power_generation_megawatts", Float),
+        Column("adjust_mw", Float),
+        Column("forecast_id", Integer, nullable=False),
+        Column("gsp_id", Integer),
+        Column("model_id", Integer),
+        Column("historic_forecast_id", Integer),
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DROP",
+    )
+
+
+def _merge_staged_values(session: Session, table, staging: Table, now: datetime):
+    """Update the staged target times `table` already has, and insert the rest."""
+    matches = and_(
+        table.c.forecast_id == staging.c.forecast_id,
+        table.c.target_time == staging.c.target_time,
+    )
+    session.execute(
+        update(table)
+        .where(matches)
+        .values(
+            expected_power_generation_megawatts=staging.c.expected_power_generation_megawatts,
+            adjust_mw=staging.c.adjust_mw,
+            created_utc=now,
+        )
+    )
+    session.execute(
+        insert(table).from_select(
+            [
+                "target_time",
+                "expected_power_generation_megawatts",
+                "adjust_mw",
+                "forecast_id",
+                "created_utc",
+            ],
+            select(
+                staging.c.target_time,
+                staging.c.expected_power_generation_megawatts,
+                staging.c.adjust_mw,
+                staging.c.forecast_id,
+                literal(now),
+            ).where(~exists().where(matches)),
+        )
+    )
+
+
+def _split_forecasts(forecasts: list) -> tuple:
+    """
+    Split forecasts into their ForecastSQL rows and their values.
+
+    Returns:
+        tuple: The ForecastSQL objects, and for each one its values as a list of
+            ForecastValueSQL objects or as ForecastValueArrays.
+    """
+    forecast_rows = []
+    forecast_values = []
+    for forecast in forecasts:
+        if isinstance(forecast, CompactForecast):
+            forecast_rows.append(forecast.forecast)
+            forecast_values.append(forecast.values)
+        else:
+            forecast_rows.append(forecast)
+            forecast_values.append(list(forecast.forecast_values))
+    return forecast_rows, forecast_values
+
+
+def _value_rows(values):
+    """Yield (target_time, megawatts, adjust_mw, properties) from a list or arrays."""
+    if isinstance(values, ForecastValueArrays):
+        return values.rows()
+    return (
+        (
+            value.target_time,
+            value.expected_power_generation_megawatts,
+            value.adjust_mw,
+            value.properties,
+        )
+        for value in values
+    )
+
+
+def _use_adjuster(apply_adjuster: bool) -> bool:
+    """Whether to apply the adjuster: `save` lets USE_ADJUSTER turn it off, not on."""
+    use_adjuster_env_var = os.getenv("USE_ADJUSTER", "True").lower() in ["true", "1"]
+    return apply_adjuster and use_adjuster_env_var
+
+
+def _add_adjust(session: Session, forecasts: list, forecast_values: list):
+    """Apply the adjuster to the national forecast, as ORM objects or as arrays."""
+    national = [
+        (forecast, values)
+        for forecast, values in zip(forecasts, forecast_values)
+        if forecast.location.gsp_id == 0
+    ]
+    if len(national) != 1:
+        # e.g. a regional page without GSP 0, which has nothing to adjust
+        logger.debug("Found no single national forecast, so not adding adjust.")
+        return
+
+    forecast, values = national[0]
+    if isinstance(values, ForecastValueArrays):
+        _add_adjust_to_arrays(session, forecast.model.name, values)
+    else:
+        add_adjust_to_national_forecast(forecast=forecast, session=session)
+
+
+def _add_adjust_to_arrays(
+    session: Session,
+    model_name: str,
+    values: ForecastValueArrays,
+    max_adjust_percentage: float = MAX_ADJUST_PER,
+):
+    """
+    Fill `values.adjust_mw` as `add_adjust_to_national_forecast` does for objects.
+
+    The latest ME for each (time of day, forecast horizon) is matched to the
+    target times on a half-hourly grid from the first one, limited to
+    `max_adjust_percentage` of the forecast, and zero where there is no match.
+    """
+    if not len(values):
+        return
+
+    latest_me = read_latest_me_national(session=session, model_name=model_name)
+    if len(latest_me) == 0:
+        logger.warning(f"Found no ME values found for {model_name=}")
+    me = pd.DataFrame(
+        {
+            "time_of_day": [m.time_of_day for m in latest_me],
+            "forecast_horizon_minutes": [
+                int(m.forecast_horizon_minutes) for m in latest_me
+            ],
+            "value": [m.value for m in latest_me],
+        }
+    )
+    # the first ME value wins, as in `add_adjust_to_national_forecast`
+    me = me.drop_duplicates(["time_of_day", "forecast_horizon_minutes"])
+
+    target_times = values.target_time_index()
+    minutes_ahead = (values.target_times - values.target_times[0]) // 60_000_000
+    on_grid = (values.target_times - values.target_times[0]) % 1_800_000_000 == 0
+    keys = pd.DataFrame(
+        {
+            "time_of_day": target_times.time,
+            "forecast_horizon_minutes": minutes_ahead,
+        }
+    )
+    adjust = keys.merge(me, how="left", on=["time_of_day", "forecast_horizon_minutes"])
+    adjust = np.array(adjust["value"], dtype="float64")
+    adjust[~on_grid] = np.nan
+
+    megawatts = values.megawatts
+    if max_adjust_percentage is not None:
+        max_adjust = max_adjust_percentage * megawatts
+        adjust = np.clip(adjust, -max_adjust, max_adjust)
+        adjust[megawatts == 0] = 0.0
+    values.adjust_mw = np.nan_to_num(adjust, nan=0.0)
+
+
+def _batches(rows, batch_size: int):
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        yield batch
+
+
+def _write_rows(session: Session, table, columns: list, rows, batch_size: int) -> int:
+    """
+    Append rows to `table`, using COPY when the connection is psycopg2.
+
+    Parameters:
+        session (Session): SQLAlchemy session; the rows join its transaction.
+        table: SQLAlchemy table to write to.
+        columns (list): Column names, in the order of the values in each row.
+        rows: Iterable of tuples.
+        batch_size (int): Number of rows per COPY or INSERT batch.
+
+    Returns:
+        int: The number of rows written.
+    """
+    connection = session.connection()
+    n_rows = 0
+
+    if connection.dialect.driver == "psycopg2":
+        cursor = connection.connection.dbapi_connection.cursor()
+        copy_sql = (
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        )
+        try:
+            for batch in _batches(rows, batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(
+                    [_csv_value(value) for value in row] for row in batch
+                )
+                buffer.seek(0)
+                cursor.copy_expert(copy_sql, buffer)
+                n_rows += len(batch)
+        finally:
+            cursor.close()
+        return n_rows
+
+    for batch in _batches(rows, batch_size):
+        connection.execute(insert(table), [dict(zip(columns, row)) for row in batch])
+        n_rows += len(batch)
+    return n_rows
+
+
+def _csv_value(value):
+    """Format a value for a CSV COPY; None becomes an unquoted empty field (NULL)."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _get_or_create_historic_forecasts(session: Session, forecasts: list) -> dict:
+    """
+    Get the historic forecast for every (gsp_id, model name) in one query.
+
+    Missing historic forecasts are created and flushed, not committed.
+
+    Returns:
+        dict: Historic ForecastSQL objects keyed by (gsp_id, model name).
+    """
+    keys = {(f.location.gsp_id, f.model.name) for f in forecasts}
+    gsp_ids = {gsp_id for gsp_id, _ in keys}
+    model_names = {model_name for _, model_name in keys}
+
+    query = session.query(ForecastSQL, LocationSQL.gsp_id, MLModelSQL.name)
+    query = query.join(LocationSQL, ForecastSQL.location_id == LocationSQL.id)
+    query = query.join(MLModelSQL, ForecastSQL.model_id == MLModelSQL.id)
+    query = query.filter(ForecastSQL.historic.is_(True))
+    query = query.filter(LocationSQL.gsp_id.in_(gsp_ids))
+    query = query.filter(MLModelSQL.name.in_(model_names))
+    query = query.order_by(ForecastSQL.created_utc)
+
+    # later rows overwrite earlier ones, so the newest historic forecast wins
+    historic = {(gsp_id, name): forecast for forecast, gsp_id, name in query.all()}
+
+    for forecast in forecasts:
+        key = (forecast.location.gsp_id, forecast.model.name)
+        if key not in historic:
+            logger.debug(
+                f"Could not find a historic forecast for {key}, so will make one"
+            )
+            historic[key] = ForecastSQL(
+                historic=True,
+                forecast_creation_time=datetime.now(tz=timezone.utc),
+                location=forecast.location,
+                input_data_last_updated=forecast.input_data_last_updated,
+                model=forecast.model,
+            )
+            session.add(historic[key])
+    session.flush()
+
+    return historic
+
+
+def _update_forecast_latest(
+    session: Session, forecasts: list, forecast_values: list, batch_size: int
+):
+    """Upsert the new values into `forecast_value_latest` and drop rows over 3 days old."""
+    historic = _get_or_create_historic_forecasts(session, forecasts)
+
+    table = ForecastValueLatestSQL.__table__
+    stmt = postgresql_insert(table)
+    primary_keys = [c.name for c in table.primary_key]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=primary_keys,
+        set_={c.name: c for c in stmt.excluded if not c.primary_key},
+    )
+
+    now = datetime.now(tz=timezone.utc)
+    forecasts_historic = [
+        historic[(forecast.location.gsp_id, forecast.model.name)]
+        for forecast in forecasts
+    ]
+
+    # One set of rows across all forecasts, so many small (e.g. per-GSP)
+    # forecasts still go out in full batches. ON CONFLICT cannot update a row
+    # twice in one statement, so a repeated target time keeps its last value.
+    rows = {}
+    for row in (
+        {
+            "target_time": target_time,
+            "expected_power_generation_megawatts": megawatts,
+            "adjust_mw": adjust_mw,
+            "properties": properties,
+            "gsp_id": forecast.location.gsp_id,
+            "forecast_id": forecast_historic.id,
+            "model_id": forecast.model_id,
+            "is_primary": True,
+            "created_utc": now,
+        }
+        for forecast, forecast_historic, values in zip(
+            forecasts, forecasts_historic, forecast_values
+        )
+        for target_time, megawatts, adjust_mw, properties in _value_rows(values)
+    ):
+        rows[(row["target_time"], row["gsp_id"], row["model_id"])] = row
+    for batch in _batches(rows.values(), batch_size):
+        session.execute(stmt, batch)
+
+    for forecast, forecast_historic in zip(forecasts, forecasts_historic):
+        forecast_historic.input_data_last_updated_id = (
+            forecast.input_data_last_updated_id
+        )
+        forecast_historic.forecast_creation_time = now
+
+    session.execute(
+        delete(ForecastValueLatestSQL).where(
+            ForecastValueLatestSQL.target_time < now - timedelta(days=3)
+        )
+    )
+
+
+def _update_forecast_last_seven_days(
+    session: Session,
+    forecasts: list,
+    forecast_values: list,
+    created_utc: datetime,
+    batch_size: int,
+):
+    """Append the new values to `forecast_value_last_seven_days` and drop old rows."""
+    rows = (
+        (target_time, megawatts, adjust_mw, forecast.id, created_utc)
+        for forecast, values in zip(forecasts, forecast_values)
+        for target_time, megawatts, adjust_mw, _ in _value_rows(values)
+    )
+    columns = [
+        "target_time",
+        "expected_power_generation_megawatts",
+        "adjust_mw",
+        "forecast_id",
+        "created_utc",
+    ]
+    _write_rows(session, ForecastValueSevenDaysSQL.__table__, columns, rows, batch_size)
+
+    now_minus_7_days = datetime.now(tz=timezone.utc) - timedelta(days=7)
+    now_minus_7_days = now_minus_7_days.replace(minute=0, second=0, microsecond=0)
+    session.execute(
+        delete(ForecastValueSevenDaysSQL).where(
+            ForecastValueSevenDaysSQL.target_time < now_minus_7_days
+        )
+    )
@@ -0,0 +1,97 @@
+"""
+Cron-like schedules for the consumer daemon
+
+`CronSchedule` understands the usual five cron fields (minute, hour, day of month,
+month, day of week) with `*`, single values, `a-b` ranges, `*/n` or `a-b/n` steps
+and comma-separated lists, e.g. "5,35 * * * *" to poll shortly after NESO's
+half-hourly publications. Times are interpreted in UTC.
+"""
+
+from datetime import datetime, timedelta
+
+# (lowest, highest) value of each field
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+
+def _parse_field(field: str, lowest: int, highest: int) -> set:
+    """Return the set of values matched by one cron field."""
+    values = set()
+    for part in field.split(","):
+        values_range, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if values_range == "*":
+            start, end = lowest, highest
+        elif "-" in values_range:
+            start, end = (int(v) for v in values_range.split("-", 1))
+        else:
+            start = int(values_range)
+            end = highest if step > 1 else start
+
+        if not lowest <= start <= end <= highest or step < 1:
+            raise ValueError(f"Invalid cron field {field!r}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """
+    A parsed five-field cron expression.
+
+    As in cron, when both day of month and day of week are restricted a day
+    matches if either of them does. Day of week runs from 0 (Sunday) to 6.
+
+    Parameters:
+        expression (str): The cron expression, e.g. "*/30 * * * *".
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(
+                f"Expected 5 fields in cron expression {expression!r}, got {len(fields)}"
+            )
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _parse_field(field, *field_range)
+            for field, field_range in zip(fields, FIELD_RANGES)
+        )
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, when: datetime) -> bool:
+        day = when.day in self.days
+        weekday = (when.isoweekday() % 7) in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, when: datetime) -> datetime:
+        """
+        Return the first scheduled time strictly after `when`.
+
+        Parameters:
+            when (datetime): The reference time; its timezone, if any, is kept.
+
+        Returns:
+            datetime: The next matching minute, with seconds set to zero.
+        """
+        candidate = when.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+
+        while candidate < limit:
+            if candidate.month not in self.months:
+                year = candidate.year + candidate.month // 12
+                month = candidate.month % 12 + 1
+                candidate = candidate.replace(
+                    year=year, month=month, day=1, hour=0, minute=0
+                )
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+
+        raise ValueError(f"Cron expression {self.expression!r} never matches")
@@ -0,0 +1,64 @@
+"""
+Local state shared between consumer runs
+
+A small JSON file holding bookkeeping that has to survive from one run to the
+next, such as the fingerprints used for change detection. Only the standard
+library is used here so that cheap checks can read the state without loading
+pandas or the database models.
+"""
+
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+class StateFile:
+    """
+    JSON key/value store backed by a single file.
+
+    Every `set` rewrites the file atomically (write to a temporary file, then
+    rename), so an interrupted run never leaves a half-written state behind.
+
+    Parameters:
+        path (str): Location of the state file. It is created on first write.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._data = self._load()
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(
+                f"Could not read state file {self.path}, starting afresh: {e}"
+            )
+            return {}
+
+    def get(self, key: str, default=None):
+        """Return the value stored under `key`, or `default`."""
+        return self._data.get(key, default)
+
+    def set(self, key: str, value):
+        """Store a JSON-serialisable `value` under `key` and write the file."""
+        self._data[key] = value
+        self._write()
+
+    def _write(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".state-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._data, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,115 @@
+"""
+Remember how far each resource has been ingested, for incremental fetches
+
+`Watermark` holds the latest target time saved from a resource. The pipeline
+passes it, less a lookback, to `fetch_data_since`, which asks the API for the
+rows after that only. NESO republishes revised values for target times that are
+already saved, so the app's lookback (`Neso.INCREMENTAL_LOOKBACK_HOURS`) covers
+the whole forecast horizon: a run fetches and parses the current forecast
+rather than the resource's full history.
+
+The watermark is kept in a `StateFile`. Without one, or on the first run, it is
+read from the database: the latest national target time in
+`forecast_value_latest` for the model the resource is saved under.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import pandas as pd
+from nowcasting_datamodel.models import ForecastValueLatestSQL, MLModelSQL
+from sqlalchemy import func
+from sqlalchemy.orm.session import Session
+
+from neso_solar_consumer.state import StateFile
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "watermark"
+
+
+class Watermark:
+    """
+    The latest target time ingested from one resource.
+
+    Call `since` before fetching, and `commit` once a page has been saved, so a
+    failed save is fetched again on the next run.
+
+    Parameters:
+        resource_id (str): The NESO resource the pages come from.
+        model_tag (str): The model its forecasts are saved under, for the database lookup.
+        state (StateFile, optional): Where the watermark is kept between runs.
+        lookback (timedelta): Fetch again this far behind the watermark, so that
+            revised values for recent target times are picked up too.
+    """
+
+    def __init__(
+        self,
+        resource_id: str,
+        model_tag: str,
+        state: Optional[StateFile] = None,
+        lookback: timedelta = timedelta(0),
+    ):
+        self.resource_id = resource_id
+        self.model_tag = model_tag
+        self.state = state
+        self.lookback = lookback
+
+        self.latest = None
+        if state is not None:
+            stored = state.get(STATE_KEY, {}).get(resource_id)
+            if stored is not None:
+                self.latest = datetime.fromisoformat(stored)
+
+    def read_from_db(self, session: Session) -> Optional[datetime]:
+        """Return the latest national target time saved under `model_tag`, if any."""
+        latest = (
+            session.query(func.max(ForecastValueLatestSQL.target_time))
+            .join(MLModelSQL, MLModelSQL.id == ForecastValueLatestSQL.model_id)
+            .filter(MLModelSQL.name == self.model_tag)
+            .filter(ForecastValueLatestSQL.gsp_id == 0)
+            .scalar()
+        )
+        if latest is not None and latest.tzinfo is None:
+            latest = latest.replace(tzinfo=timezone.utc)
+        return latest
+
+    def since(self, session: Optional[Session] = None) -> Optional[datetime]:
+        """
+        Return the time to fetch rows after, or None to fetch from the start.
+
+        Parameters:
+            session (Session, optional): Read the watermark from the database when
+                the state file has none.
+        """
+        if self.latest is None and session is not None:
+            self.latest = self.read_from_db(session)
+        if self.latest is None:
+            logger.info(
+                f"No watermark for {self.resource_id}, fetching from the start."
+            )
+            return None
+
+        since = self.latest - self.lookback
+        logger.info(f"Fetching {self.resource_id} after {since.isoformat()}.")
+        return since
+
+    def commit(self, data: pd.DataFrame):
+        """
+        Move the watermark up to the latest target time in `data`, then write the state.
+
+        Parameters:
+            data (pd.DataFrame): A page that has been saved, with `Datetime_GMT` (UTC).
+        """
+        if data.empty:
+            return
+        latest = data["Datetime_GMT"].max().to_pydatetime()
+        if self.latest is not None and latest <= self.latest:
+            return
+        self.latest = latest
+
+        if self.state is not None:
+            all_state = self.state.get(STATE_KEY, {})
+            all_state[self.resource_id] = latest.isoformat()
+            self.state.set(STATE_KEY, all_state)
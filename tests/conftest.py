@@ -5,12 +5,15 @@ from sqlalchemy.orm import sessionmaker
 from nowcasting_datamodel.models.base import Base_Forecast
 from nowcasting_datamodel.models import MLModelSQL
 from testcontainers.postgres import PostgresContainer
+from neso_solar_consumer.config import Neso
+from stub_api import StubNesoApi, make_records
 
 # Shared Test Configuration Constants
 RESOURCE_ID = "db6c038f-98af-4570-ab60-24d71ebd0ae5"
 LIMIT = 5
 MODEL_NAME = "real_data_model"
 MODEL_VERSION = "1.0"
+STUB_N_RECORDS = 1050
 
 
 @pytest.fixture(scope="session")
@@ -77,3 +80,18 @@ def test_config():
         "model_name": MODEL_NAME,
         "model_version": MODEL_VERSION,
     }
+
+
+@pytest.fixture(scope="function")
+def neso_api(monkeypatch):
+    """
+    Fixture to serve synthetic records from a local stand-in for the NESO API.
+    `Neso.API_URL` is pointed at the stub for the duration of the test, so the fetch
+    functions can be exercised without network access.
+
+    Returns:
+        StubNesoApi: The running stub server, exposing `records` and `requests`.
+    """
+    with StubNesoApi(make_records(STUB_N_RECORDS)) as api:
+        monkeypatch.setattr(Neso, "API_URL", api.url)
+        yield api
@@ -0,0 +1,313 @@
+"""
+Local stand-in for the NESO CKAN API
+
+The live API is not available to every test run, so the offline tests start this
+small threaded HTTP server instead. It serves `datastore_search` from an in-memory
+list of records, mimicking CKAN's `limit`/`offset` pagination and `_links.next`,
+and `datastore_search_sql` for the simple queries the consumer sends (see
+`StubNesoApi.datastore_search_sql`), plus `resource_show`. It can also be told to fail requests, to
+test how the client copes with a flaky server (see `StubNesoApi.faults`).
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+def make_records(n_rows: int, start: str = "2024-01-01") -> list:
+    """
+    Build `n_rows` half-hourly records shaped like the NESO embedded solar dataset.
+
+    Parameters:
+        n_rows (int): Number of records to generate.
+        start (str): First `DATE_GMT` of the series (YYYY-MM-DD).
+
+    Returns:
+        list: A list of record dictionaries.
+    """
+    start_date = datetime.strptime(start, "%Y-%m-%d")
+    records = []
+    for i in range(n_rows):
+        day = start_date + timedelta(days=i // 48)
+        settlement_period = i % 48
+        minutes = settlement_period * 30
+        records.append(
+            {
+                "_id": i + 1,
+                "DATE_GMT": day.strftime("%Y-%m-%dT00:00:00"),
+                "TIME_GMT": f"{minutes // 60:02d}:{minutes % 60:02d}",
+                "SETTLEMENT_DATE": day.strftime("%Y-%m-%dT00:00:00"),
+                "SETTLEMENT_PERIOD": settlement_period + 1,
+                "EMBEDDED_WIND_FORECAST": 1000 + i % 500,
+                "EMBEDDED_WIND_CAPACITY": 6500,
+                "EMBEDDED_SOLAR_FORECAST": (i * 37) % 9000,
+                "EMBEDDED_SOLAR_CAPACITY": 17000,
+            }
+        )
+    return records
+
+
+def make_payload(n_rows: int, start: str = "2024-01-01") -> bytes:
+    """Build a `datastore_search` response body holding `n_rows` records."""
+    body = {"success": True, "result": {"records": make_records(n_rows, start)}}
+    return json.dumps(body).encode("utf-8")
+
+
+SQL_PATTERN = re.compile(
+    r"""^\s*SELECT\s+(?P<columns>.+?)\s+FROM\s+"(?P<resource>[^"]+)"
+    (?:\s+WHERE\s+(?P<where>.+?))?
+    (?:\s+ORDER\s+BY\s+(?P<order>.+?))?
+    (?:\s+LIMIT\s+(?P<limit>\d+))?
+    (?:\s+OFFSET\s+(?P<offset>\d+))?
+    \s*;?\s*$""",
+    re.IGNORECASE | re.DOTALL | re.VERBOSE,
+)
+CONDITION_PATTERN = re.compile(
+    r"""^\s*"(?P<column>\w+)"\s*(?P<op>>=|<=|=|>|<)\s*
+    (?:'(?P<string>(?:[^']|'')*)'|(?P<number>-?\d+(?:\.\d+)?))\s*$""",
+    re.VERBOSE,
+)
+OPERATORS = {
+    "=": lambda a, b: a == b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler that reads its data from the owning `StubNesoApi`."""
+
+    # HTTP/1.1 so that clients can keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.api._lock:
+            self.server.api.connections += 1
+
+    def do_GET(self):
+        api = self.server.api
+        parsed = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        with api._lock:
+            api.requests.append(self.path)
+            fault = api.faults.pop(0) if api.faults else None
+        if api.latency:
+            time.sleep(api.latency)
+
+        if fault == "hang":
+            time.sleep(api.hang_seconds)
+            self.close_connection = True
+            return
+        if fault == "drop":
+            self.close_connection = True
+            return
+        if fault is not None:
+            self.send_error(fault)
+            return
+
+        if parsed.path.endswith("/datastore_search"):
+            body = api.datastore_search(query)
+        elif parsed.path.endswith("/resource_show"):
+            body = api.resource_show(query)
+        elif parsed.path.endswith("/datastore_search_sql"):
+            try:
+                body = api.datastore_search_sql(query.get("sql", ""))
+            except ValueError as e:
+                self.send_error(409, str(e))
+                return
+        else:
+            self.send_error(404)
+            return
+
+        payload = json.dumps(body).encode("utf-8")
+        etag = f'"{hashlib.md5(payload).hexdigest()}"'
+        if api.etags and self.headers.get("If-None-Match") == etag:
+            with api._lock:
+                api.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if api.etags:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        """Keep the test output quiet."""
+
+
+class StubNesoApi:
+    """
+    Threaded HTTP server serving a fixed list of records through the CKAN actions.
+
+    Use as a context manager; `url` is the action base URL to point `Neso.API_URL` at.
+
+    Parameters:
+        records (list): The records to serve, e.g. from `make_records`.
+        latency (float): Seconds to sleep before answering each request, to mimic
+            the round-trip time of the real API.
+        etags (bool): Send an `ETag` with each response and answer matching
+            `If-None-Match` requests with `304 Not Modified`.
+        faults (list, optional): How to answer the next requests, one entry per
+            request in arrival order: None to answer normally, an HTTP status to
+            send as an error, "hang" to say nothing for `hang_seconds`, or "drop"
+            to close the connection without answering. Requests after the list
+            runs out are answered normally. Can be extended while running.
+        hang_seconds (float): How long a "hang" fault keeps the client waiting.
+        sql_rows_max (int, optional): The most rows a `datastore_search_sql`
+            query returns, whatever its `LIMIT`, as CKAN caps them.
+    """
+
+    def __init__(
+        self,
+        records: list,
+        latency: float = 0.0,
+        etags: bool = False,
+        faults: Optional[list] = None,
+        hang_seconds: float = 2.0,
+        sql_rows_max: Optional[int] = None,
+    ):
+        self.records = records
+        self.latency = latency
+        self.etags = etags
+        self.faults = list(faults or [])
+        # served by `resource_show`; change it to mimic a new publication
+        self.last_modified = "2024-01-01T09:30:00.000000"
+        self.hang_seconds = hang_seconds
+        self.sql_rows_max = sql_rows_max
+        self.requests = []
+        self.connections = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.api = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/api/3/action"
+
+    def datastore_search(self, query: dict) -> dict:
+        """Build a `datastore_search` response for one page of records."""
+        resource_id = query.get("resource_id", "")
+        limit = int(query.get("limit", 100))
+        offset = int(query.get("offset", 0))
+        page = self.records[offset : offset + limit]
+
+        next_query = urllib.parse.urlencode(
+            {"resource_id": resource_id, "limit": limit, "offset": offset + limit}
+        )
+        return {
+            "success": True,
+            "result": {
+                "resource_id": resource_id,
+                "records": page,
+                "fields": (
+                    [{"id": name} for name in self.records[0]] if self.records else []
+                ),
+                "total": len(self.records),
+                "limit": limit,
+                "offset": offset,
+                "_links": {
+                    "start": f"/api/3/action/datastore_search?resource_id={resource_id}",
+                    "next": f"/api/3/action/datastore_search?{next_query}",
+                },
+            },
+        }
+
+    def resource_show(self, query: dict) -> dict:
+        """Build a `resource_show` response with the resource's `last_modified` time."""
+        return {
+            "success": True,
+            "result": {
+                "id": query.get("id", ""),
+                "last_modified": self.last_modified,
+                "metadata_modified": self.last_modified,
+            },
+        }
+
+    def datastore_search_sql(self, sql: str) -> dict:
+        """
+        Build a `datastore_search_sql` response for a simple query.
+
+        Supports `SELECT * | "COL", ... FROM "resource"` with an optional `WHERE` of
+        `"COL" <op> 'text' | number` conditions joined by `AND` (text compared as
+        strings, like the ISO dates in the dataset), `ORDER BY "COL" [ASC|DESC], ...`,
+        `LIMIT` and `OFFSET`. Anything else is rejected like an invalid query.
+        """
+        match = SQL_PATTERN.match(sql)
+        if match is None:
+            raise ValueError(f"Unsupported query: {sql}")
+
+        records = self.records
+        if match["where"]:
+            for condition in re.split(r"\s+AND\s+", match["where"], flags=re.I):
+                parsed = CONDITION_PATTERN.match(condition)
+                if parsed is None:
+                    raise ValueError(f"Unsupported condition: {condition}")
+                if parsed["string"] is not None:
+                    value = parsed["string"].replace("''", "'")
+                else:
+                    value = float(parsed["number"])
+                compare = OPERATORS[parsed["op"]]
+                records = [
+                    r
+                    for r in records
+                    if r.get(parsed["column"]) is not None
+                    and compare(r[parsed["column"]], value)
+                ]
+
+        if match["order"]:
+            for term in reversed(match["order"].split(",")):
+                column, _, direction = term.strip().partition(" ")
+                records = sorted(
+                    records,
+                    key=lambda r: r[column.strip('"')],
+                    reverse=direction.strip().upper() == "DESC",
+                )
+
+        offset = int(match["offset"] or 0)
+        limit = int(match["limit"]) if match["limit"] else None
+        if self.sql_rows_max is not None:
+            limit = min(limit or self.sql_rows_max, self.sql_rows_max)
+        records = (
+            records[offset:] if limit is None else records[offset : offset + limit]
+        )
+
+        columns = match["columns"].strip()
+        if columns != "*":
+            names = [name.strip().strip('"') for name in columns.split(",")]
+            records = [{name: r.get(name) for name in names} for r in records]
+
+        return {"success": True, "result": {"records": records, "sql": sql}}
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
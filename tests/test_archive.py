@@ -0,0 +1,111 @@
+"""
+Tests for the fetched-page archive in `neso_solar_consumer.archive`
+
+Formatting and saving are replaced in the replay test, so no database is needed.
+"""
+
+from datetime import date, datetime, timezone
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from neso_solar_consumer import archive as archive_module  # noqa: E402
+from neso_solar_consumer.archive import RawArchive, replay  # noqa: E402
+from neso_solar_consumer.config import Neso  # noqa: E402
+from neso_solar_consumer.fetch_data import (  # noqa: E402
+    _records_to_dataframe,
+    fetch_data_pages,
+)
+from stub_api import make_records  # noqa: E402
+
+
+def make_page(start: str, n_rows: int = 4, regional: bool = False) -> list:
+    """Raw records of one page, as the API returns them."""
+    records = make_records(n_rows, start=start)
+    if regional:
+        for gsp_id, record in enumerate(records):
+            record[Neso.GSP_ID_FIELD] = gsp_id
+    return records
+
+
+def fetched(day: int, hour: int = 12) -> datetime:
+    return datetime(2025, 1, day, hour, tzinfo=timezone.utc)
+
+
+def test_archive_round_trip_and_date_filter(tmp_path):
+    """
+    Test that records come back unchanged, in fetch order, and filtered by fetch
+    day, and that pages are parsed again from them.
+    """
+    archive = RawArchive(str(tmp_path))
+    pages = [
+        (make_page("2025-01-01"), fetched(1, 12)),
+        (make_page("2025-01-02"), fetched(1, 6)),
+        (make_page("2025-01-03", regional=True), fetched(2)),
+        (make_page("2025-01-04"), fetched(3)),
+    ]
+    for page, when in pages:
+        archive.write(page, "res", fetched=when)
+    assert archive.write([], "res") is None
+
+    expected = [pages[1][0], pages[0][0], pages[2][0], pages[3][0]]
+    assert list(archive.read_records("res")) == expected
+    replayed = list(archive.read("res"))
+    assert len(replayed) == len(expected)
+    for data, records in zip(replayed, expected):
+        pd.testing.assert_frame_equal(data, _records_to_dataframe(records))
+
+    middle = list(archive.read("res", start=date(2025, 1, 2), end=date(2025, 1, 3)))
+    assert len(middle) == 1 and "gsp_id" in middle[0].columns
+    assert list(archive.read("other")) == []
+
+
+def test_pipeline_archives_raw_records(neso_api, tmp_path):
+    """Test that the fetched records are archived before they are parsed."""
+    archive = RawArchive(str(tmp_path))
+    pages = list(
+        fetch_data_pages(
+            "stub-resource",
+            page_size=100,
+            max_records=250,
+            on_records=lambda records: archive.write(records, "stub-resource"),
+        )
+    )
+
+    assert list(archive.read_records("stub-resource")) == [
+        neso_api.records[0:100],
+        neso_api.records[100:200],
+        neso_api.records[200:250],
+    ]
+    for data, page in zip(archive.read("stub-resource"), pages):
+        pd.testing.assert_frame_equal(data, page)
+
+
+def test_replay_saves_every_page(tmp_path, monkeypatch):
+    """
+    Test that replay formats and saves each archived page under the given model,
+    without the adjuster.
+    """
+    archive = RawArchive(str(tmp_path))
+    archive.write(make_page("2025-01-01"), "res", fetched=fetched(1))
+    archive.write(make_page("2025-01-02"), "res", fetched=fetched(2))
+
+    saved = []
+    monkeypatch.setattr(
+        archive_module,
+        "format_to_forecast_sql",
+        lambda data, model_tag, **kwargs: [(model_tag, data)],
+    )
+
+    def save(forecasts, session, method, apply_adjuster=True):
+        assert apply_adjuster is False
+        saved.extend(forecasts)
+
+    monkeypatch.setattr(archive_module, "save_forecasts_to_db", save)
+
+    n_rows = replay(None, archive, resource_id="res", model_tag="replayed_model")
+
+    assert n_rows == 8
+    assert [model_tag for model_tag, _ in saved] == ["replayed_model"] * 2
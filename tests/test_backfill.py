@@ -0,0 +1,144 @@
+"""
+Tests for the historical backfill in `neso_solar_consumer.backfill`
+
+Windows are fetched from the local stand-in API; formatting and saving are replaced,
+so no database is needed.
+"""
+
+from datetime import date
+
+import pytest
+
+from neso_solar_consumer import backfill as backfill_module
+from neso_solar_consumer.backfill import backfill, date_windows, window_query
+from neso_solar_consumer.config import Neso
+from neso_solar_consumer.fetch_data import quote_identifier, quote_literal
+from neso_solar_consumer.state import StateFile
+
+
+@pytest.fixture
+def saved(monkeypatch):
+    """Record the frames that would be saved, instead of touching the database."""
+    frames = []
+
+    def save(forecasts, session, method, apply_adjuster=True):
+        # backfilled forecasts are never adjusted, as on the parallel path
+        assert apply_adjuster is False
+        frames.extend(forecasts)
+
+    monkeypatch.setattr(
+        backfill_module, "format_to_forecast_sql", lambda data, **kwargs: [data]
+    )
+    monkeypatch.setattr(backfill_module, "save_forecasts_to_db", save)
+    return frames
+
+
+def test_date_windows():
+    """Test that windows cover the range exactly, with a short last window."""
+    windows = date_windows(date(2024, 1, 1), date(2024, 1, 17), 7)
+    assert windows == [
+        (date(2024, 1, 1), date(2024, 1, 8)),
+        (date(2024, 1, 8), date(2024, 1, 15)),
+        (date(2024, 1, 15), date(2024, 1, 17)),
+    ]
+
+
+def test_window_query_quotes_names_and_values():
+    """Test that quotes in the resource id cannot break out of the identifier."""
+    assert quote_identifier('a"b') == '"a""b"'
+    assert quote_literal("it's") == "'it''s'"
+
+    sql = window_query('res"; DROP', date(2024, 1, 1), date(2024, 1, 8))
+    assert sql.startswith('SELECT * FROM "res""; DROP" WHERE "DATE_GMT" >= ')
+    assert "'2024-01-01'" in sql and "'2024-01-08'" in sql
+
+
+def test_backfill_saves_every_window(neso_api, saved, tmp_path):
+    """
+    Test that a backfill fetches each window once and saves all of its rows.
+    """
+    n_rows = backfill(
+        session=None,
+        start=date(2024, 1, 1),
+        end=date(2024, 1, 15),
+        state=StateFile(str(tmp_path / "state.json")),
+        resource_id="stub-resource",
+        window_days=3,
+        max_workers=2,
+    )
+
+    assert n_rows == 14 * 48
+    assert len(saved) == 5
+    assert sum(len(frame) for frame in saved) == 14 * 48
+    first_times = [frame["Datetime_GMT"].iloc[0] for frame in saved]
+    assert first_times == sorted(first_times)
+    assert len(neso_api.requests) == 5
+
+
+def test_backfill_pages_windows_over_the_row_cap(
+    neso_api, saved, tmp_path, monkeypatch
+):
+    """
+    Test that a window with more rows than one query returns is fetched in full.
+    """
+    neso_api.sql_rows_max = 50
+    monkeypatch.setattr(Neso, "SQL_ROWS_MAX", 50)
+    n_rows = backfill(
+        session=None,
+        start=date(2024, 1, 1),
+        end=date(2024, 1, 7),
+        state=StateFile(str(tmp_path / "state.json")),
+        resource_id="stub-resource",
+        window_days=3,
+        max_workers=2,
+    )
+
+    assert n_rows == 6 * 48
+    assert [len(frame) for frame in saved] == [3 * 48, 3 * 48]
+    for frame in saved:
+        assert frame["Datetime_GMT"].is_unique
+        assert frame["Datetime_GMT"].is_monotonic_increasing
+    # Pages of 50, 50 and 44 rows per window
+    assert len(neso_api.requests) == 6
+
+
+def test_backfill_resumes_after_failure(neso_api, saved, tmp_path, monkeypatch):
+    """
+    Test that windows saved before a failure are not fetched again on the next run.
+    """
+    state_path = str(tmp_path / "state.json")
+    save = backfill_module.save_forecasts_to_db
+
+    def fail_on_third_window(forecasts, session, method, **kwargs):
+        if len(saved) == 2:
+            raise RuntimeError("database went away")
+        save(forecasts, session, method, **kwargs)
+
+    monkeypatch.setattr(backfill_module, "save_forecasts_to_db", fail_on_third_window)
+    with pytest.raises(RuntimeError):
+        backfill(
+            None,
+            date(2024, 1, 1),
+            date(2024, 1, 6),
+            StateFile(state_path),
+            resource_id="stub-resource",
+            window_days=1,
+            max_workers=1,
+        )
+    assert len(saved) == 2
+
+    monkeypatch.setattr(backfill_module, "save_forecasts_to_db", save)
+    neso_api.requests.clear()
+    backfill(
+        None,
+        date(2024, 1, 1),
+        date(2024, 1, 6),
+        StateFile(state_path),
+        resource_id="stub-resource",
+        window_days=1,
+        max_workers=1,
+    )
+
+    assert len(saved) == 5
+    assert len(neso_api.requests) == 3
+    assert [frame["Datetime_GMT"].dt.day.iloc[0] for frame in saved] == [1, 2, 3, 4, 5]
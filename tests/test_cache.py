@@ -0,0 +1,78 @@
+"""
+Tests for the on-disk response cache in `neso_solar_consumer.cache`
+
+The cache sits between the fetch functions and the local stand-in for the NESO API.
+"""
+
+import pytest
+
+from neso_solar_consumer.cache import ResponseCache
+from neso_solar_consumer.fetch_data import fetch_data
+from neso_solar_consumer.http_client import set_cache
+
+
+@pytest.fixture
+def response_cache(tmp_path):
+    """Route fetches through a fresh cache for the duration of a test."""
+    cache = ResponseCache(str(tmp_path / "cache"), ttl=300)
+    set_cache(cache)
+    yield cache
+    set_cache(None)
+
+
+def test_repeat_fetch_within_ttl_is_served_from_cache(neso_api, response_cache):
+    """
+    Test that a repeated fetch within the TTL makes no request and returns the same data.
+    """
+    first = fetch_data("stub-resource", 100)
+    second = fetch_data("stub-resource", 100)
+
+    assert first.equals(second)
+    assert len(neso_api.requests) == 1
+    assert (response_cache.misses, response_cache.hits) == (1, 1)
+
+
+def test_expired_entry_is_revalidated_with_etag(neso_api, response_cache):
+    """
+    Test that an expired entry sends `If-None-Match` and reuses the body on a 304.
+    """
+    neso_api.etags = True
+    response_cache.ttl = 0
+
+    first = fetch_data("stub-resource", 100)
+    second = fetch_data("stub-resource", 100)
+
+    assert first.equals(second)
+    assert len(neso_api.requests) == 2
+    assert neso_api.not_modified == 1
+    assert response_cache.revalidations == 1
+
+
+def test_different_urls_are_cached_separately(neso_api, response_cache):
+    """
+    Test that different limits (different URLs) get their own entries.
+    """
+    assert len(fetch_data("stub-resource", 10)) == 10
+    assert len(fetch_data("stub-resource", 20)) == 20
+    assert response_cache.misses == 2
+
+
+def test_cache_evicts_least_recently_used(neso_api, tmp_path):
+    """
+    Test that the cache stays under `max_bytes` by dropping the oldest entries.
+    """
+    cache = ResponseCache(str(tmp_path / "cache"), ttl=300, max_bytes=60_000)
+    set_cache(cache)
+    try:
+        for limit in (100, 101, 102, 103):
+            fetch_data("stub-resource", limit)
+        sizes = [p.stat().st_size for p in (tmp_path / "cache").glob("*.body")]
+        assert sum(sizes) <= 60_000
+        assert 0 < len(sizes) < 4
+
+        # the most recent entry survived eviction
+        n_requests = len(neso_api.requests)
+        fetch_data("stub-resource", 103)
+        assert len(neso_api.requests) == n_requests
+    finally:
+        set_cache(None)
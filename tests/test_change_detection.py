@@ -0,0 +1,75 @@
+"""
+Tests for fingerprint-based change detection in `neso_solar_consumer.change_detection`
+"""
+
+import pandas as pd
+
+from neso_solar_consumer.change_detection import ChangeDetector, fingerprint
+from neso_solar_consumer.state import StateFile
+
+
+def make_forecast_data(n_rows: int = 48) -> pd.DataFrame:
+    start = pd.Timestamp.now(tz="UTC").floor("30min")
+    return pd.DataFrame(
+        {
+            "Datetime_GMT": pd.date_range(start, periods=n_rows, freq="30min"),
+            "solar_forecast_kw": [float(i * 100) for i in range(n_rows)],
+        }
+    )
+
+
+def test_fingerprint_ignores_row_order():
+    """
+    Test that the fingerprint depends on the content, not the row order or index.
+    """
+    data = make_forecast_data()
+    shuffled = data.sample(frac=1, random_state=0)
+
+    assert fingerprint(data) == fingerprint(shuffled)
+
+    changed = data.copy()
+    changed.loc[5, "solar_forecast_kw"] += 1
+    assert fingerprint(data) != fingerprint(changed)
+
+
+def test_change_detector_skips_unchanged_forecast(tmp_path):
+    """
+    Test that a page saved in a previous run is reported as unchanged.
+    """
+    state_path = str(tmp_path / "state.json")
+    data = make_forecast_data()
+
+    detector = ChangeDetector(StateFile(state_path), "resource")
+    assert len(detector.changed_rows(data)) == len(data)
+    detector.commit(data)
+
+    # a new run reads the state back from disk
+    detector = ChangeDetector(StateFile(state_path), "resource")
+    assert detector.changed_rows(data).empty
+
+
+def test_change_detector_returns_only_changed_target_times(tmp_path):
+    """
+    Test that a partially republished forecast yields only the changed or new rows.
+    """
+    state = StateFile(str(tmp_path / "state.json"))
+    data = make_forecast_data()
+    detector = ChangeDetector(state, "resource")
+    detector.commit(data)
+
+    republished = make_forecast_data(n_rows=50)
+    republished.loc[[3, 7], "solar_forecast_kw"] = [1.0, 2.0]
+
+    changed = detector.changed_rows(republished)
+    assert changed.index.tolist() == [3, 7, 48, 49]
+
+
+def test_change_detector_keeps_resources_apart(tmp_path):
+    """
+    Test that state recorded for one resource does not affect another.
+    """
+    state = StateFile(str(tmp_path / "state.json"))
+    data = make_forecast_data()
+    ChangeDetector(state, "resource-a").commit(data)
+
+    assert len(ChangeDetector(state, "resource-b").changed_rows(data)) == len(data)
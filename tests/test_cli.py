@@ -0,0 +1,143 @@
+"""
+Tests for the command line entry point and the new-data probe
+
+The probe talks to the local stand-in for the NESO API, and the pipeline itself
+is replaced, so no database is needed.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from neso_solar_consumer import app as app_module
+from neso_solar_consumer.cli import EXIT_ERROR, EXIT_NEW, EXIT_UNCHANGED, main
+from neso_solar_consumer.config import Neso
+from neso_solar_consumer.probe import STATE_KEY as PUBLISHED_KEY
+from neso_solar_consumer.probe import record_published
+from neso_solar_consumer.state import StateFile
+from neso_solar_consumer.watermark import STATE_KEY as WATERMARK_KEY
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_check_reports_new_publications(neso_api, tmp_path, monkeypatch):
+    """
+    Test that `check` follows the resource's modified time against the state file,
+    and reports a failed probe with its own status.
+    """
+    state_path = str(tmp_path / "state.json")
+    check = ["check", "--resource-id", "res", "--state-path", state_path]
+    assert main(check) == EXIT_NEW
+
+    record_published(StateFile(state_path), "res", neso_api.last_modified)
+    assert main(check) == EXIT_UNCHANGED
+
+    neso_api.last_modified = "2024-01-01T10:00:00.000000"
+    assert main(check) == EXIT_NEW
+
+    monkeypatch.setattr(Neso, "FETCH_RETRIES", 0)
+    neso_api.faults = [500]
+    assert main(check) == EXIT_ERROR
+
+
+def test_run_if_changed_skips_the_pipeline(neso_api, tmp_path, monkeypatch):
+    """
+    Test that `run --if-changed` only runs the pipeline when there is new data,
+    and records what it ran for once it has succeeded.
+    """
+    runs = []
+    monkeypatch.setattr(app_module, "app", lambda **kwargs: runs.append(kwargs))
+    run = [
+        "run",
+        "--database-url",
+        "postgresql://unused",
+        "--state-path",
+        str(tmp_path / "state.json"),
+        "--if-changed",
+    ]
+
+    assert main(run) == 0
+    assert main(run) == 0
+    assert len(runs) == 1 and runs[0]["db_url"] == "postgresql://unused"
+
+    neso_api.last_modified = "2024-01-01T10:00:00.000000"
+    assert main(run) == 0
+    assert len(runs) == 2
+
+
+def test_run_if_changed_keeps_what_the_run_saved(neso_api, tmp_path, monkeypatch):
+    """
+    Test that recording the published marker does not overwrite the state that
+    the run itself saved, such as the incremental watermark.
+    """
+    state_path = str(tmp_path / "state.json")
+
+    def fake_app(**kwargs):
+        StateFile(kwargs["state_path"]).set(
+            WATERMARK_KEY, {"res": "2024-01-02T00:00:00+00:00"}
+        )
+
+    monkeypatch.setattr(app_module, "app", fake_app)
+    run = [
+        "run",
+        "--database-url",
+        "postgresql://unused",
+        "--state-path",
+        state_path,
+        "--if-changed",
+    ]
+    assert main(run) == 0
+
+    state = StateFile(state_path)
+    assert state.get(WATERMARK_KEY) == {"res": "2024-01-02T00:00:00+00:00"}
+    assert state.get(PUBLISHED_KEY) == {Neso.RESOURCE_ID: neso_api.last_modified}
+
+
+def test_run_if_changed_does_not_record_a_failed_run(neso_api, tmp_path, monkeypatch):
+    """
+    Test that a run whose fetch fails exits with an error and leaves the
+    publication unrecorded, so that the next `--if-changed` run retries it.
+    """
+    monkeypatch.setattr(Neso, "FETCH_RETRIES", 0)
+    # the probe is answered, every fetch after it fails
+    neso_api.faults = [None] + [500] * 10
+    state_path = str(tmp_path / "state.json")
+    run = [
+        "run",
+        "--database-url",
+        "postgresql://unused",
+        "--state-path",
+        state_path,
+        "--if-changed",
+    ]
+
+    assert main(run) == EXIT_ERROR
+    assert StateFile(state_path).get(PUBLISHED_KEY) is None
+
+
+def test_check_does_not_import_heavy_dependencies(neso_api):
+    """Test that `check` runs in a fresh interpreter without pandas or SQLAlchemy."""
+    code = (
+        "import sys\n"
+        "from neso_solar_consumer.config import Neso\n"
+        "Neso.API_URL = sys.argv[1]\n"
+        "from neso_solar_consumer.cli import main\n"
+        "status = main(['check', '--resource-id', 'res'])\n"
+        "heavy = ('pandas', 'sqlalchemy', 'nowcasting_datamodel')\n"
+        "print(status, [name for name in heavy if name in sys.modules])\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code, neso_api.url],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.split("\n")[0] == f"{EXIT_NEW} []"
+
+
+def test_unknown_arguments_are_rejected():
+    with pytest.raises(SystemExit):
+        main(["check", "--no-such-option"])
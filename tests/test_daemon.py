@@ -0,0 +1,94 @@
+"""
+Tests for the cron schedule and the long-running daemon
+
+The daemon tests replace `run_pipelined`, so no database or API is needed; the
+connection is created against an in-memory SQLite URL and never used.
+"""
+
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from neso_solar_consumer import daemon as daemon_module
+from neso_solar_consumer.daemon import Daemon
+from neso_solar_consumer.schedule import CronSchedule
+
+
+@pytest.mark.parametrize(
+    "expression, when, expected",
+    [
+        ("*/30 * * * *", datetime(2024, 1, 1, 10, 0), datetime(2024, 1, 1, 10, 30)),
+        ("*/30 * * * *", datetime(2024, 1, 1, 10, 45), datetime(2024, 1, 1, 11, 0)),
+        ("5,35 * * * *", datetime(2024, 1, 1, 23, 40), datetime(2024, 1, 2, 0, 5)),
+        ("0 6-8 * * *", datetime(2024, 1, 1, 8, 0), datetime(2024, 1, 2, 6, 0)),
+        ("0 0 1 * *", datetime(2024, 12, 15), datetime(2025, 1, 1)),
+        ("0 12 * * 1", datetime(2024, 1, 1, 12, 0), datetime(2024, 1, 8, 12, 0)),
+        ("0 0 29 2 *", datetime(2024, 3, 1), datetime(2028, 2, 29)),
+    ],
+)
+def test_cron_schedule_next_after(expression, when, expected):
+    """Test that `next_after` returns the first matching minute after `when`."""
+    assert CronSchedule(expression).next_after(when) == expected
+
+
+def test_cron_schedule_keeps_timezone():
+    """Test that an aware `when` gives an aware result in the same timezone."""
+    when = datetime(2024, 1, 1, 10, 10, 30, tzinfo=timezone.utc)
+    assert CronSchedule("*/15 * * * *").next_after(when) == datetime(
+        2024, 1, 1, 10, 15, tzinfo=timezone.utc
+    )
+
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "*/0 * * * *"])
+def test_cron_schedule_rejects_invalid(expression):
+    """Test that malformed expressions raise a ValueError."""
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_daemon_retries_failed_cycle_with_backoff(monkeypatch):
+    """
+    Test that a failed cycle is retried after the backoff rather than at the next
+    scheduled time, and that the failure count resets on success.
+    """
+    calls = []
+
+    def run_pipelined(connection, **kwargs):
+        calls.append(connection)
+        if len(calls) == 1:
+            raise RuntimeError("API unavailable")
+        return 10
+
+    monkeypatch.setattr(daemon_module, "run_pipelined", run_pipelined)
+    daemon = Daemon("sqlite://", schedule="0 0 1 1 *", jitter=0, backoff=0.01)
+    daemon.run(max_cycles=2)
+
+    assert len(calls) == 2
+    assert daemon.cycles == 1
+    assert daemon.failures == 0
+    assert daemon.last_cycle_seconds is not None
+
+
+def test_daemon_stop_interrupts_wait(monkeypatch):
+    """Test that `stop` ends the loop while it is waiting for the next cycle."""
+    monkeypatch.setattr(daemon_module, "run_pipelined", lambda connection, **kwargs: 0)
+    daemon = Daemon("sqlite://", schedule="0 0 1 1 *", jitter=0)
+
+    thread = threading.Thread(target=daemon.run)
+    thread.start()
+    while daemon.cycles == 0 and thread.is_alive():
+        thread.join(0.01)
+    daemon.stop()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert daemon.cycles == 1
+
+
+def test_daemon_connection_pre_pings_one_engine():
+    connection = Daemon("sqlite://").connect()
+
+    assert connection.engine.pool._pre_ping
+    assert connection.get_session().get_bind() is connection.engine
+    connection.engine.dispose()
@@ -25,7 +25,24 @@ Run tests matching a specific pattern:
     pytest tests/test_fetch_data.py -k "fetch_data"
 """
 
-from neso_solar_consumer.fetch_data import fetch_data, fetch_data_using_sql
+import json
+import random
+
+import pandas as pd
+from neso_solar_consumer.http_client import HTTPConnectionPool
+from neso_solar_consumer import fetch_data as fetch_data_module
+from neso_solar_consumer.config import Neso
+from neso_solar_consumer.fetch_data import (
+    _parse_datetime_gmt,
+    _payload_to_dataframe,
+    fetch_data,
+    fetch_data_concurrent,
+    fetch_data_pages,
+    fetch_data_since,
+    fetch_data_using_sql,
+    incremental_query,
+)
+from stub_api import make_records
 
 
 def test_fetch_data_api(test_config):
@@ -99,3 +116,208 @@ def test_data_consistency(test_config):
     assert df_api.equals(
         df_sql
     ), "Data from fetch_data and fetch_data_using_sql are inconsistent!"
+
+
+def test_fetch_data_pages_follows_next_links(neso_api):
+    """
+    Test that `fetch_data_pages` walks every page of the stub API in bounded chunks.
+
+    Assertions:
+        - Every chunk holds at most `page_size` rows.
+        - One request is made per page.
+        - The concatenated chunks match a single `fetch_data` call for the same rows.
+    """
+    page_size = 100
+    chunks = list(fetch_data_pages("stub-resource", page_size=page_size))
+
+    n_records = len(neso_api.records)
+    assert len(chunks) == -(-n_records // page_size)
+    assert all(len(chunk) <= page_size for chunk in chunks)
+    assert len(neso_api.requests) == len(chunks)
+
+    df_pages = pd.concat(chunks)
+    df_single = fetch_data("stub-resource", n_records)
+    assert df_pages.reset_index(drop=True).equals(df_single.reset_index(drop=True))
+
+
+def test_fetch_data_pages_max_records(neso_api):
+    """
+    Test that `fetch_data_pages` stops once `max_records` rows have been fetched.
+    """
+    chunks = list(fetch_data_pages("stub-resource", page_size=100, max_records=250))
+
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+    assert chunks[-1]["Datetime_GMT"].iloc[-1] == pd.Timestamp(
+        "2024-01-06 04:30", tz="UTC"
+    )
+
+
+def test_fetch_data_concurrent_matches_sequential(neso_api):
+    """
+    Test that `fetch_data_concurrent` returns the same pages, in order, as
+    `fetch_data_pages`, while reusing a bounded number of pooled connections.
+    """
+    pool = HTTPConnectionPool(max_connections_per_host=4)
+    chunks = list(
+        fetch_data_concurrent("stub-resource", page_size=100, max_workers=8, pool=pool)
+    )
+    pool.close()
+
+    expected = list(fetch_data_pages("stub-resource", page_size=100))
+    assert len(chunks) == len(expected)
+    for chunk, expected_chunk in zip(chunks, expected):
+        assert chunk.equals(expected_chunk)
+
+    # 11 pages, but never more than the per-host limit of connections
+    assert neso_api.connections <= 4 + 1
+
+
+def test_fetch_data_concurrent_max_records(neso_api):
+    """
+    Test that `fetch_data_concurrent` stops once `max_records` rows have been fetched.
+    """
+    chunks = list(
+        fetch_data_concurrent(
+            "stub-resource", page_size=100, max_workers=4, max_records=250
+        )
+    )
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+
+
+def test_payload_to_dataframe_narrow_parse(monkeypatch):
+    """
+    Test that parsing only the needed fields matches building the full records frame,
+    with either JSON backend, including rows with bad dates or missing values.
+    """
+    records = make_records(100)
+    records[3]["DATE_GMT"] = None
+    records[4]["TIME_GMT"] = "not a time"
+    records[5]["EMBEDDED_SOLAR_FORECAST"] = None
+    payload = json.dumps({"result": {"records": records}}).encode("utf-8")
+
+    # the previous implementation, via a DataFrame of every column
+    wide = pd.DataFrame(records)
+    wide["Datetime_GMT"] = pd.to_datetime(
+        wide["DATE_GMT"].str[:10] + " " + wide["TIME_GMT"].str.strip(),
+        format="%Y-%m-%d %H:%M",
+        errors="coerce",
+    ).dt.tz_localize("UTC")
+    wide = wide.rename(columns={"EMBEDDED_SOLAR_FORECAST": "solar_forecast_kw"})
+    expected = wide[["Datetime_GMT", "solar_forecast_kw"]].dropna(
+        subset=["Datetime_GMT"]
+    )
+    expected = expected.astype({"solar_forecast_kw": "float64"})
+
+    for json_loads in (json.loads, fetch_data_module._json_loads):
+        monkeypatch.setattr(fetch_data_module, "_json_loads", json_loads)
+        df = _payload_to_dataframe(payload)
+        pd.testing.assert_frame_equal(df, expected)
+        assert len(df) == 98
+
+
+def test_parse_datetime_gmt_matches_to_datetime():
+    """
+    Test that parsing distinct dates and times once matches `pd.to_datetime` on the
+    concatenated strings, including malformed and missing values.
+    """
+    rng = random.Random(0)
+    dates = ["2024-01-01T00:00:00", "2024-02-30T00:00:00", "2024-1-5", "", None]
+    dates += ["2024-03-31", "garbage", " 2024-01-01", "9999-12-31T00:00:00"]
+    times = ["00:00", "13:30", " 23:30 ", "24:00", "1:5", "", None, "13:30:00"]
+
+    for n_rows in (0, 1, 1000):
+        date_gmt = pd.Series([rng.choice(dates) for _ in range(n_rows)], dtype=object)
+        time_gmt = pd.Series([rng.choice(times) for _ in range(n_rows)], dtype=object)
+        expected = pd.to_datetime(
+            date_gmt.str[:10] + " " + time_gmt.str.strip(),
+            format="%Y-%m-%d %H:%M",
+            errors="coerce",
+        ).dt.tz_localize("UTC")
+
+        pd.testing.assert_series_equal(
+            _parse_datetime_gmt(date_gmt, time_gmt), expected
+        )
+
+
+def test_payload_to_dataframe_regional():
+    """
+    Test that records with a GSP id field get a `gsp_id` column.
+    """
+    records = make_records(4)
+    for i, record in enumerate(records):
+        record["GSP_ID"] = i % 2
+    payload = json.dumps({"result": {"records": records}}).encode("utf-8")
+
+    df = _payload_to_dataframe(payload)
+
+    assert list(df.columns) == ["Datetime_GMT", "solar_forecast_kw", "gsp_id"]
+    assert list(df["gsp_id"]) == [0, 1, 0, 1]
+
+
+def test_fetch_data_using_sql_stub(neso_api):
+    """
+    Test `fetch_data_using_sql` against the local stand-in API.
+    """
+    sql = (
+        'SELECT * FROM "stub-resource" WHERE "DATE_GMT" >= \'2024-01-02\' '
+        'AND "DATE_GMT" < \'2024-01-03\' ORDER BY "TIME_GMT" LIMIT 100'
+    )
+    df = fetch_data_using_sql(sql)
+
+    assert len(df) == 48
+    assert df["Datetime_GMT"].dt.date.astype(str).unique().tolist() == ["2024-01-02"]
+
+
+def test_incremental_query_quotes_and_selects_needed_columns():
+    """
+    Test that the incremental query selects only the parsed columns, filters on
+    the day of the watermark and quotes the resource name.
+    """
+    since = pd.Timestamp("2024-01-05 13:30", tz="UTC").to_pydatetime()
+    query = incremental_query('res"; DROP TABLE x; --', since, limit=100, offset=200)
+
+    assert query == (
+        'SELECT "DATE_GMT", "TIME_GMT", "EMBEDDED_SOLAR_FORECAST" '
+        'FROM "res""; DROP TABLE x; --" '
+        "WHERE \"DATE_GMT\" >= '2024-01-05' "
+        'ORDER BY "DATE_GMT", "TIME_GMT", "_id" LIMIT 100 OFFSET 200'
+    )
+    assert "WHERE" not in incremental_query("res", None, limit=10)
+
+
+def test_fetch_data_since_fetches_only_newer_rows(neso_api):
+    """
+    Test that `fetch_data_since` returns exactly the rows after the watermark, and
+    that the server only sends the rows from the watermark's day on.
+    """
+    since = pd.Timestamp("2024-01-20 13:30", tz="UTC")
+    chunks = list(
+        fetch_data_since("stub-resource", since.to_pydatetime(), page_size=40)
+    )
+    fetched = pd.concat(chunks, ignore_index=True)
+
+    everything = fetch_data("stub-resource", len(neso_api.records))
+    expected = everything[everything["Datetime_GMT"] > since].reset_index(drop=True)
+    pd.testing.assert_frame_equal(fetched, expected)
+
+    # 1050 records, of which the 138 from 2024-01-20 on are sent, in pages of 40
+    sql_requests = [r for r in neso_api.requests if "datastore_search_sql" in r]
+    assert len(sql_requests) == 4
+    assert len(fetch_data_module.SQL_COLUMNS) == 3
+
+
+def test_fetch_data_since_keeps_gsp_ids(neso_api, monkeypatch):
+    """
+    Test that an incremental fetch of a regional resource selects the GSP ids too,
+    rather than saving every GSP as one national forecast.
+    """
+    for i, record in enumerate(neso_api.records):
+        record[Neso.GSP_ID_FIELD] = i % 3
+
+    since = pd.Timestamp("2024-01-20 13:30", tz="UTC").to_pydatetime()
+    fetched = pd.concat(
+        fetch_data_since("stub-resource", since, page_size=40), ignore_index=True
+    )
+
+    assert "gsp_id" in fetched.columns
+    assert set(fetched["gsp_id"]) == {0, 1, 2}
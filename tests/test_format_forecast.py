@@ -1,5 +1,14 @@
+import pandas as pd
+import pytest
+from nowcasting_datamodel.models import ForecastValue, ForecastValueSQL
+from sqlalchemy import inspect
 from neso_solar_consumer.fetch_data import fetch_data
-from neso_solar_consumer.format_forecast import format_to_forecast_sql
+from neso_solar_consumer.format_forecast import (
+    ForecastValueArrays,
+    format_forecast_values,
+    format_to_forecast_sql,
+    format_to_forecast_sql_by_gsp,
+)
 
 
 def test_format_to_forecast_sql_real(db_session, test_config):
@@ -46,3 +55,122 @@ def test_format_to_forecast_sql_real(db_session, test_config):
             f"Mismatch in expected_power_generation_megawatts for row {row}. "
             f"Expected {expected_power_mw}, got {fv.expected_power_generation_megawatts}."
         )
+
+
+def test_format_forecast_values_matches_pydantic_path():
+    """
+    Test that the column-wise `format_forecast_values` produces the same values as
+    building a pydantic `ForecastValue` per row, including skipping missing data.
+    """
+    data = pd.DataFrame(
+        {
+            "Datetime_GMT": pd.to_datetime(
+                [
+                    "2024-06-01 10:00",
+                    "2024-06-01 10:30",
+                    None,
+                    "2024-06-01 11:30",
+                    "2024-06-01 12:00",
+                ]
+            ).tz_localize("UTC"),
+            "solar_forecast_kw": [1500, None, 1200, 0, 987654],
+        }
+    )
+
+    expected = [
+        ForecastValue(
+            target_time=row["Datetime_GMT"],
+            expected_power_generation_megawatts=row["solar_forecast_kw"] / 1000,
+        ).to_orm()
+        for _, row in data.iterrows()
+        if not (pd.isnull(row["Datetime_GMT"]) or pd.isnull(row["solar_forecast_kw"]))
+    ]
+    forecast_values = format_forecast_values(data)
+
+    assert len(forecast_values) == len(expected) == 3
+    for fv, expected_fv in zip(forecast_values, expected):
+        assert isinstance(fv, ForecastValueSQL)
+        assert fv.target_time == expected_fv.target_time
+        assert type(fv.target_time) is type(expected_fv.target_time)
+        assert (
+            fv.expected_power_generation_megawatts
+            == expected_fv.expected_power_generation_megawatts
+        )
+        assert fv.adjust_mw == expected_fv.adjust_mw
+
+
+def test_format_forecast_values_rejects_negative_values():
+    """
+    Test that negative forecasts are rejected, as `ForecastValue` validation did.
+    """
+    data = pd.DataFrame(
+        {
+            "Datetime_GMT": pd.to_datetime(["2024-06-01 10:00"]).tz_localize("UTC"),
+            "solar_forecast_kw": [-5],
+        }
+    )
+    with pytest.raises(ValueError):
+        format_forecast_values(data)
+
+
+def test_format_to_forecast_sql_by_gsp(db_session, test_config):
+    """
+    Test that regional data gives one ForecastSQL per GSP, each with its own rows
+    and location, and that rows without a GSP are skipped.
+    """
+    target_times = pd.date_range("2024-06-01 10:00", periods=4, freq="30min", tz="UTC")
+    data = pd.DataFrame(
+        {
+            "Datetime_GMT": list(target_times) * 3 + [target_times[0]],
+            "solar_forecast_kw": [float(i) for i in range(13)],
+            "gsp_id": [2] * 4 + [0] * 4 + [317] * 4 + [None],
+        }
+    )
+
+    forecasts = format_to_forecast_sql_by_gsp(
+        data, test_config["model_name"], test_config["model_version"], db_session
+    )
+
+    assert [forecast.location.gsp_id for forecast in forecasts] == [0, 2, 317]
+    assert forecasts[0].location.label == "National-GB"
+    assert forecasts[2].location.label == "GSP_317"
+    for forecast in forecasts:
+        gsp_rows = data[data["gsp_id"] == forecast.location.gsp_id]
+        assert [fv.target_time for fv in forecast.forecast_values] == list(
+            gsp_rows["Datetime_GMT"]
+        )
+        assert [
+            fv.expected_power_generation_megawatts for fv in forecast.forecast_values
+        ] == list(gsp_rows["solar_forecast_kw"] / 1000)
+
+
+def test_forecast_value_arrays_match_forecast_values():
+    """
+    Test that the compact arrays hold the same values as the ForecastValueSQL
+    objects, and build the same objects on request.
+    """
+    data = pd.DataFrame(
+        {
+            "Datetime_GMT": pd.date_range(
+                "2024-06-01 10:00", periods=5, freq="30min", tz="UTC"
+            ),
+            "solar_forecast_kw": [1500, None, 1200, 0, 987654],
+        }
+    )
+    expected = format_forecast_values(data)
+    values = ForecastValueArrays.from_frame(data)
+
+    assert len(values) == len(expected) == 4
+    assert values.nbytes == 4 * 24
+    assert list(values.target_time_index()) == [fv.target_time for fv in expected]
+    for fv, expected_fv in zip(values.to_orm(), expected):
+        # set through the instrumented attributes, so the session sees them
+        assert inspect(fv).attrs.target_time.history.added == [fv.target_time]
+        assert fv.target_time == expected_fv.target_time
+        assert (
+            fv.expected_power_generation_megawatts
+            == expected_fv.expected_power_generation_megawatts
+        )
+
+    subset = values.take([1, 3])
+    assert list(subset.megawatts) == [1.2, 987.654]
@@ -0,0 +1,137 @@
+"""
+Tests for retries, timeouts and the circuit breaker in `neso_solar_consumer.http_client`
+
+The local stand-in for the NESO API is told to fail requests (see `StubNesoApi.faults`),
+and the backoff is shortened so the tests stay quick.
+"""
+
+import time
+import urllib.error
+
+import pytest
+
+from neso_solar_consumer.config import Neso
+from neso_solar_consumer.fetch_data import (
+    FetchError,
+    fetch_data_concurrent,
+    fetch_data_pages,
+)
+from neso_solar_consumer.http_client import (
+    CircuitOpenError,
+    HTTPConnectionPool,
+    fetch_url,
+)
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(Neso, "FETCH_BACKOFF_SECONDS", 0.01)
+    monkeypatch.setattr(Neso, "FETCH_MAX_BACKOFF_SECONDS", 0.05)
+
+
+@pytest.fixture
+def pool():
+    pool = HTTPConnectionPool(max_connections_per_host=4, read_timeout=0.3)
+    yield pool
+    pool.close()
+
+
+def search_url(neso_api, offset: int = 0) -> str:
+    return f"{neso_api.url}/datastore_search?resource_id=res&limit=10&offset={offset}"
+
+
+def collect_until_error(pages) -> tuple:
+    """Return the pages yielded before a FetchError, and the error."""
+    collected = []
+    with pytest.raises(FetchError) as error:
+        for page in pages:
+            collected.append(page)
+    return collected, error.value
+
+
+def test_transient_failures_are_retried(neso_api, pool):
+    """
+    Test that 5xx responses, a dropped connection and a read timeout are retried
+    until the request succeeds, without waiting out the hung response.
+    """
+    neso_api.hang_seconds = 5
+    neso_api.faults = [503, "drop", "hang", 502]
+
+    start = time.monotonic()
+    body = fetch_url(search_url(neso_api), pool, retries=4)
+
+    assert b'"records"' in body
+    assert len(neso_api.requests) == 5
+    assert time.monotonic() - start < neso_api.hang_seconds
+    assert not pool.breaker(neso_api.url).is_open
+
+
+def test_client_errors_are_not_retried(neso_api, pool):
+    """Test that a 4xx response is raised at once and does not trip the breaker."""
+    neso_api.faults = [409]
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+        fetch_url(search_url(neso_api), pool, retries=3)
+
+    assert error.value.code == 409
+    assert len(neso_api.requests) == 1
+    assert pool.breaker(neso_api.url).failures == 0
+
+
+def test_circuit_breaker_fails_fast_then_recovers(neso_api, pool, monkeypatch):
+    """
+    Test that the breaker opens after repeated failures, fails further requests
+    without sending them, and closes after a successful trial request.
+    """
+    monkeypatch.setattr(Neso, "CIRCUIT_FAILURE_THRESHOLD", 2)
+    neso_api.faults = [503] * 10
+
+    with pytest.raises(urllib.error.HTTPError):
+        fetch_url(search_url(neso_api), pool, retries=5)
+    assert len(neso_api.requests) == 2
+
+    breaker = pool.breaker(neso_api.url)
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        fetch_url(search_url(neso_api), pool)
+    assert len(neso_api.requests) == 2
+
+    # Once the reset time has passed, one trial request is let through
+    breaker.reset_seconds = 0
+    neso_api.faults = []
+    fetch_url(search_url(neso_api), pool)
+    assert not breaker.is_open and breaker.failures == 0
+
+
+def test_fetch_data_pages_keeps_pages_before_failure(neso_api, monkeypatch):
+    """Test that pages fetched before a failed page are yielded before FetchError."""
+    monkeypatch.setattr(Neso, "FETCH_RETRIES", 1)
+    neso_api.faults = [None, None, 500, 500]
+
+    pages, error = collect_until_error(fetch_data_pages("stub-resource", page_size=100))
+
+    assert [len(page) for page in pages] == [100, 100]
+    assert isinstance(error.__cause__, urllib.error.HTTPError)
+
+
+def test_fetch_data_concurrent_salvages_pages_in_flight(neso_api, monkeypatch):
+    """
+    Test that when one page fails, the pages already in flight are still yielded,
+    in order, before FetchError is raised.
+    """
+    monkeypatch.setattr(Neso, "FETCH_RETRIES", 0)
+    neso_api.latency = 0.05
+    # the first page, then the first of the 4 concurrent pages to arrive fails
+    neso_api.faults = [None, 500]
+    pool = HTTPConnectionPool(max_connections_per_host=4)
+
+    pages, _ = collect_until_error(
+        fetch_data_concurrent(
+            "stub-resource", page_size=100, max_workers=4, max_records=500, pool=pool
+        )
+    )
+    pool.close()
+
+    # 4 of the 5 pages, each once and in order
+    starts = [page["Datetime_GMT"].iloc[0] for page in pages]
+    assert len(pages) == 4 and starts == sorted(set(starts))
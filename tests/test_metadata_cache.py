@@ -0,0 +1,91 @@
+"""
+Tests for `MetadataCache`
+
+These tests need the PostgreSQL container from `conftest.py`. Queries are counted
+with a SQLAlchemy event listener on the test engine.
+"""
+
+from datetime import datetime, timezone
+
+import pandas as pd
+from nowcasting_datamodel.models import InputDataLastUpdatedSQL
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from neso_solar_consumer.format_forecast import format_to_forecast_sql
+from neso_solar_consumer.metadata_cache import MetadataCache
+from neso_solar_consumer.save_forecast import save_forecasts_to_db
+
+
+def make_forecast_data(n_rows: int = 4) -> pd.DataFrame:
+    start = pd.Timestamp(datetime.now(tz=timezone.utc)).floor("30min")
+    return pd.DataFrame(
+        {
+            "Datetime_GMT": pd.date_range(start, periods=n_rows, freq="30min"),
+            "solar_forecast_kw": [1000.0] * n_rows,
+        }
+    )
+
+
+def count_selects(engine) -> list:
+    """Return a list that collects every SELECT statement run on `engine`."""
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    return statements
+
+
+def test_metadata_cache_skips_round_trips_in_new_session(db_session, test_config):
+    """
+    Test that a second session gets the model, location and input data from the
+    cache without a query, and that forecasts built from them can be saved.
+    """
+    db_session.add(InputDataLastUpdatedSQL(gsp=datetime.now(tz=timezone.utc)))
+    db_session.commit()
+
+    cache = MetadataCache(ttl=300)
+    format_to_forecast_sql(
+        make_forecast_data(),
+        test_config["model_name"],
+        test_config["model_version"],
+        db_session,
+        metadata_cache=cache,
+    )
+    assert (cache.hits, cache.misses) == (0, 3)
+
+    session = sessionmaker(bind=db_session.get_bind())()
+    selects = count_selects(session.get_bind())
+    forecasts = format_to_forecast_sql(
+        make_forecast_data(),
+        test_config["model_name"],
+        test_config["model_version"],
+        session,
+        metadata_cache=cache,
+    )
+    assert (cache.hits, cache.misses) == (3, 3)
+    assert selects == []
+
+    forecast = forecasts[0]
+    assert forecast.model.name == test_config["model_name"]
+    assert forecast.location.gsp_id == 0
+    assert forecast.input_data_last_updated is not None
+
+    save_forecasts_to_db(forecasts, session)
+    assert forecast.id is not None
+    session.close()
+
+
+def test_metadata_cache_expires_entries(db_session, test_config):
+    """Test that entries older than the TTL are read again."""
+    cache = MetadataCache(ttl=0)
+    for _ in range(2):
+        cache.get_model(
+            db_session, test_config["model_name"], test_config["model_version"]
+        )
+        cache.get_location(db_session, gsp_id=0)
+
+    assert (cache.hits, cache.misses) == (0, 4)
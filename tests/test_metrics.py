@@ -0,0 +1,76 @@
+"""
+Tests for the stage metrics and profiling hooks in `neso_solar_consumer.metrics`
+"""
+
+import pstats
+
+from sqlalchemy import create_engine, text
+
+from neso_solar_consumer.fetch_data import fetch_data
+from neso_solar_consumer.metrics import Metrics, get_metrics, profile_run
+
+
+def test_stage_totals_and_statement_counts():
+    """
+    Test that stages add up time, calls, rows and bytes, and that statements are
+    counted against the stage that ran them.
+    """
+    metrics = Metrics()
+    engine = create_engine("sqlite://")
+    metrics.watch_engine(engine)
+    metrics.watch_engine(engine)  # watching twice must not double count
+
+    with engine.connect() as connection:
+        for _ in range(2):
+            with metrics.stage("save") as record:
+                connection.execute(text("SELECT 1"))
+                record.add(rows=10, n_bytes=100)
+        connection.execute(text("SELECT 1"))
+
+    assert metrics.stages["save"]["calls"] == 2
+    assert metrics.stages["save"]["rows"] == 20
+    assert metrics.stages["save"]["bytes"] == 200
+    assert metrics.stages["save"]["statements"] == 2
+    assert metrics.stages["save"]["seconds"] > 0
+    assert metrics.stages["other"]["statements"] == 1
+
+
+def test_fetch_records_bytes_and_rows(neso_api):
+    """Test that fetching through the stub API records the fetch, decode and parse stages."""
+    metrics = get_metrics()
+    metrics.reset()
+
+    data = fetch_data("stub-resource", 100)
+
+    assert metrics.stages["fetch"]["calls"] == 1
+    assert metrics.stages["fetch"]["bytes"] > 0
+    assert metrics.stages["decode"]["bytes"] == metrics.stages["fetch"]["bytes"]
+    assert metrics.stages["parse"]["rows"] == len(data) == 100
+
+
+def test_write_textfile(tmp_path):
+    """Test the Prometheus textfile output."""
+    metrics = Metrics()
+    with metrics.stage("format") as record:
+        record.add(rows=5)
+
+    path = tmp_path / "neso.prom"
+    metrics.write_textfile(str(path))
+
+    content = path.read_text()
+    assert "# TYPE neso_solar_consumer_stage_seconds_total counter" in content
+    assert 'neso_solar_consumer_stage_rows_total{stage="format"} 5' in content
+    assert 'neso_solar_consumer_stage_calls_total{stage="format"} 1' in content
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_profile_run_cprofile(tmp_path, monkeypatch):
+    """Test that `NESO_PROFILE=cprofile` writes loadable stats."""
+    path = tmp_path / "run.prof"
+    monkeypatch.setenv("NESO_PROFILE", "cprofile")
+    monkeypatch.setenv("NESO_PROFILE_PATH", str(path))
+
+    with profile_run():
+        sum(range(1000))
+
+    assert pstats.Stats(str(path)).total_calls > 0
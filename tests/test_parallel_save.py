@@ -0,0 +1,70 @@
+import csv
+import io
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from neso_solar_consumer.format_forecast import format_forecast_values
+from neso_solar_consumer.parallel_save import forecast_arrays, prepare_rows
+
+CREATED_UTC = "2025-01-01T12:00:00+00:00"
+
+
+@pytest.fixture
+def forecast_frame():
+    data = pd.DataFrame(
+        {
+            "Datetime_GMT": pd.date_range(
+                "2025-01-01", periods=6, freq="30min", tz="UTC"
+            ),
+            "solar_forecast_kw": [0.0, 1500.0, np.nan, 250.5, 3.0, 12000.0],
+        }
+    )
+    data.loc[4, "Datetime_GMT"] = pd.NaT
+    return data
+
+
+def test_prepare_rows_matches_format_forecast_values(forecast_frame):
+    """
+    Test that the rows prepared from the arrays hold the same values as the
+    ForecastValueSQL objects, both as CSV and as tuples.
+    """
+    expected = [
+        (value.target_time, value.expected_power_generation_megawatts)
+        for value in format_forecast_values(forecast_frame)
+    ]
+    target_times, megawatts = forecast_arrays(forecast_frame)
+    assert target_times.dtype == np.int64 and len(target_times) == len(expected)
+
+    rows = prepare_rows(target_times, megawatts, 7, CREATED_UTC, as_csv=False)
+    created = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+    assert rows == [(t, mw, 0.0, 7, created) for t, mw in expected]
+
+    text = prepare_rows(target_times, megawatts, 7, CREATED_UTC, as_csv=True)
+    parsed = [
+        (datetime.fromisoformat(row[0]), float(row[1]), *row[2:])
+        for row in csv.reader(io.StringIO(text))
+    ]
+    assert parsed == [(t, mw, "0.0", "7", CREATED_UTC) for t, mw in expected]
+
+
+def test_prepare_rows_in_process_pool(forecast_frame):
+    """Test that shards prepared by worker processes join up to the serial result."""
+    target_times, megawatts = forecast_arrays(forecast_frame)
+    serial = prepare_rows(target_times, megawatts, 1, CREATED_UTC)
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(
+                prepare_rows,
+                target_times[i : i + 2],
+                megawatts[i : i + 2],
+                1,
+                CREATED_UTC,
+            )
+            for i in range(0, len(target_times), 2)
+        ]
+        assert "".join(future.result() for future in futures) == serial
@@ -0,0 +1,190 @@
+"""
+Tests for the producer/writer pipeline in `neso_solar_consumer.pipeline` and `app.run_pipelined`
+
+Fetching and saving are replaced by sleeps, so no database or API is needed.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from neso_solar_consumer import app as app_module
+from neso_solar_consumer.app import run_pipelined
+from neso_solar_consumer.fetch_data import FetchError
+from neso_solar_consumer.pipeline import prefetch
+
+
+def test_prefetch_is_bounded_and_ordered():
+    """Test that items come through in order and only `max_queued` run ahead."""
+    produced = []
+    ahead = []
+
+    def items():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    consumed = []
+    for item in prefetch(items(), max_queued=2):
+        time.sleep(0.01)
+        consumed.append(item)
+        ahead.append(len(produced) - len(consumed))
+
+    assert consumed == list(range(10))
+    # two in the queue, plus one waiting to be put
+    assert max(ahead) <= 3
+
+
+def test_prefetch_raises_after_earlier_items_and_stops_early():
+    """
+    Test that a producer error is raised after the items before it, and that
+    closing the consumer stops and closes the producer.
+    """
+
+    def failing():
+        yield 1
+        yield 2
+        raise RuntimeError("fetch failed")
+
+    consumed = []
+    with pytest.raises(RuntimeError, match="fetch failed"):
+        for item in prefetch(failing()):
+            consumed.append(item)
+    assert consumed == [1, 2]
+
+    closed = threading.Event()
+
+    def endless():
+        try:
+            i = 0
+            while True:
+                yield i
+                i += 1
+        finally:
+            closed.set()
+
+    pages = prefetch(endless(), max_queued=1)
+    assert next(pages) == 0
+    pages.close()
+    assert closed.is_set()
+
+
+class FakeConnection:
+    """Records how long each session is held."""
+
+    engine = None
+
+    def __init__(self):
+        self.held = []
+
+    @contextmanager
+    def get_session(self):
+        start = time.perf_counter()
+        try:
+            yield object()
+        finally:
+            self.held.append(time.perf_counter() - start)
+
+
+def test_run_pipelined_overlaps_fetch_and_save(monkeypatch):
+    """
+    Test that the next page is fetched while the current one is saved, and that
+    a session is only held while saving.
+    """
+    n_pages, fetch_seconds, save_seconds = 4, 0.1, 0.1
+    page = pd.DataFrame(
+        {
+            "Datetime_GMT": pd.date_range("2025-01-01", periods=2, tz="UTC"),
+            "solar_forecast_kw": [1.0, 2.0],
+        }
+    )
+
+    def fetch_pages(watermark, since, on_records=None):
+        for _ in range(n_pages):
+            time.sleep(fetch_seconds)
+            yield page
+
+    saved = []
+    monkeypatch.setattr(app_module, "_fetch_pages", fetch_pages)
+    monkeypatch.setattr(
+        app_module,
+        "_save_page",
+        lambda session, page, *args: (time.sleep(save_seconds), saved.append(page)),
+    )
+    monkeypatch.setattr(app_module.get_metrics(), "watch_engine", lambda engine: None)
+
+    connection = FakeConnection()
+    start = time.perf_counter()
+    n_rows = run_pipelined(connection, save_method="bulk")
+    elapsed = time.perf_counter() - start
+
+    assert n_rows == 2 * n_pages and len(saved) == n_pages
+    assert len(connection.held) == n_pages
+    assert sum(connection.held) < n_pages * save_seconds + 0.1
+    # serially this would take n_pages * (fetch_seconds + save_seconds)
+    assert elapsed < n_pages * (fetch_seconds + save_seconds) - 0.15
+
+
+def test_run_pipelined_saves_pages_before_a_fetch_error(monkeypatch):
+    """
+    Test that the pages fetched before a failed page are saved, and that the
+    FetchError is then raised rather than the run ending as if there were no data.
+    """
+    page = pd.DataFrame(
+        {
+            "Datetime_GMT": pd.date_range("2025-01-01", periods=2, tz="UTC"),
+            "solar_forecast_kw": [1.0, 2.0],
+        }
+    )
+
+    def fetch_pages(watermark, since, on_records=None):
+        yield page
+        yield page
+        raise FetchError("page 3 failed")
+
+    saved = []
+    monkeypatch.setattr(app_module, "_fetch_pages", fetch_pages)
+    monkeypatch.setattr(
+        app_module, "_save_page", lambda session, page, *args: saved.append(page)
+    )
+    monkeypatch.setattr(app_module.get_metrics(), "watch_engine", lambda engine: None)
+
+    with pytest.raises(FetchError, match="page 3 failed"):
+        run_pipelined(FakeConnection(), save_method="bulk")
+    assert len(saved) == 2
+
+
+def test_regional_pages_are_saved_together(monkeypatch):
+    """
+    Test that a regional page is saved in one bulk save even when "orm" is
+    configured, as `save` would commit each GSP's forecast on its own.
+    """
+    page = pd.DataFrame(
+        {
+            "Datetime_GMT": pd.date_range("2025-01-01", periods=2, tz="UTC").repeat(3),
+            "solar_forecast_kw": [1.0] * 6,
+            "gsp_id": [0, 1, 2] * 2,
+        }
+    )
+    formatted = []
+    saves = []
+
+    def format_by_gsp(data, compact, **kwargs):
+        formatted.append(compact)
+        return [SimpleNamespace(forecast_values=[None] * len(data))]
+
+    monkeypatch.setattr(app_module, "format_to_forecast_sql_by_gsp", format_by_gsp)
+    monkeypatch.setattr(
+        app_module,
+        "save_forecasts_to_db",
+        lambda forecasts, session, method: saves.append(method),
+    )
+
+    app_module._save_page(None, page, "orm", None, None, None)
+
+    assert formatted == [True]
+    assert saves == ["bulk"]
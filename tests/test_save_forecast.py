@@ -0,0 +1,275 @@
+"""
+Tests for `save_forecasts_to_db`
+
+These tests need the PostgreSQL container from `conftest.py`, as the forecast value
+tables are partitioned and the bulk path uses `COPY` and `ON CONFLICT`.
+"""
+
+from datetime import datetime, time, timezone
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from nowcasting_datamodel.models import (
+    ForecastSQL,
+    ForecastValueLatestSQL,
+    ForecastValueSevenDaysSQL,
+    ForecastValueSQL,
+)
+
+from neso_solar_consumer import save_forecast
+from neso_solar_consumer.format_forecast import (
+    ForecastValueArrays,
+    format_to_forecast_sql,
+    format_to_forecast_sql_by_gsp,
+)
+from neso_solar_consumer.save_forecast import (
+    _add_adjust,
+    _add_adjust_to_arrays,
+    _use_adjuster,
+    save_forecasts_to_db,
+)
+
+
+def make_forecast_data(n_rows: int = 96) -> pd.DataFrame:
+    """Half-hourly forecast data starting now, so no rows count as stale."""
+    start = pd.Timestamp(datetime.now(tz=timezone.utc)).floor("30min")
+    return pd.DataFrame(
+        {
+            "Datetime_GMT": pd.date_range(start, periods=n_rows, freq="30min"),
+            "solar_forecast_kw": [float(i * 25) for i in range(n_rows)],
+        }
+    )
+
+
+@pytest.mark.parametrize("method", ["orm", "bulk", "upsert", "sql"])
+@pytest.mark.parametrize("compact", [False, True])
+def test_save_forecasts_to_db(db_session, test_config, method, compact):
+    """
+    Test that both save methods write the forecast, its values and the latest and
+    last-seven-days rows, from ForecastValueSQL objects or from compact arrays.
+    """
+    data = make_forecast_data()
+    forecasts = format_to_forecast_sql(
+        data,
+        test_config["model_name"],
+        test_config["model_version"],
+        db_session,
+        compact=compact,
+    )
+
+    save_forecasts_to_db(forecasts, db_session, method=method)
+
+    saved = db_session.query(ForecastSQL).filter(ForecastSQL.historic.is_(False)).all()
+    assert len(saved) == 1
+    assert db_session.query(ForecastValueSQL).count() == len(data)
+    assert db_session.query(ForecastValueLatestSQL).count() == len(data)
+    assert db_session.query(ForecastValueSevenDaysSQL).count() == len(data)
+
+    saved_values = sorted(saved[0].forecast_values, key=lambda fv: fv.target_time)
+    for saved_value, row in zip(saved_values, data.itertuples()):
+        assert saved_value.target_time == row.Datetime_GMT
+        assert saved_value.expected_power_generation_megawatts == pytest.approx(
+            row.solar_forecast_kw / 1000
+        )
+
+
+@pytest.mark.parametrize("method", ["bulk", "sql"])
+def test_save_forecasts_twice_updates_latest(db_session, test_config, method):
+    """
+    Test that a second save adds new forecast values but upserts the latest table.
+    """
+    data = make_forecast_data()
+    for solar_forecast_kw in [data["solar_forecast_kw"], data["solar_forecast_kw"] * 2]:
+        forecasts = format_to_forecast_sql(
+            data.assign(solar_forecast_kw=solar_forecast_kw),
+            test_config["model_name"],
+            test_config["model_version"],
+            db_session,
+        )
+        save_forecasts_to_db(forecasts, db_session, method=method)
+
+    assert db_session.query(ForecastValueSQL).count() == 2 * len(data)
+    assert db_session.query(ForecastValueSevenDaysSQL).count() == 2 * len(data)
+    latest = db_session.query(ForecastValueLatestSQL).order_by(
+        ForecastValueLatestSQL.target_time
+    )
+    assert [fv.expected_power_generation_megawatts for fv in latest] == pytest.approx(
+        list(data["solar_forecast_kw"] * 2 / 1000)
+    )
+    assert (
+        db_session.query(ForecastSQL).filter(ForecastSQL.historic.is_(True)).count()
+        == 1
+    )
+
+
+def test_save_forecasts_upsert_is_idempotent(db_session, test_config):
+    """
+    Test that upserting the same input twice leaves the row counts unchanged, and
+    that changed values are updated in place.
+    """
+    data = make_forecast_data()
+    for solar_forecast_kw in [data["solar_forecast_kw"], data["solar_forecast_kw"] * 2]:
+        forecasts = format_to_forecast_sql(
+            data.assign(solar_forecast_kw=solar_forecast_kw),
+            test_config["model_name"],
+            test_config["model_version"],
+            db_session,
+            compact=True,
+        )
+        save_forecasts_to_db(forecasts, db_session, method="upsert")
+
+        assert db_session.query(ForecastValueSQL).count() == len(data)
+        assert db_session.query(ForecastValueSevenDaysSQL).count() == len(data)
+        assert db_session.query(ForecastValueLatestSQL).count() == len(data)
+        assert (
+            db_session.query(ForecastSQL)
+            .filter(ForecastSQL.historic.is_(False))
+            .count()
+            == 1
+        )
+
+    saved = db_session.query(ForecastValueSQL).order_by(ForecastValueSQL.target_time)
+    assert [fv.expected_power_generation_megawatts for fv in saved] == pytest.approx(
+        list(data["solar_forecast_kw"] * 2 / 1000)
+    )
+
+
+def test_save_forecasts_bulk_repeated_target_time(db_session, test_config):
+    """
+    Test that a page repeating a target time saves, with the last value latest.
+    """
+    data = make_forecast_data()
+    repeated = pd.concat(
+        [data, data.tail(1).assign(solar_forecast_kw=12_345.0)], ignore_index=True
+    )
+    forecasts = format_to_forecast_sql(
+        repeated,
+        test_config["model_name"],
+        test_config["model_version"],
+        db_session,
+        compact=True,
+    )
+    save_forecasts_to_db(forecasts, db_session, method="bulk")
+
+    assert db_session.query(ForecastValueSQL).count() == len(repeated)
+    assert db_session.query(ForecastValueLatestSQL).count() == len(data)
+    last = (
+        db_session.query(ForecastValueLatestSQL)
+        .order_by(ForecastValueLatestSQL.target_time.desc())
+        .first()
+    )
+    assert last.expected_power_generation_megawatts == pytest.approx(12.345)
+
+
+@pytest.mark.parametrize("first_gsp", [0, 1])
+def test_save_forecasts_bulk_by_gsp(db_session, test_config, monkeypatch, first_gsp):
+    """
+    Test that one bulk save writes the forecasts for many GSPs together, with or
+    without the national forecast (GSP 0) for the adjuster to work on.
+    """
+    monkeypatch.setenv("USE_ADJUSTER", "True")
+    n_gsps = 20
+    data = make_forecast_data(48)
+    regional = pd.concat(
+        [data.assign(gsp_id=gsp_id) for gsp_id in range(first_gsp, first_gsp + n_gsps)],
+        ignore_index=True,
+    )
+    forecasts = format_to_forecast_sql_by_gsp(
+        regional, test_config["model_name"], test_config["model_version"], db_session
+    )
+    assert len(forecasts) == n_gsps
+
+    save_forecasts_to_db(forecasts, db_session, method="bulk")
+
+    assert db_session.query(ForecastValueSQL).count() == len(regional)
+    assert db_session.query(ForecastValueLatestSQL).count() == len(regional)
+    assert (
+        db_session.query(ForecastSQL).filter(ForecastSQL.historic.is_(True)).count()
+        == n_gsps
+    )
+
+
+def test_save_forecasts_to_db_unknown_method():
+    """
+    Test that an unknown save method is rejected before touching the database.
+    """
+    with pytest.raises(ValueError):
+        save_forecasts_to_db([object()], session=None, method="fast")
+
+
+@pytest.mark.parametrize(
+    "apply_adjuster, env, expected",
+    [
+        (True, None, True),
+        (True, "False", False),
+        (False, None, False),
+        (False, "1", False),
+    ],
+)
+def test_use_adjuster(monkeypatch, apply_adjuster, env, expected):
+    """
+    Test that USE_ADJUSTER can turn the adjuster off but not on, as in `save`.
+    """
+    if env is None:
+        monkeypatch.delenv("USE_ADJUSTER", raising=False)
+    else:
+        monkeypatch.setenv("USE_ADJUSTER", env)
+    assert _use_adjuster(apply_adjuster) is expected
+
+
+def test_add_adjust_skips_pages_without_national(monkeypatch):
+    """
+    Test that the adjuster is not applied when there is no national forecast.
+    """
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the adjuster should not run")
+
+    monkeypatch.setattr(save_forecast, "_add_adjust_to_arrays", fail)
+    monkeypatch.setattr(save_forecast, "add_adjust_to_national_forecast", fail)
+
+    forecasts = [
+        SimpleNamespace(location=SimpleNamespace(gsp_id=gsp_id)) for gsp_id in (1, 2)
+    ]
+    values = [ForecastValueArrays([0], [1.0]), []]
+    _add_adjust(None, forecasts, values)
+
+
+def test_add_adjust_to_arrays(monkeypatch):
+    """
+    Test that the array adjuster matches ME values on time of day and horizon, caps
+    them at 20% of the forecast, and uses 0 for zero forecasts and missing values.
+    """
+
+    def me(hour, minute, horizon, value):
+        return SimpleNamespace(
+            time_of_day=time(hour, minute),
+            forecast_horizon_minutes=horizon,
+            value=value,
+        )
+
+    latest_me = [
+        me(10, 0, 0, 1.0),
+        me(10, 0, 0, 9.0),  # a later duplicate is ignored
+        me(10, 30, 30, -3.0),
+        me(11, 0, 60, float("nan")),
+        me(11, 15, 75, 1.0),
+        me(12, 0, 120, 5.0),
+    ]
+    monkeypatch.setattr(
+        save_forecast, "read_latest_me_national", lambda session, model_name: latest_me
+    )
+
+    target_times = pd.DatetimeIndex(
+        [f"2024-06-01 {t}" for t in ["10:00", "10:30", "11:00", "11:15", "12:00"]],
+        tz="UTC",
+    )
+    values = ForecastValueArrays(
+        target_times.as_unit("us").asi8, [10.0, 0.0, 5.0, 5.0, 10.0]
+    )
+
+    _add_adjust_to_arrays(None, "model", values)
+
+    # 11:15 is off the half-hourly grid, so has no horizon to match
+    assert list(values.adjust_mw) == [1.0, 0.0, 0.0, 0.0, 2.0]
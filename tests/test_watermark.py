@@ -0,0 +1,75 @@
+"""
+Tests for the ingest watermark in `neso_solar_consumer.watermark`
+"""
+
+from datetime import timedelta
+
+import pandas as pd
+
+from neso_solar_consumer.app import make_watermark
+from neso_solar_consumer.config import Neso
+from neso_solar_consumer.fetch_data import fetch_data_since
+from neso_solar_consumer.state import StateFile
+from neso_solar_consumer.watermark import Watermark
+
+
+def make_page(start: str, n_rows: int = 4) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Datetime_GMT": pd.date_range(
+                start, periods=n_rows, freq="30min", tz="UTC"
+            ),
+            "solar_forecast_kw": [100.0] * n_rows,
+        }
+    )
+
+
+def test_watermark_moves_up_and_survives_restart(tmp_path):
+    """
+    Test that the watermark follows the latest saved target time, never moves
+    back, and is read back from the state file with the lookback applied.
+    """
+    state = StateFile(str(tmp_path / "state.json"))
+    watermark = Watermark("res", "model", state=state)
+    assert watermark.since() is None
+
+    watermark.commit(make_page("2024-01-02"))
+    watermark.commit(make_page("2024-01-01"))
+    assert watermark.since() == pd.Timestamp("2024-01-02 01:30", tz="UTC")
+
+    restarted = Watermark(
+        "res",
+        "model",
+        state=StateFile(state.path),
+        lookback=timedelta(hours=1),
+    )
+    assert restarted.since() == pd.Timestamp("2024-01-02 00:30", tz="UTC")
+    assert Watermark("other", "model", state=state).since() is None
+
+
+def test_incremental_run_picks_up_revised_values(neso_api):
+    """
+    Test that with the default lookback, a value revised for a target time that
+    is already saved is fetched again.
+    """
+    watermark = make_watermark(incremental=True)
+    records = neso_api.records
+    saved = pd.DataFrame(
+        {
+            "Datetime_GMT": pd.to_datetime(
+                [records[-1]["DATE_GMT"][:10] + " " + records[-1]["TIME_GMT"]],
+                utc=True,
+            ),
+            "solar_forecast_kw": [0.0],
+        }
+    )
+    watermark.commit(saved)
+
+    # NESO republishes a revised value for a target time a week before the last
+    revised = records[-7 * 48]
+    revised["EMBEDDED_SOLAR_FORECAST"] = 4321.0
+    fetched = pd.concat(
+        fetch_data_since(Neso.RESOURCE_ID, watermark.since(), page_size=100),
+        ignore_index=True,
+    )
+    assert 4321.0 in fetched["solar_forecast_kw"].tolist()